@@ -124,3 +124,44 @@ class DataPipeline:
         except Exception as e:
             logger.error(f"数据处理失败: URL={url}, Error={str(e)}")
             raise
+
+    def process_extracted(
+        self,
+        extracted: Dict[str, Any],
+        url: Optional[str] = None,
+        hook_data: Optional[Any] = None
+    ) -> Dict[str, Any]:
+        """
+        处理 Worker 按 extract schema 在页面内提取的结构化字段
+
+        字段已由浏览器解析完成，这里只做文本清洗与保存，不再解析 HTML
+
+        Args:
+            extracted: 爬取结果中的 extracted 字段
+            url: 页面 URL
+            hook_data: 提取到的 Hook 数据
+
+        Returns:
+            处理后的数据字典
+        """
+        def _clean(value: Any) -> Any:
+            if isinstance(value, str):
+                return self.cleaner.clean_all(value)
+            if isinstance(value, list):
+                return [_clean(v) for v in value]
+            if isinstance(value, dict):
+                return {k: _clean(v) for k, v in value.items()}
+            return value
+
+        data = dict(extracted or {})
+        if self.enable_cleaning and self.cleaner:
+            data = _clean(data)
+        if hook_data:
+            data["hook_data"] = hook_data
+        if url:
+            data["url"] = url
+        data["processed_at"] = time.time()
+
+        self.save_data(data)
+        logger.info(f"结构化数据处理完成: URL={url}")
+        return data
@@ -0,0 +1,3 @@
+"""
+数据存储模块
+"""
@@ -0,0 +1,61 @@
+"""
+批量任务结果流模块
+
+批量爬取任务每完成一个 URL 就把结果追加到 Redis 列表，调用方按偏移量增量读取，
+不必等待整批完成；任务最终结果中仍包含全部结果作为兜底。
+"""
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Redis 列表 Key 模板
+BATCH_RESULTS_KEY = "astra:batch:{batch_id}:results"
+
+
+def batch_results_key(batch_id: str) -> str:
+    """返回批量任务结果列表的 Key"""
+    return BATCH_RESULTS_KEY.format(batch_id=batch_id)
+
+
+async def publish_batch_result(
+    client: Any,
+    batch_id: str,
+    result: Dict[str, Any],
+    ttl: int = 3600
+) -> int:
+    """
+    追加一条结果（异步 Redis 客户端）
+
+    Args:
+        client: redis.asyncio 客户端
+        batch_id: 批量任务 ID
+        result: 单个 URL 的结果
+        ttl: 列表过期时间（秒）
+
+    Returns:
+        追加后列表长度
+    """
+    key = batch_results_key(batch_id)
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.rpush(key, json.dumps(result, ensure_ascii=False))
+        pipe.expire(key, ttl)
+        length, _ = await pipe.execute()
+    return length
+
+
+def read_batch_results(client: Any, batch_id: str, start: int = 0) -> List[Dict[str, Any]]:
+    """
+    从偏移量开始读取已完成的结果（同步 Redis 客户端）
+
+    Args:
+        client: redis 客户端
+        batch_id: 批量任务 ID
+        start: 起始偏移量
+
+    Returns:
+        结果列表，按完成顺序排列
+    """
+    items = client.lrange(batch_results_key(batch_id), max(0, start), -1)
+    return [json.loads(item) for item in items]
@@ -0,0 +1,288 @@
+"""
+大对象存储模块
+
+把任务结果中的大字段（如 html）压缩后写入外部存储，结果中只保留引用
+（key、原始大小、SHA-256），避免撑大 Celery 结果后端 (Redis)。
+
+支持的存储地址:
+    file:///data/blobs                                  - 本地文件系统
+    s3://bucket/prefix?endpoint_url=http://minio:9000   - S3 兼容存储（需要 boto3）
+"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlparse, parse_qs
+
+# S3 存储为可选依赖
+try:
+    import boto3
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+logger = logging.getLogger(__name__)
+
+# 结果中保存引用的字段名
+BLOB_REFS_KEY = "blob_refs"
+
+
+class BlobStore(ABC):
+    """大对象存储基类"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes):
+        """写入对象"""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """读取对象，不存在时抛出 KeyError"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """对象是否存在"""
+
+
+class LocalBlobStore(BlobStore):
+    """本地文件系统存储"""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 存储根目录
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"非法的对象 Key: {key}")
+        return path
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def get(self, key: str) -> bytes:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+
+class S3BlobStore(BlobStore):
+    """S3 兼容存储（AWS S3 / MinIO 等）"""
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None
+    ):
+        """
+        Args:
+            bucket: 存储桶
+            prefix: Key 前缀
+            endpoint_url: S3 兼容服务地址，如本地 MinIO: http://localhost:9000
+            region_name: 区域
+
+        访问凭证沿用 boto3 的默认来源（AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY 等）
+        """
+        if not HAS_BOTO3:
+            raise RuntimeError("S3 存储需要安装 boto3: pip install boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get(self, key: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            raise KeyError(key)
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception:
+            return False
+
+
+def create_blob_store(url: Optional[str]) -> Optional[BlobStore]:
+    """
+    根据地址创建存储实例
+
+    Args:
+        url: 存储地址（file:// 或 s3://），为空时返回 None
+
+    Returns:
+        BlobStore 实例
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme in ("", "file"):
+        return LocalBlobStore(parsed.path if parsed.scheme else url)
+    if parsed.scheme == "s3":
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        return S3BlobStore(
+            bucket=parsed.netloc,
+            prefix=parsed.path,
+            endpoint_url=query.get("endpoint_url"),
+            region_name=query.get("region"),
+        )
+    raise ValueError(f"不支持的存储地址: {url}")
+
+
+def _encode(value: Any) -> tuple:
+    """把字段值编码为字节，返回 (bytes, 内容类型)"""
+    if isinstance(value, bytes):
+        return value, "bytes"
+    if isinstance(value, str):
+        return value.encode("utf-8"), "text"
+    return json.dumps(value, ensure_ascii=False).encode("utf-8"), "json"
+
+
+def _decode(data: bytes, content_type: str) -> Any:
+    if content_type == "text":
+        return data.decode("utf-8")
+    if content_type == "json":
+        return json.loads(data.decode("utf-8"))
+    return data
+
+
+def put_blob(store: BlobStore, value: Any) -> Dict[str, Any]:
+    """
+    压缩并写入一个值，返回引用
+
+    Key 由内容的 SHA-256 决定，相同内容只存一份
+    """
+    raw, content_type = _encode(value)
+    digest = hashlib.sha256(raw).hexdigest()
+    key = f"{digest[:2]}/{digest[2:4]}/{digest}.gz"
+    compressed = gzip.compress(raw, compresslevel=6)
+    if not store.exists(key):
+        store.put(key, compressed)
+    return {
+        "key": key,
+        "size": len(raw),
+        "stored_size": len(compressed),
+        "sha256": digest,
+        "encoding": "gzip",
+        "content_type": content_type,
+    }
+
+
+def get_blob(store: BlobStore, ref: Dict[str, Any], verify: bool = True) -> Any:
+    """
+    读取并解压引用指向的值
+
+    Args:
+        store: 存储实例
+        ref: put_blob 返回的引用
+        verify: 是否校验 SHA-256
+    """
+    raw = store.get(ref["key"])
+    if ref.get("encoding") == "gzip":
+        raw = gzip.decompress(raw)
+    if verify and hashlib.sha256(raw).hexdigest() != ref["sha256"]:
+        raise ValueError(f"对象校验失败: {ref['key']}")
+    return _decode(raw, ref.get("content_type", "bytes"))
+
+
+def offload_fields(
+    result: Dict[str, Any],
+    store: Optional[BlobStore],
+    fields: Iterable[str] = ("html",),
+    threshold: int = 64 * 1024
+) -> Dict[str, Any]:
+    """
+    把结果中超过阈值的字段写入存储，原字段置为 None，引用记录在 blob_refs 中
+
+    Args:
+        result: 任务结果字典（原地修改）
+        store: 存储实例，为空时不做处理
+        fields: 候选字段
+        threshold: 字段编码后的最小字节数
+
+    Returns:
+        处理后的结果字典
+    """
+    if store is None or not isinstance(result, dict):
+        return result
+    for field in fields:
+        value = result.get(field)
+        if value is None:
+            continue
+        size = len(value) if isinstance(value, (str, bytes)) else len(_encode(value)[0])
+        if size < threshold:
+            continue
+        try:
+            ref = put_blob(store, value)
+        except Exception as e:
+            # 写入失败时保留原字段，保证结果可用
+            logger.warning(f"大字段转存失败，保留在结果中: {field}, Error={str(e)}")
+            continue
+        result.setdefault(BLOB_REFS_KEY, {})[field] = ref
+        result[field] = None
+    return result
+
+
+def resolve_fields(
+    result: Dict[str, Any],
+    store: Optional[BlobStore],
+    fields: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    按需把引用还原为原始值
+
+    Args:
+        result: 含 blob_refs 的结果字典（不修改原对象）
+        store: 存储实例
+        fields: 需要还原的字段，None 表示全部
+
+    Returns:
+        还原后的结果字典副本
+    """
+    refs = (result or {}).get(BLOB_REFS_KEY) if isinstance(result, dict) else None
+    if not refs or store is None:
+        return result
+    resolved = dict(result)
+    remaining = dict(refs)
+    for field, ref in refs.items():
+        if fields is not None and field not in fields:
+            continue
+        resolved[field] = get_blob(store, ref)
+        remaining.pop(field)
+    if remaining:
+        resolved[BLOB_REFS_KEY] = remaining
+    else:
+        resolved.pop(BLOB_REFS_KEY, None)
+    return resolved
@@ -27,26 +27,170 @@ class WorkerConfig:
         self.WORKER_PREFETCH_MULTIPLIER = int(
             os.getenv("WORKER_PREFETCH_MULTIPLIER", "1")
         )
+        # 单进程内同时处理的页面数
+        # 任务都提交到进程内的常驻事件循环，多个任务共享同一个浏览器实例
+        # 大于 1 时需配合线程池启动: celery ... worker -P threads -c <N>
+        self.WORKER_PAGE_CONCURRENCY = int(os.getenv("WORKER_PAGE_CONCURRENCY", "1"))
+        
+        # 任务软/硬超时（秒，0 表示不限制）；软超时时取消页面协程并释放页面与上下文
+        # 线程池模式下 Celery 不支持超时限制
+        self.TASK_SOFT_TIME_LIMIT = int(os.getenv("TASK_SOFT_TIME_LIMIT", "0")) or None
+        self.TASK_TIME_LIMIT = int(os.getenv("TASK_TIME_LIMIT", "0")) or None
         
         # 浏览器配置
         self.BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "true").lower() == "true"
         self.BROWSER_TIMEOUT = int(os.getenv("BROWSER_TIMEOUT", "30000"))  # 毫秒
         
+        # 静默等待 (wait_strategy="quiescent") 默认参数（毫秒）
+        # DOM 与网络同时静默的窗口、最长等待时间，以及视为长轮询而忽略的请求时长
+        self.QUIESCENCE_WINDOW_MS = int(os.getenv("QUIESCENCE_WINDOW_MS", "500"))
+        self.QUIESCENCE_MAX_WAIT_MS = int(os.getenv("QUIESCENCE_MAX_WAIT_MS", "10000"))
+        self.QUIESCENCE_LONG_REQUEST_MS = int(os.getenv("QUIESCENCE_LONG_REQUEST_MS", "5000"))
+        
         # 浏览器底层定制配置
         # 指定自定义 Chromium 可执行文件路径（如指纹浏览器内核）
         self.BROWSER_EXECUTABLE_PATH = os.getenv("BROWSER_EXECUTABLE_PATH")
         # 自定义启动参数（逗号分隔），例如: --disable-blink-features=AutomationControlled
         self.BROWSER_ARGS = os.getenv("BROWSER_ARGS", "").split(",") if os.getenv("BROWSER_ARGS") else []
         
+        # 每个 Worker 进程启动的浏览器实例数
+        # 单个浏览器的渲染/网络线程成为瓶颈时调大，新任务分配到打开页面最少的实例
+        self.BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+        
+        # 浏览器回收配置
+        # 单个浏览器实例最多处理的页面数，达到后后台重启并切换，0 表示不限
+        self.BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "1000"))
+        # 浏览器进程树内存上限 (MB)，超出后回收，0 表示不检查
+        self.BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "2048"))
+        # 内存巡检间隔（秒）
+        self.BROWSER_HEALTH_INTERVAL = float(os.getenv("BROWSER_HEALTH_INTERVAL", "30"))
+        # 回收时等待进行中页面完成的最长时间（秒）
+        self.BROWSER_DRAIN_TIMEOUT = float(os.getenv("BROWSER_DRAIN_TIMEOUT", "60"))
+        
+        # 上下文池配置
+        # 按 (代理, 指纹, UA) 复用预热好的 BrowserContext，租用间清空 Cookie 与存储
+        self.CONTEXT_POOL_ENABLED = os.getenv("CONTEXT_POOL_ENABLED", "true").lower() == "true"
+        # 每个 Key 最多保留的空闲上下文数
+        self.CONTEXT_POOL_MAX_IDLE = int(os.getenv("CONTEXT_POOL_MAX_IDLE", "2"))
+        # 单个上下文最多租用次数，超出后淘汰重建
+        self.CONTEXT_POOL_MAX_USES = int(os.getenv("CONTEXT_POOL_MAX_USES", "50"))
+        # 浏览器启动时为每个候选代理预创建的上下文数
+        self.CONTEXT_POOL_PREWARM = int(os.getenv("CONTEXT_POOL_PREWARM", "1"))
+        
+        # HTTP 快速通道配置 (options.render="auto")
+        # 可见文本少于该长度视为需要 JS 渲染的空壳页面
+        self.HTTP_FAST_PATH_MIN_TEXT = int(os.getenv("HTTP_FAST_PATH_MIN_TEXT", "200"))
+        # 每个代理出口的最大 HTTP 连接数
+        self.HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        
         # 代理配置
         self.PROXY_URL = os.getenv("PROXY_URL")
         self.PROXY_USERNAME = os.getenv("PROXY_USERNAME")
         self.PROXY_PASSWORD = os.getenv("PROXY_PASSWORD")
         
+        # 代理熔断：连续失败次数阈值、首次冷却时长与冷却上限（秒），再次熔断时冷却翻倍；
+        # 进程内代理池与分布式登记表共用
+        self.PROXY_FAILURE_THRESHOLD = int(os.getenv("PROXY_FAILURE_THRESHOLD", "3"))
+        self.PROXY_COOLDOWN = float(os.getenv("PROXY_COOLDOWN", "60"))
+        self.PROXY_MAX_COOLDOWN = float(os.getenv("PROXY_MAX_COOLDOWN", "900"))
+        
+        # 粘性代理：同一站点同一会话固定出口（也可在任务 options 中设置 sticky_proxy / session_id）
+        self.PROXY_STICKY_ENABLED = os.getenv("PROXY_STICKY_ENABLED", "false").lower() == "true"
+        # 粘性绑定空闲过期时间（秒）、单次绑定的请求预算、连续失败多少次后切换出口
+        self.PROXY_STICKY_TTL = float(os.getenv("PROXY_STICKY_TTL", "600"))
+        self.PROXY_STICKY_MAX_REQUESTS = int(os.getenv("PROXY_STICKY_MAX_REQUESTS", "100"))
+        self.PROXY_STICKY_MAX_FAILURES = int(os.getenv("PROXY_STICKY_MAX_FAILURES", "2"))
+        
+        # 分布式代理登记表：代理占用与健康状态存放在 Redis，所有 Worker 共享
+        self.PROXY_REGISTRY_ENABLED = os.getenv("PROXY_REGISTRY_ENABLED", "false").lower() == "true"
+        # 单个代理在整个集群中的最大并发数
+        self.PROXY_MAX_CONCURRENCY = int(os.getenv("PROXY_MAX_CONCURRENCY", "4"))
+        # 租约有效期（秒），Worker 异常退出未归还时超时回收
+        self.PROXY_LEASE_TTL = float(os.getenv("PROXY_LEASE_TTL", "600"))
+        # 全部代理占满时等待租约的最长时间（秒）
+        self.PROXY_LEASE_WAIT = float(os.getenv("PROXY_LEASE_WAIT", "30"))
+        # 健康检查探测地址（建议使用内网轻量端点），为空时不启用
+        self.PROXY_HEALTH_CHECK_URL = os.getenv("PROXY_HEALTH_CHECK_URL")
+        self.PROXY_HEALTH_CHECK_INTERVAL = float(os.getenv("PROXY_HEALTH_CHECK_INTERVAL", "60"))
+        
+        # 速率限制配置（与调度中心保持一致）
+        # 默认每域名每分钟最大请求数，可由任务 options["rate_limit"] 覆盖
+        self.RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+        # 限流算法: sliding_window（精确滑动窗口）或 gcra（每域名仅存一个时间戳，适合高配额/大量域名）
+        self.RATE_LIMIT_ALGORITHM = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window")
+        # GCRA 允许的最大突发请求数，0 表示等于每分钟上限
+        self.RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "0"))
+        # 本地许可租约：一次从 Redis 预取最多 N 个许可在本进程内消耗，块大小按需求与剩余额度自适应
+        # 1 表示不启用（每个请求都访问 Redis）
+        self.RATE_LIMIT_LEASE_BLOCK = int(os.getenv("RATE_LIMIT_LEASE_BLOCK", "1"))
+        # 租约有效期（秒），过期未用完的许可归还 Redis；应远小于限流窗口
+        self.RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "1.0"))
+        
+        # 按域名自适应限额（AIMD）：根据 429/503、挑战页与延迟上升自动调整每个域名的每分钟限额
+        # 新域名从 RATE_LIMIT_PER_MINUTE 开始，任务 options["rate_limit"] 仍优先生效
+        self.RATE_POLICY_ENABLED = os.getenv("RATE_POLICY_ENABLED", "false").lower() == "true"
+        # 默认下限 / 上限（每分钟），可通过 API 按域名覆盖
+        self.RATE_POLICY_MIN_LIMIT = float(os.getenv("RATE_POLICY_MIN_LIMIT", "6"))
+        self.RATE_POLICY_MAX_LIMIT = float(os.getenv("RATE_POLICY_MAX_LIMIT", "600"))
+        # 加性步长：满负荷运行一个窗口后增加的限额
+        self.RATE_POLICY_INCREASE = float(os.getenv("RATE_POLICY_INCREASE", "5"))
+        # 乘性系数：被限流、出现挑战页或延迟上升时限额乘以该值
+        self.RATE_POLICY_DECREASE = float(os.getenv("RATE_POLICY_DECREASE", "0.5"))
+        # 延迟 EWMA 超过基线该倍数时视为站点过载
+        self.RATE_POLICY_LATENCY_FACTOR = float(os.getenv("RATE_POLICY_LATENCY_FACTOR", "2.0"))
+        
+        # 会话状态缓存配置
+        # 按 (域名, 代理) 缓存 Cookie 与 localStorage，跳过重复的挑战页 / 登录页
+        # 默认关闭，也可在任务 options 中通过 reuse_storage_state 单独开启
+        self.STORAGE_STATE_CACHE_ENABLED = os.getenv("STORAGE_STATE_CACHE_ENABLED", "false").lower() == "true"
+        # 会话状态过期时间（秒）
+        self.STORAGE_STATE_TTL = int(os.getenv("STORAGE_STATE_TTL", "1800"))
+        
+        # Hook 事件实时推送配置
+        # 开启后事件经 expose_binding 分批推送到 Worker 的有界缓冲区（结果字段 hook_events），
+        # 内置 Hook 不再在页面内累积数据，依赖 __astraGetInterceptedData() 等页面内数据的
+        # Hook 会读到空结果，因此默认关闭，也可在任务 options 中通过 hook_stream 单独开启
+        self.HOOK_STREAM_ENABLED = os.getenv("HOOK_STREAM_ENABLED", "false").lower() == "true"
+        # 单个页面最多保留的事件数与总字节数，超出后丢弃新事件并计数
+        self.HOOK_STREAM_MAX_EVENTS = int(os.getenv("HOOK_STREAM_MAX_EVENTS", "5000"))
+        self.HOOK_STREAM_MAX_BYTES = int(os.getenv("HOOK_STREAM_MAX_BYTES", str(8 * 1024 * 1024)))
+        
+        # 子资源磁盘缓存配置
+        # 同一节点所有 Worker 进程共享的缓存目录，未设置时不启用
+        self.SUBRESOURCE_CACHE_DIR = os.getenv("SUBRESOURCE_CACHE_DIR")
+        # 缓存总大小上限 (MB) 与单个资源大小上限 (MB)
+        self.SUBRESOURCE_CACHE_MAX_MB = int(os.getenv("SUBRESOURCE_CACHE_MAX_MB", "1024"))
+        self.SUBRESOURCE_CACHE_MAX_ENTRY_MB = int(os.getenv("SUBRESOURCE_CACHE_MAX_ENTRY_MB", "10"))
+        # 缓存的资源类型（逗号分隔）
+        self.SUBRESOURCE_CACHE_TYPES = [
+            t.strip() for t in os.getenv("SUBRESOURCE_CACHE_TYPES", "script,stylesheet,font,image").split(",") if t.strip()
+        ]
+        
+        # 批量任务配置
+        # 单个批量任务内同时打开的页面数（仍受 WORKER_PAGE_CONCURRENCY 限制）
+        self.BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+        # 批量任务结果流在 Redis 中的保留时间（秒）
+        self.BATCH_RESULT_TTL = int(os.getenv("BATCH_RESULT_TTL", "3600"))
+        
+        # 大字段转存配置
+        # 存储地址: file:///data/blobs 或 s3://bucket/prefix?endpoint_url=http://minio:9000
+        # 未设置时结果原样返回
+        self.BLOB_STORE_URL = os.getenv("BLOB_STORE_URL")
+        # 超过该大小（字节）的字段压缩后转存，结果中只保留引用
+        self.BLOB_OFFLOAD_THRESHOLD = int(os.getenv("BLOB_OFFLOAD_THRESHOLD", "65536"))
+        # 候选字段（逗号分隔）
+        self.BLOB_OFFLOAD_FIELDS = [
+            f.strip() for f in os.getenv("BLOB_OFFLOAD_FIELDS", "html,hook_data,hook_events").split(",") if f.strip()
+        ]
+        
         # 重试配置
         self.MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
         self.RETRY_DELAY = int(os.getenv("RETRY_DELAY", "60"))  # 秒
         
+        # 监控配置
+        # Prometheus 指标端口，prefork 子进程按序号递增，未设置时不启动
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+        
         # 日志配置
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
         self.LOG_FILE = os.getenv("LOG_FILE")
@@ -1,64 +1,349 @@
 """
 简易代理池模块
 
-提供代理轮换和健康检查功能
+提供代理轮换和健康检查功能：根据爬取结果记录每个代理的成功率与延迟（EWMA），
+按健康分加权选择；连续失败达到阈值时熔断一段时间，冷却结束后放行一次探测请求。
+支持按 (域名, 会话) 粘性分配：同一会话在有效期与请求预算内固定使用同一个出口，
+出口连续失败或熔断时自动切换。
 """
+import time
 import random
 import logging
 import os
-from typing import Dict, Optional, List
+import threading
+from urllib.parse import urlparse
+from typing import Any, Dict, Iterable, Optional, List, Union
 
 logger = logging.getLogger(__name__)
 
+# 视为代理被封禁的响应状态码
+BAN_STATUS_CODES = frozenset({403, 407, 429})
+
+# 代理 URL 解析缓存上限
+_MAX_PARSED_CACHE = 1024
+
+# 粘性分配表超过该大小时清理过期条目
+_STICKY_PURGE_SIZE = 10000
+
+
+class ProxyHealth:
+    """单个代理的健康状态"""
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        # 延迟的指数加权移动平均（毫秒），尚无样本时为空
+        self.latency_ewma: Optional[float] = None
+        # 熔断截止时间（time.monotonic），为 0 表示未熔断
+        self.open_until = 0.0
+        # 冷却结束后放行探测请求的时间，为 0 表示未在探测
+        self.probe_started = 0.0
+        self.trips = 0
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ms": round(self.latency_ewma, 1) if self.latency_ewma is not None else None,
+            "circuit_open": self.open_until > now,
+            "trips": self.trips,
+        }
+
+
+class StickyAssignment:
+    """一个粘性会话当前绑定的代理"""
+
+    def __init__(self, proxy_url: str, expires_at: float):
+        self.proxy_url = proxy_url
+        self.expires_at = expires_at
+        self.requests = 1
+
+
 class ProxyPool:
     """简易代理池"""
-    
-    def __init__(self, proxy_list: List[str] = None):
+
+    def __init__(
+        self,
+        proxy_list: List[str] = None,
+        failure_threshold: int = 3,
+        cooldown: float = 60.0,
+        max_cooldown: float = 900.0,
+        latency_alpha: float = 0.3,
+        latency_ref_ms: float = 2000.0,
+        sticky_ttl: float = 600.0,
+        sticky_max_requests: int = 100,
+        sticky_max_failures: int = 2
+    ):
         """
         初始化代理池
-        
+
         Args:
             proxy_list: 代理列表，格式 ["http://user:pass@ip:port", ...]
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 首次熔断时长（秒），再次熔断时翻倍
+            max_cooldown: 熔断时长上限（秒）
+            latency_alpha: 延迟 EWMA 平滑系数
+            latency_ref_ms: 延迟参考值，延迟等于该值时健康分减半
+            sticky_ttl: 粘性会话空闲过期时间（秒），每次使用时顺延
+            sticky_max_requests: 单次粘性绑定最多承载的请求数，用完后重新分配
+            sticky_max_failures: 绑定的出口连续失败达到该次数时切换
         """
         self.proxies = proxy_list or []
         # 如果未提供列表，尝试从环境变量读取 (逗号分隔)
         if not self.proxies and os.getenv("PROXY_POOL"):
             self.proxies = [p.strip() for p in os.getenv("PROXY_POOL").split(",") if p.strip()]
-            
-    def get_proxy(self) -> Optional[Dict[str, str]]:
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.latency_alpha = latency_alpha
+        self.latency_ref_ms = latency_ref_ms
+        self.sticky_ttl = sticky_ttl
+        self.sticky_max_requests = max(1, sticky_max_requests)
+        self.sticky_max_failures = max(1, sticky_max_failures)
+
+        # 解析结果缓存，选择代理时不再重复解析 URL
+        self._parsed: Dict[str, Dict[str, str]] = {}
+        # 代理 Key（"账号@server"）-> 代理 URL，用于根据 Playwright 代理配置回报结果；
+        # 轮换网关常以不同账号共用同一个 server，只按 server 反查会把它们混为一个出口
+        self._by_key: Dict[str, str] = {}
+        self._health: Dict[str, ProxyHealth] = {}
+        # 粘性会话 Key -> 绑定的代理
+        self._sticky: Dict[str, StickyAssignment] = {}
+        self._lock = threading.Lock()
+        for proxy_url in self.proxies:
+            config = self._parsed[proxy_url] = self.parse_proxy(proxy_url)
+            self._by_key[self.proxy_key(config)] = proxy_url
+            self._health[proxy_url] = ProxyHealth()
+
+    @staticmethod
+    def proxy_key(proxy: Dict[str, str]) -> str:
+        """代理 Key: 带账号时为 "账号@server"，否则为 server（与上下文池 Key 中的代理部分一致）"""
+        server = proxy.get("server", "")
+        if proxy.get("username"):
+            return f"{proxy['username']}@{server}"
+        return server
+
+    def get_proxy(
+        self,
+        exclude: Optional[Iterable[str]] = None,
+        sticky_key: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
         """
-        随机获取一个代理配置
-        
+        按健康分加权选择一个代理配置
+
+        熔断中的代理不参与选择；全部熔断时选择最早结束冷却的代理，避免直连暴露本机 IP
+
+        Args:
+            exclude: 本次不使用的代理（代理 Key 或 URL），如重试前失败过的出口
+            sticky_key: 粘性会话 Key（如 "域名|会话 ID"），绑定仍有效时直接返回绑定的代理
+
         Returns:
             Dict: Playwright 代理配置格式 {"server": "...", "username": "...", "password": "..."}
         """
         if not self.proxies:
             return None
-            
-        proxy_url = random.choice(self.proxies)
-        return self._parse_proxy(proxy_url)
-        
-    def _parse_proxy(self, proxy_url: str) -> Dict[str, str]:
-        """解析代理 URL 为 Playwright 格式"""
+
+        excluded = set(exclude or ())
+        now = time.monotonic()
+        with self._lock:
+            avoid = None
+            if sticky_key is not None:
+                proxy_url, avoid = self._sticky_proxy(sticky_key, excluded, now)
+                if proxy_url is not None:
+                    return self._parsed[proxy_url]
+
+            candidates = [
+                p for p in self.proxies
+                if p not in excluded and self.proxy_key(self._parsed[p]) not in excluded
+            ] or list(self.proxies)
+            # 粘性出口劣化时优先改绑到其他出口
+            if avoid is not None and len(candidates) > 1:
+                candidates = [p for p in candidates if p != avoid]
+
+            available = []
+            weights = []
+            for proxy_url in candidates:
+                health = self._health[proxy_url]
+                if health.open_until > now:
+                    continue
+                if health.open_until and now - health.probe_started < self.cooldown:
+                    # 冷却结束后只放行一个探测请求，结果返回前（最长一个冷却周期）不再分配
+                    continue
+                available.append(proxy_url)
+                weights.append(self._score(health))
+
+            if available:
+                proxy_url = random.choices(available, weights=weights)[0]
+            else:
+                proxy_url = min(candidates, key=lambda p: self._health[p].open_until)
+
+            health = self._health[proxy_url]
+            if health.open_until and health.open_until <= now:
+                health.probe_started = now
+            if sticky_key is not None:
+                self._bind_sticky(sticky_key, proxy_url, now)
+        return self._parsed[proxy_url]
+
+    def _sticky_proxy(self, key: str, excluded: set, now: float):
+        """
+        检查粘性绑定（调用方持有锁），失效时删除绑定
+
+        Returns:
+            (仍有效的代理 URL, 因劣化需要避开的代理 URL)
+        """
+        assignment = self._sticky.get(key)
+        if assignment is None:
+            return None, None
+        proxy_url = assignment.proxy_url
+        health = self._health.get(proxy_url)
+        degraded = health is None or health.open_until > now or (
+            health.consecutive_failures >= self.sticky_max_failures
+        )
+        valid = (
+            not degraded
+            and assignment.expires_at > now
+            and assignment.requests < self.sticky_max_requests
+            and proxy_url not in excluded
+            and self.proxy_key(self._parsed[proxy_url]) not in excluded
+        )
+        if not valid:
+            # 过期、预算用完或出口劣化，重新分配
+            del self._sticky[key]
+            return None, proxy_url if degraded else None
+        assignment.requests += 1
+        assignment.expires_at = now + self.sticky_ttl
+        return proxy_url, None
+
+    def _bind_sticky(self, key: str, proxy_url: str, now: float):
+        """建立粘性绑定（调用方持有锁）"""
+        if len(self._sticky) >= _STICKY_PURGE_SIZE:
+            self._sticky = {k: v for k, v in self._sticky.items() if v.expires_at > now}
+        self._sticky[key] = StickyAssignment(proxy_url, now + self.sticky_ttl)
+
+    def _score(self, health: ProxyHealth) -> float:
+        """健康分: 平滑后的成功率 × 延迟因子"""
+        success_rate = (health.successes + 1) / (health.successes + health.failures + 2)
+        latency = health.latency_ewma if health.latency_ewma is not None else self.latency_ref_ms
+        return success_rate * self.latency_ref_ms / (self.latency_ref_ms + latency)
+
+    def report(
+        self,
+        proxy: Union[str, Dict[str, str], None],
+        success: bool,
+        latency_ms: Optional[float] = None
+    ):
+        """
+        回报一次使用结果
+
+        Args:
+            proxy: 代理 URL、代理 Key 或 Playwright 代理配置；不属于代理池时忽略
+            success: 是否成功（被封禁的响应视为失败）
+            latency_ms: 请求耗时（毫秒）
+        """
+        proxy_url = self.lookup(proxy)
+        if proxy_url is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            health = self._health[proxy_url]
+            if latency_ms is not None:
+                if health.latency_ewma is None:
+                    health.latency_ewma = float(latency_ms)
+                else:
+                    health.latency_ewma += self.latency_alpha * (latency_ms - health.latency_ewma)
+
+            if success:
+                health.successes += 1
+                health.consecutive_failures = 0
+                if health.open_until:
+                    logger.info(f"代理恢复: {self._parsed[proxy_url]['server']}")
+                health.open_until = 0.0
+                health.probe_started = 0.0
+                health.trips = 0
+                return
+
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.open_until > now:
+                # 熔断前已分配出去的请求陆续失败，不重复熔断
+                return
+            # 探测请求失败或连续失败达到阈值时熔断，冷却时长按熔断次数翻倍
+            if health.probe_started or health.consecutive_failures >= self.failure_threshold:
+                health.trips += 1
+                cooldown = min(self.cooldown * 2 ** (health.trips - 1), self.max_cooldown)
+                health.open_until = now + cooldown
+                health.probe_started = 0.0
+                logger.warning(
+                    f"代理熔断 {cooldown:.0f}s: {self._parsed[proxy_url]['server']}, "
+                    f"连续失败 {health.consecutive_failures} 次"
+                )
+
+    def lookup(self, proxy: Union[str, Dict[str, str], None]) -> Optional[str]:
+        """
+        反查代理池中的代理 URL
+
+        Args:
+            proxy: 代理 URL、代理 Key（"账号@server"）或 Playwright 代理配置
+
+        Returns:
+            代理 URL；不属于代理池时返回 None
+        """
+        if not proxy:
+            return None
+        if isinstance(proxy, dict):
+            return self._by_key.get(self.proxy_key(proxy))
+        if proxy in self._health:
+            return proxy
+        return self._by_key.get(proxy)
+
+    def parsed_proxies(self) -> List[Dict[str, str]]:
+        """返回所有代理的 Playwright 配置（已缓存）"""
+        return [self._parsed[p] for p in self.proxies]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """按代理 Key 返回各代理的健康状态"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                self.proxy_key(self._parsed[p]): dict(
+                    self._health[p].as_dict(now), score=round(self._score(self._health[p]), 4)
+                )
+                for p in self.proxies
+            }
+
+    def parse_proxy(self, proxy_url: str) -> Dict[str, str]:
+        """解析代理 URL 为 Playwright 格式（结果按 URL 缓存，调用方不应修改返回的字典）"""
+        cached = self._parsed.get(proxy_url)
+        if cached is not None:
+            return cached
         try:
             # 简单解析逻辑，支持 http://user:pass@ip:port 或 http://ip:port
-            from urllib.parse import urlparse
             parsed = urlparse(proxy_url)
-            
+
             config = {
                 "server": f"{parsed.scheme}://{parsed.hostname}:{parsed.port}"
             }
-            
+
             if parsed.username and parsed.password:
                 config["username"] = parsed.username
                 config["password"] = parsed.password
-                
-            return config
         except Exception as e:
             logger.error(f"代理解析失败 {proxy_url}: {e}")
-            return {"server": proxy_url}
+            config = {"server": proxy_url}
+        # 任务 options 中的临时代理也会经过这里，限制缓存规模
+        if len(self._parsed) < _MAX_PARSED_CACHE:
+            self._parsed[proxy_url] = config
+        return config
 
 # 全局单例
-proxy_pool = ProxyPool()
-
-
+proxy_pool = ProxyPool(
+    failure_threshold=int(os.getenv("PROXY_FAILURE_THRESHOLD", "3")),
+    cooldown=float(os.getenv("PROXY_COOLDOWN", "60")),
+    max_cooldown=float(os.getenv("PROXY_MAX_COOLDOWN", "900")),
+    sticky_ttl=float(os.getenv("PROXY_STICKY_TTL", "600")),
+    sticky_max_requests=int(os.getenv("PROXY_STICKY_MAX_REQUESTS", "100")),
+    sticky_max_failures=int(os.getenv("PROXY_STICKY_MAX_FAILURES", "2")),
+)
@@ -0,0 +1,512 @@
+"""
+分布式代理登记模块
+
+代理列表、并发占用与健康状态统一存放在 Redis 中，所有 Worker 进程共享：
+租用时由 Lua 脚本原子地选出占用最少、未熔断且未达到并发上限的代理并加一，
+归还时减一；每次使用的请求数、字节数、成功/失败与延迟写入同一个 Hash。
+Worker 异常退出未归还的租约在过期后自动回收。
+
+Redis 数据结构:
+    astra:proxy:load            ZSET  代理 ID -> 当前租约数
+    astra:proxy:leases          ZSET  "代理 ID|租约 ID" -> 过期时间
+    astra:proxy:{id}            HASH  url / requests / bytes / successes / failures /
+                                      consecutive_failures / latency_ms / open_until / trips
+    astra:proxy:sticky:{key}    HASH  pid / requests（粘性会话绑定，空闲过期）
+"""
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+import redis.asyncio as aioredis
+
+from .proxy_pool import proxy_pool
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "astra:proxy:"
+LOAD_KEY = "astra:proxy:load"
+LEASES_KEY = "astra:proxy:leases"
+HEALTH_LOCK_KEY = "astra:proxy:health_lock"
+STICKY_KEY = "astra:proxy:sticky:{sticky_key}"
+
+# 回收过期租约后选出代理：粘性绑定仍有效时优先使用绑定的代理，
+# 否则按占用从少到多选出第一个未熔断且未达到并发上限的代理
+# KEYS: 占用 ZSET, 租约 ZSET, 粘性绑定 HASH
+# ARGV: 当前时间, 并发上限, 租约有效期, 租约 ID, Key 前缀,
+#       粘性有效期(0 表示不绑定), 粘性请求预算, 粘性连续失败上限, 排除的代理 ID...
+# 返回 {代理 ID, URL}；登记表为空时返回 0，全部占满或熔断时返回 false
+_LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cap = tonumber(ARGV[2])
+local sticky_ttl = tonumber(ARGV[6])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    local pid = string.match(member, '^(.-)|')
+    local load = tonumber(redis.call('ZSCORE', KEYS[1], pid) or '-1')
+    if load > 0 then
+        redis.call('ZINCRBY', KEYS[1], -1, pid)
+    end
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    return 0
+end
+local excluded = {}
+for i = 9, #ARGV do
+    excluded[ARGV[i]] = true
+end
+
+local function take(pid, url)
+    redis.call('ZINCRBY', KEYS[1], 1, pid)
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), pid .. '|' .. ARGV[4])
+    if sticky_ttl > 0 then
+        if redis.call('HGET', KEYS[3], 'pid') == pid then
+            redis.call('HINCRBY', KEYS[3], 'requests', 1)
+        else
+            redis.call('HSET', KEYS[3], 'pid', pid, 'requests', 1)
+        end
+        redis.call('EXPIRE', KEYS[3], sticky_ttl)
+    end
+    return {pid, url}
+end
+
+-- 粘性绑定的代理劣化时，优先改绑到其他代理
+local avoid = nil
+if sticky_ttl > 0 then
+    local sticky = redis.call('HMGET', KEYS[3], 'pid', 'requests')
+    local pid = sticky[1]
+    if pid and not excluded[pid] then
+        local load = tonumber(redis.call('ZSCORE', KEYS[1], pid) or '-1')
+        local info = redis.call('HMGET', ARGV[5] .. pid, 'url', 'open_until', 'consecutive_failures')
+        if tonumber(info[3] or '0') >= tonumber(ARGV[8]) then
+            avoid = pid
+        elseif load >= 0 and load < cap and info[1] and tonumber(info[2] or '0') <= now
+                and tonumber(sticky[2] or '0') < tonumber(ARGV[7]) then
+            return take(pid, info[1])
+        end
+    end
+end
+
+local candidates = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. cap)
+local fallback = nil
+for _, pid in ipairs(candidates) do
+    if not excluded[pid] then
+        local info = redis.call('HMGET', ARGV[5] .. pid, 'url', 'open_until')
+        if info[1] and tonumber(info[2] or '0') <= now then
+            if pid ~= avoid then
+                return take(pid, info[1])
+            end
+            fallback = info[1]
+        end
+    end
+end
+if fallback then
+    return take(avoid, fallback)
+end
+return false
+"""
+
+# 归还租约：租约仍存在时才减少占用，避免与过期回收重复扣减
+_RELEASE_SCRIPT = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 1 then
+    local load = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[2]) or '0')
+    if load > 0 then
+        redis.call('ZINCRBY', KEYS[1], -1, ARGV[2])
+    end
+    return 1
+end
+return 0
+"""
+
+# 记录一次使用结果并更新共享健康状态；与进程内代理池一致，冷却时长按连续熔断次数翻倍，
+# 成功后清零。冷却结束后连续失败计数仍在阈值之上，下一次失败即再次熔断（相当于探测失败）
+# ARGV: 结果('1' 成功 / '0' 失败 / '' 不计入健康), 延迟(ms 或 ''), 字节数, 当前时间,
+#       熔断阈值, 首次冷却时长, EWMA 系数, 是否计入请求数, 冷却上限
+# 返回本次熔断的冷却时长，未熔断时返回 0
+_RECORD_SCRIPT = """
+if ARGV[8] == '1' then
+    redis.call('HINCRBY', KEYS[1], 'requests', 1)
+end
+local nbytes = tonumber(ARGV[3])
+if nbytes > 0 then
+    redis.call('HINCRBY', KEYS[1], 'bytes', nbytes)
+end
+if ARGV[2] ~= '' then
+    local latency = tonumber(ARGV[2])
+    local old = tonumber(redis.call('HGET', KEYS[1], 'latency_ms') or '')
+    if old then
+        latency = old + tonumber(ARGV[7]) * (latency - old)
+    end
+    redis.call('HSET', KEYS[1], 'latency_ms', tostring(latency))
+end
+if ARGV[1] == '1' then
+    redis.call('HINCRBY', KEYS[1], 'successes', 1)
+    redis.call('HSET', KEYS[1], 'consecutive_failures', 0, 'open_until', 0, 'trips', 0)
+elseif ARGV[1] == '0' then
+    redis.call('HINCRBY', KEYS[1], 'failures', 1)
+    local streak = redis.call('HINCRBY', KEYS[1], 'consecutive_failures', 1)
+    local now = tonumber(ARGV[4])
+    local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until') or '0')
+    if streak >= tonumber(ARGV[5]) and open_until <= now then
+        local trips = redis.call('HINCRBY', KEYS[1], 'trips', 1)
+        local cooldown = math.min(tonumber(ARGV[6]) * 2 ^ (trips - 1), tonumber(ARGV[9]))
+        redis.call('HSET', KEYS[1], 'open_until', now + cooldown)
+        return tostring(cooldown)
+    end
+end
+return 0
+"""
+
+
+def proxy_id(proxy_url: str) -> str:
+    """代理 ID（取 URL 哈希，避免账号出现在 Key 中）"""
+    return hashlib.sha1(proxy_url.encode("utf-8")).hexdigest()[:12]
+
+
+class ProxyLease:
+    """一次代理租约"""
+
+    def __init__(self, proxy_id: str, url: str, lease_id: str):
+        self.proxy_id = proxy_id
+        self.url = url
+        self.lease_id = lease_id
+        # Playwright 代理配置（复用代理池的解析缓存）
+        self.proxy = proxy_pool.parse_proxy(url)
+        self.released = False
+
+    @property
+    def member(self) -> str:
+        return f"{self.proxy_id}|{self.lease_id}"
+
+
+class ProxyRegistry:
+    """基于 Redis 的分布式代理登记表"""
+
+    def __init__(
+        self,
+        redis_url: str,
+        max_concurrency: int = 4,
+        lease_ttl: float = 600,
+        failure_threshold: int = 3,
+        cooldown: float = 60,
+        max_cooldown: float = 900,
+        latency_alpha: float = 0.3,
+        sticky_ttl: float = 600,
+        sticky_max_requests: int = 100,
+        sticky_max_failures: int = 2
+    ):
+        """
+        Args:
+            redis_url: Redis 连接 URL
+            max_concurrency: 单个代理在整个集群中的最大并发租约数
+            lease_ttl: 租约有效期（秒），超时未归还时自动回收
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 首次熔断时长（秒），再次熔断时翻倍
+            max_cooldown: 熔断时长上限（秒）
+            latency_alpha: 延迟 EWMA 平滑系数
+            sticky_ttl: 粘性会话空闲过期时间（秒）
+            sticky_max_requests: 单次粘性绑定最多承载的请求数
+            sticky_max_failures: 绑定的代理连续失败达到该次数时切换
+        """
+        self.redis = aioredis.from_url(redis_url)
+        self.max_concurrency = max(1, max_concurrency)
+        self.lease_ttl = lease_ttl
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.latency_alpha = latency_alpha
+        self.sticky_ttl = sticky_ttl
+        self.sticky_max_requests = max(1, sticky_max_requests)
+        self.sticky_max_failures = max(1, sticky_max_failures)
+        self._lease_script = self.redis.register_script(_LEASE_SCRIPT)
+        self._release_script = self.redis.register_script(_RELEASE_SCRIPT)
+        self._record_script = self.redis.register_script(_RECORD_SCRIPT)
+
+    async def register(self, proxy_urls: Iterable[str]) -> int:
+        """
+        登记代理（已存在的代理保留原有统计与占用）
+
+        Returns:
+            登记的代理数
+        """
+        urls = list(proxy_urls)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for url in urls:
+                pid = proxy_id(url)
+                pipe.hsetnx(_KEY_PREFIX + pid, "url", url)
+                pipe.zadd(LOAD_KEY, {pid: 0}, nx=True)
+            await pipe.execute()
+        return len(urls)
+
+    async def remove(self, proxy_url: str):
+        """移除代理（进行中的租约归还时不再计入）"""
+        pid = proxy_id(proxy_url)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(LOAD_KEY, pid)
+            pipe.delete(_KEY_PREFIX + pid)
+            await pipe.execute()
+
+    async def try_lease(
+        self,
+        exclude: Optional[Iterable[str]] = None,
+        sticky_key: Optional[str] = None
+    ) -> Any:
+        """
+        尝试租用一个代理
+
+        粘性绑定的代理过期、预算用完、熔断、连续失败或达到并发上限时自动改绑其他代理
+
+        Args:
+            exclude: 不使用的代理（代理 Key、URL 或代理 ID）
+            sticky_key: 粘性会话 Key（如 "域名|会话 ID"）
+
+        Returns:
+            ProxyLease；登记表为空时返回 None；全部占满或熔断时返回 False
+        """
+        excluded = [self._exclude_id(p) for p in exclude or ()]
+        lease_id = uuid.uuid4().hex
+        sticky = STICKY_KEY.format(sticky_key=sticky_key or "")
+        result = await self._lease_script(
+            keys=[LOAD_KEY, LEASES_KEY, sticky],
+            args=[
+                time.time(), self.max_concurrency, self.lease_ttl, lease_id, _KEY_PREFIX,
+                max(1, int(self.sticky_ttl)) if sticky_key else 0,
+                self.sticky_max_requests, self.sticky_max_failures,
+                *excluded,
+            ],
+        )
+        if result == 0:
+            return None
+        if not result:
+            return False
+        pid, url = (v.decode() if isinstance(v, bytes) else v for v in result)
+        return ProxyLease(pid, url, lease_id)
+
+    async def lease(
+        self,
+        exclude: Optional[Iterable[str]] = None,
+        timeout: float = 30,
+        sticky_key: Optional[str] = None
+    ) -> Optional[ProxyLease]:
+        """
+        租用一个代理，全部占满时等待其他任务归还
+
+        Returns:
+            ProxyLease；登记表为空时返回 None
+
+        Raises:
+            TimeoutError: 超过 timeout 仍没有可用代理
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.1
+        while True:
+            result = await self.try_lease(exclude, sticky_key)
+            if result is not False:
+                return result
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError("等待可用代理超时（全部达到并发上限或熔断中）")
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, 1.0)
+
+    async def release(self, lease: ProxyLease):
+        """归还租约（重复归还无副作用）"""
+        if lease.released:
+            return
+        lease.released = True
+        try:
+            await self._release_script(keys=[LOAD_KEY, LEASES_KEY], args=[lease.member, lease.proxy_id])
+        except Exception as e:
+            # 未归还的租约会在过期后被回收
+            logger.warning(f"归还代理租约失败: {lease.proxy['server']}, Error={str(e)}")
+
+    async def record(
+        self,
+        pid: str,
+        success: Optional[bool],
+        latency_ms: Optional[float] = None,
+        nbytes: int = 0,
+        count_request: bool = True
+    ):
+        """
+        记录一次使用结果
+
+        Args:
+            pid: 代理 ID
+            success: 是否成功；None 表示与代理无关的失败，只计入请求数
+            latency_ms: 请求耗时（毫秒）
+            nbytes: 传输字节数
+            count_request: 是否计入请求数（健康探测不计入）
+        """
+        try:
+            tripped = await self._record_script(
+                keys=[_KEY_PREFIX + pid],
+                args=[
+                    "" if success is None else int(success),
+                    "" if latency_ms is None else latency_ms,
+                    int(nbytes),
+                    time.time(),
+                    self.failure_threshold,
+                    self.cooldown,
+                    self.latency_alpha,
+                    int(count_request),
+                    self.max_cooldown,
+                ],
+            )
+            if tripped:
+                logger.warning(f"代理熔断 {float(tripped):.0f}s: {pid}")
+        except Exception as e:
+            logger.warning(f"记录代理使用结果失败: {pid}, Error={str(e)}")
+
+    async def proxies(self) -> Dict[str, str]:
+        """返回所有登记的代理 {代理 ID: URL}"""
+        ids = [v.decode() if isinstance(v, bytes) else v for v in await self.redis.zrange(LOAD_KEY, 0, -1)]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pid in ids:
+                pipe.hget(_KEY_PREFIX + pid, "url")
+            urls = await pipe.execute()
+        return {
+            pid: url.decode() if isinstance(url, bytes) else url
+            for pid, url in zip(ids, urls) if url
+        }
+
+    async def stats(self) -> Dict[str, Dict[str, Any]]:
+        """按代理 Key（"账号@server"）返回各代理的占用与统计"""
+        loads = await self.redis.zrange(LOAD_KEY, 0, -1, withscores=True)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pid, _ in loads:
+                pipe.hgetall(_KEY_PREFIX + (pid.decode() if isinstance(pid, bytes) else pid))
+            infos = await pipe.execute()
+
+        now = time.time()
+        stats = {}
+        for (pid, load), info in zip(loads, infos):
+            info = {
+                (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in info.items()
+            }
+            if "url" not in info:
+                continue
+            stats[proxy_pool.proxy_key(proxy_pool.parse_proxy(info["url"]))] = {
+                "in_flight": int(load),
+                "requests": int(info.get("requests", 0)),
+                "bytes": int(info.get("bytes", 0)),
+                "successes": int(info.get("successes", 0)),
+                "failures": int(info.get("failures", 0)),
+                "latency_ms": round(float(info["latency_ms"]), 1) if info.get("latency_ms") else None,
+                "circuit_open": float(info.get("open_until", 0)) > now,
+                "trips": int(info.get("trips", 0)),
+            }
+        return stats
+
+    def _exclude_id(self, proxy: str) -> str:
+        """把代理 Key / URL 转换为代理 ID"""
+        if "://" not in proxy:
+            return proxy
+        # 代理 Key 不含密码，需通过代理池反查原始 URL
+        return proxy_id(proxy_pool.lookup(proxy) or proxy)
+
+    async def close(self):
+        """关闭 Redis 连接"""
+        try:
+            await self.redis.aclose()
+        except Exception as e:
+            logger.debug(f"关闭代理登记表连接失败: {e}")
+
+
+class ProxyHealthChecker:
+    """
+    后台代理健康检查
+
+    定期通过每个代理请求探测地址（建议使用内网中的轻量端点），结果写入共享健康状态；
+    借助 Redis 锁保证同一周期内只有一个 Worker 进程执行探测
+    """
+
+    def __init__(
+        self,
+        registry: ProxyRegistry,
+        check_url: str,
+        interval: float = 60,
+        timeout: float = 10,
+        concurrency: int = 10
+    ):
+        """
+        Args:
+            registry: 代理登记表
+            check_url: 探测地址
+            interval: 探测周期（秒）
+            timeout: 单次探测超时（秒）
+            concurrency: 同时探测的代理数
+        """
+        self.registry = registry
+        self.check_url = check_url
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """在当前事件循环中启动后台检查任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                # 同一周期内只有拿到锁的进程执行探测
+                if await self.registry.redis.set(HEALTH_LOCK_KEY, "1", nx=True, ex=max(1, int(self.interval))):
+                    await self.check_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"代理健康检查失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self) -> Dict[str, bool]:
+        """探测所有登记的代理，返回 {代理 ID: 是否可用}"""
+        proxies = await self.registry.proxies()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(pid: str, url: str) -> bool:
+            async with semaphore:
+                ok, latency = await self.probe(url)
+                await self.registry.record(
+                    pid, ok, latency_ms=latency if ok else None, count_request=False
+                )
+                return ok
+
+        results = await asyncio.gather(*(check(pid, url) for pid, url in proxies.items()))
+        healthy = sum(results)
+        logger.info(f"代理健康检查完成: {healthy}/{len(results)} 可用")
+        return dict(zip(proxies, results))
+
+    async def probe(self, proxy_url: str):
+        """
+        通过代理请求探测地址
+
+        Returns:
+            (是否可用, 延迟毫秒)
+        """
+        started = time.monotonic()
+        try:
+            async with httpx.AsyncClient(proxy=proxy_url, timeout=self.timeout) as client:
+                response = await client.get(self.check_url)
+            ok = response.status_code < 400
+        except Exception as e:
+            logger.debug(f"代理探测失败: {proxy_pool.parse_proxy(proxy_url)['server']}, Error={str(e)}")
+            ok = False
+        return ok, (time.monotonic() - started) * 1000
+
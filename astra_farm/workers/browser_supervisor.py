@@ -0,0 +1,487 @@
+"""
+浏览器监管模块
+
+跟踪浏览器实例的页面处理数、进程内存 (RSS) 与断连事件，在达到阈值或崩溃时
+后台启动新实例并无缝切换，旧实例等待进行中的页面处理完成后再关闭。
+
+BrowserPool 在同一进程内管理多个相互独立的监管器，新任务分配到打开页面最少的
+浏览器上；某个浏览器崩溃只影响其自身的页面，其余浏览器照常服务。
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .metrics import BROWSER_RECYCLES, BROWSER_PAGES_SERVED, BROWSER_RSS_BYTES, BROWSER_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Chromium 主进程名特征（/proc/<pid>/stat 中的 comm 字段）
+_BROWSER_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+def _read_proc_table() -> Dict[int, tuple]:
+    """读取 /proc 进程表: pid -> (ppid, comm)"""
+    table = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return table
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm 可能包含空格，以最后一个 ')' 为界解析
+        comm = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        table[int(entry)] = (int(fields[1]), comm)
+    return table
+
+
+def _descendants(pid: int, table: Dict[int, tuple]) -> List[int]:
+    """返回进程的所有后代进程"""
+    children: Dict[int, List[int]] = {}
+    for child, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(child)
+    result, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _is_browser_process(comm: str) -> bool:
+    comm = comm.lower()
+    return any(name in comm for name in _BROWSER_PROCESS_NAMES)
+
+
+def browser_root_pids() -> Set[int]:
+    """返回当前进程下所有 Chromium 主进程的 PID（仅 Linux）"""
+    table = _read_proc_table()
+    roots = set()
+    for pid in _descendants(os.getpid(), table):
+        ppid, comm = table[pid]
+        if _is_browser_process(comm) and not _is_browser_process(table.get(ppid, (0, ""))[1]):
+            roots.add(pid)
+    return roots
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """返回进程及其后代的 RSS 总和（字节），无法读取时返回 None"""
+    table = _read_proc_table()
+    if pid not in table:
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for p in [pid] + _descendants(pid, table):
+        try:
+            with open(f"/proc/{p}/statm", "r") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class BrowserSlot:
+    """一个浏览器实例及其运行状态"""
+
+    def __init__(self, browser: Any, generation: int, pid: Optional[int] = None):
+        """
+        Args:
+            browser: Playwright Browser
+            generation: 实例代数（每次重启递增）
+            pid: Chromium 主进程 PID（用于 RSS 统计，可能为空）
+        """
+        self.browser = browser
+        self.generation = generation
+        self.pid = pid
+        self.launched_at = time.monotonic()
+        self.in_flight = 0
+        self.pages_served = 0
+        self.retiring = False
+        self.drained = asyncio.Event()
+        # 当前打开的页面数（批量任务一次占用会打开多个页面）
+        self.open_pages = 0
+        # 所属监管器，由监管器在启动实例时设置
+        self.owner: Optional["BrowserSupervisor"] = None
+        # 附属于该浏览器的资源（如上下文池），由 on_launch 回调设置
+        self.context_pool = None
+
+
+class BrowserSupervisor:
+    """浏览器实例监管器"""
+
+    def __init__(
+        self,
+        launcher: Callable[[], Awaitable[Any]],
+        max_pages: int = 0,
+        max_rss_mb: int = 0,
+        check_interval: float = 30.0,
+        drain_timeout: float = 60.0,
+        on_launch: Optional[Callable[[BrowserSlot], Awaitable[None]]] = None,
+        on_close: Optional[Callable[[BrowserSlot], Awaitable[None]]] = None,
+        name: str = "0",
+        launch_lock: Optional[asyncio.Lock] = None,
+    ):
+        """
+        初始化监管器
+
+        Args:
+            launcher: 启动浏览器并返回 Browser 的协程函数
+            max_pages: 单个实例最多处理的页面数，0 表示不限
+            max_rss_mb: 实例进程树 RSS 上限 (MB)，0 表示不检查
+            check_interval: 内存巡检间隔（秒）
+            drain_timeout: 回收时等待进行中页面完成的最长时间（秒）
+            on_launch: 新实例启动后的回调
+            on_close: 实例关闭前的回调
+            name: 监管器名称（多浏览器时用于区分指标与日志）
+            launch_lock: 多个监管器共用的启动锁，保证按进程差集识别主进程 PID 时不串号
+        """
+        self.launcher = launcher
+        self.max_pages = max_pages
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.check_interval = check_interval
+        self.drain_timeout = drain_timeout
+        self.on_launch = on_launch
+        self.on_close = on_close
+        self.name = name
+        self._launch_lock = launch_lock
+
+        self._current: Optional[BrowserSlot] = None
+        # 已启动但尚未关闭的实例（含启动中与排空中的实例），关闭监管器时统一关闭
+        self._slots: Set[BrowserSlot] = set()
+        # 被取消时仍在进行的浏览器启动，关闭监管器时等待完成后关闭
+        self._launches: Set[asyncio.Future] = set()
+        self._ready = asyncio.Event()
+        self._recycle_task: Optional[asyncio.Task] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._generation = 0
+        self._closed = False
+
+        # 统计信息
+        self.recycle_count = 0
+        self.recycle_reasons: Dict[str, int] = {}
+        self.last_recycle_reason: Optional[str] = None
+
+    @property
+    def current(self) -> Optional[BrowserSlot]:
+        """当前服务中的浏览器实例"""
+        return self._current
+
+    @property
+    def ready(self) -> bool:
+        """当前实例是否可以立即接收新页面"""
+        slot = self._current
+        return (
+            not self._closed
+            and self._ready.is_set()
+            and slot is not None
+            and slot.browser.is_connected()
+        )
+
+    def load(self) -> tuple:
+        """当前实例的负载: (打开页面数, 占用数)，用于选择最空闲的浏览器"""
+        slot = self._current
+        if slot is None:
+            return (float("inf"), float("inf"))
+        return (slot.open_pages, slot.in_flight)
+
+    def check_connected(self) -> bool:
+        """
+        检查当前实例是否可用
+
+        就绪标记与实际状态不一致（断连事件尚未处理）时，标记未就绪并触发重启
+        """
+        slot = self._current
+        if slot is not None and slot.browser.is_connected():
+            return True
+        if not self._closed:
+            self._ready.clear()
+            self.request_recycle("crash")
+        return False
+
+    async def wait_ready(self):
+        """等待实例就绪"""
+        await self._ready.wait()
+
+    async def start(self):
+        """启动首个浏览器实例与内存巡检"""
+        self._current = await self._launch_slot()
+        self._ready.set()
+        if self.max_rss_bytes and self.check_interval > 0:
+            self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def acquire(self) -> BrowserSlot:
+        """
+        获取一个浏览器实例用于处理页面
+
+        崩溃重启期间会等待新实例就绪，而不是让任务失败
+        """
+        while True:
+            if self._closed:
+                raise RuntimeError("浏览器监管器已关闭")
+            await self._ready.wait()
+            if self.check_connected():
+                break
+        slot = self._current
+        slot.in_flight += 1
+        BROWSER_IN_FLIGHT.inc()
+        return slot
+
+    def release(self, slot: BrowserSlot, pages: int = 1):
+        """
+        页面处理完成后归还实例
+
+        Args:
+            slot: acquire 返回的实例
+            pages: 本次占用期间处理的页面数（批量任务一次占用处理多个页面）
+        """
+        slot.in_flight -= 1
+        slot.pages_served += pages
+        BROWSER_IN_FLIGHT.dec()
+
+        if slot.retiring:
+            if slot.in_flight <= 0:
+                slot.drained.set()
+            return
+
+        BROWSER_PAGES_SERVED.labels(browser=self.name).set(slot.pages_served)
+        if self.max_pages and slot.pages_served >= self.max_pages:
+            self.request_recycle("pages")
+
+    def request_recycle(self, reason: str):
+        """
+        请求回收当前实例（幂等，回收进行中时忽略）
+
+        Args:
+            reason: 回收原因: pages / rss / crash / manual
+        """
+        if self._closed or (self._recycle_task and not self._recycle_task.done()):
+            return
+
+        self.recycle_count += 1
+        self.recycle_reasons[reason] = self.recycle_reasons.get(reason, 0) + 1
+        self.last_recycle_reason = reason
+        BROWSER_RECYCLES.labels(reason=reason).inc()
+
+        logger.warning(f"浏览器实例回收 [{self.name}]: reason={reason}, 累计 {self.recycle_count} 次")
+        if reason == "crash":
+            # 旧实例已不可用，新任务需等待新实例就绪
+            self._ready.clear()
+        self._recycle_task = asyncio.create_task(self._recycle())
+
+    async def _recycle(self):
+        """后台启动新实例，切换后等待旧实例排空并关闭"""
+        old = self._current
+
+        delay = 1.0
+        while not self._closed:
+            try:
+                new = await self._launch_slot()
+                break
+            except Exception as e:
+                logger.error(f"浏览器重启失败，{delay:.0f}s 后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        else:
+            return
+
+        self._current = new
+        self._ready.set()
+        BROWSER_PAGES_SERVED.labels(browser=self.name).set(0)
+        logger.info(f"浏览器实例已切换 [{self.name}]: generation {old.generation if old else '-'} -> {new.generation}")
+
+        if old is not None:
+            await self._retire(old)
+
+    async def _retire(self, slot: BrowserSlot):
+        """排空并关闭旧实例"""
+        slot.retiring = True
+        if slot.in_flight > 0:
+            try:
+                await asyncio.wait_for(slot.drained.wait(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"旧浏览器实例排空超时，仍有 {slot.in_flight} 个页面，强制关闭")
+        # 关闭过程不可中断，否则已移出 _slots 的实例无人关闭；排空等待被取消时由 close 关闭
+        await asyncio.shield(self._close_slot(slot))
+
+    async def _launch_slot(self) -> BrowserSlot:
+        """启动一个新的浏览器实例"""
+        # 浏览器启动不可中断：被取消时启动继续完成，由 close 关闭启动出来的实例
+        launch = asyncio.ensure_future(self._launch_browser())
+        self._launches.add(launch)
+        browser, pid = await asyncio.shield(launch)
+        self._launches.discard(launch)
+
+        self._generation += 1
+        slot = BrowserSlot(browser, self._generation, pid=pid)
+        slot.owner = self
+        self._slots.add(slot)
+        browser.on("disconnected", lambda _: self._on_disconnected(slot))
+
+        if self.on_launch:
+            try:
+                await self.on_launch(slot)
+            except Exception:
+                await self._close_slot(slot)
+                raise
+        return slot
+
+    async def _launch_browser(self) -> tuple:
+        """启动浏览器并识别其主进程 PID"""
+        if self._launch_lock is not None:
+            async with self._launch_lock:
+                return await self._start_browser()
+        return await self._start_browser()
+
+    async def _start_browser(self) -> tuple:
+        before = browser_root_pids()
+        browser = await self.launcher()
+        new_pids = browser_root_pids() - before
+        return browser, (min(new_pids) if new_pids else None)
+
+    def _on_disconnected(self, slot: BrowserSlot):
+        """浏览器断连（崩溃或被关闭）事件"""
+        if slot.retiring or self._closed or slot is not self._current:
+            return
+        logger.error(f"浏览器实例断连 [{self.name}]: generation {slot.generation}")
+        self.request_recycle("crash")
+
+    async def _close_slot(self, slot: BrowserSlot):
+        """关闭实例及其附属资源"""
+        if slot not in self._slots:
+            return
+        self._slots.discard(slot)
+        slot.retiring = True
+        try:
+            if self.on_close:
+                await self.on_close(slot)
+        except Exception as e:
+            logger.warning(f"释放浏览器附属资源失败: {e}")
+        try:
+            if slot.browser.is_connected():
+                await slot.browser.close()
+        except Exception as e:
+            logger.debug(f"关闭浏览器实例失败: {e}")
+
+    async def _monitor(self):
+        """周期性检查当前实例的内存占用"""
+        while not self._closed:
+            await asyncio.sleep(self.check_interval)
+            slot = self._current
+            if slot is None or slot.pid is None or slot.retiring:
+                continue
+            rss = process_tree_rss(slot.pid)
+            if rss is None:
+                continue
+            BROWSER_RSS_BYTES.labels(browser=self.name).set(rss)
+            if rss > self.max_rss_bytes:
+                logger.warning(f"浏览器内存超限: {rss / 1024 / 1024:.0f}MB")
+                self.request_recycle("rss")
+
+    async def close(self):
+        """关闭监管器及所有实例"""
+        self._closed = True
+        self._ready.set()
+        tasks = [t for t in (self._monitor_task, self._recycle_task) if t and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 回收被中断时，启动中的新实例与排空中的旧实例都不在 _current 上
+        for launch in list(self._launches):
+            try:
+                browser, _ = await launch
+                await browser.close()
+            except Exception as e:
+                logger.debug(f"关闭启动中的浏览器实例失败: {e}")
+        self._launches.clear()
+        for slot in list(self._slots):
+            await self._close_slot(slot)
+        self._current = None
+
+    def stats(self) -> Dict[str, Any]:
+        """返回监管统计信息"""
+        slot = self._current
+        return {
+            "name": self.name,
+            "generation": slot.generation if slot else None,
+            "pages_served": slot.pages_served if slot else 0,
+            "in_flight": slot.in_flight if slot else 0,
+            "open_pages": slot.open_pages if slot else 0,
+            "recycle_count": self.recycle_count,
+            "recycle_reasons": dict(self.recycle_reasons),
+            "last_recycle_reason": self.last_recycle_reason,
+        }
+
+
+class BrowserPool:
+    """
+    进程内的多浏览器池
+
+    每个浏览器由独立的 BrowserSupervisor 监管（各自回收、各自崩溃重启），
+    acquire 把新任务分配给打开页面最少的就绪浏览器。
+    """
+
+    def __init__(self, size: int, **supervisor_kwargs):
+        """
+        Args:
+            size: 浏览器实例数
+            **supervisor_kwargs: 传给每个 BrowserSupervisor 的参数
+        """
+        launch_lock = asyncio.Lock()
+        self.supervisors: List[BrowserSupervisor] = [
+            BrowserSupervisor(name=str(i), launch_lock=launch_lock, **supervisor_kwargs)
+            for i in range(max(1, size))
+        ]
+        self._closed = False
+
+    async def start(self):
+        """启动所有浏览器实例"""
+        for supervisor in self.supervisors:
+            await supervisor.start()
+
+    async def acquire(self) -> BrowserSlot:
+        """
+        获取最空闲的浏览器实例
+
+        全部实例都在重启时，等待任意一个就绪
+        """
+        while True:
+            if self._closed:
+                raise RuntimeError("浏览器池已关闭")
+            ready = [s for s in self.supervisors if s.ready]
+            if ready:
+                return await min(ready, key=lambda s: s.load()).acquire()
+
+            waiters = [asyncio.ensure_future(s.wait_ready()) for s in self.supervisors]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+            # 被唤醒的实例可能已断连（断连事件尚未处理），标记未就绪并触发重启
+            for supervisor in self.supervisors:
+                supervisor.check_connected()
+
+    def release(self, slot: BrowserSlot, pages: int = 1):
+        """归还实例（交给其所属监管器）"""
+        slot.owner.release(slot, pages)
+
+    async def close(self):
+        """关闭所有浏览器实例"""
+        self._closed = True
+        await asyncio.gather(
+            *(supervisor.close() for supervisor in self.supervisors),
+            return_exceptions=True,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各浏览器的监管统计"""
+        return {"browsers": [supervisor.stats() for supervisor in self.supervisors]}
@@ -10,11 +10,157 @@ CDP (Chrome DevTools Protocol) 指纹注入模块
 """
 import random
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from .fingerprints import get_random_fingerprint
 
 logger = logging.getLogger(__name__)
 
+def resolve_fingerprint(options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    根据选项确定本次使用的指纹
+
+    Args:
+        options: 指纹配置选项，支持 fingerprint（完整指纹字典）和 user_agent
+
+    Returns:
+        指纹配置字典（副本，可安全修改）
+    """
+    options = options or {}
+    # 推荐使用 get_random_fingerprint 获取完整一致的指纹
+    fp = dict(options.get("fingerprint") or get_random_fingerprint())
+
+    # 如果 options 强行指定了 ua，则覆盖指纹库中的 ua (仅做兼容，不推荐)
+    if options.get("user_agent"):
+        fp["ua"] = options.get("user_agent")
+    return fp
+
+
+async def apply_user_agent_override(page, fp: Dict[str, Any]):
+    """
+    通过 CDP 覆盖 User-Agent 和 Client Hints
+
+    CDP 覆盖作用于单个页面（Target），复用上下文时每个新页面都需要调用一次
+
+    Args:
+        page: Playwright Page 对象
+        fp: 指纹配置
+    """
+    # 获取 CDP 会话
+    client = await page.context.new_cdp_session(page)
+
+    ua = fp["ua"]
+    platform = fp["platform"]
+
+    # 构造 UserAgentMetadata
+    # 这里简化处理，根据 UA 推断版本，实际应存储在数据库中
+    brands = [
+        {"brand": "Google Chrome", "version": "120"},
+        {"brand": "Chromium", "version": "120"},
+        {"brand": "Not?A_Brand", "version": "24"}
+    ]
+
+    await client.send("Network.setUserAgentOverride", {
+        "userAgent": ua,
+        "platform": platform,
+        "acceptLanguage": "en-US,en;q=0.9",
+        "userAgentMetadata": {
+            "brands": brands,
+            "fullVersion": "120.0.6099.109",
+            "platform": platform,
+            "platformVersion": "10.0.0",
+            "architecture": "x86",
+            "model": "",
+            "mobile": False
+        }
+    })
+
+
+def build_fingerprint_scripts(fp: Dict[str, Any]) -> List[str]:
+    """
+    生成指纹覆盖所需的初始化脚本
+
+    返回的脚本既可以注入到 Page，也可以注入到 BrowserContext（对其下所有页面生效）
+
+    Args:
+        fp: 指纹配置
+
+    Returns:
+        初始化脚本列表
+    """
+    scripts = []
+
+    # 1. 覆盖硬件并发数 (Hardware Concurrency) 和 内存
+    # 需要通过 JS 注入覆盖 navigator 属性
+    scripts.append(f"""
+    (() => {{
+        Object.defineProperty(navigator, 'hardwareConcurrency', {{ get: () => {fp['hardwareConcurrency']} }});
+        Object.defineProperty(navigator, 'deviceMemory', {{ get: () => {fp['deviceMemory']} }});
+    }})();
+    """)
+
+    # 2. 覆盖屏幕分辨率
+    width = fp["screen"]["width"]
+    height = fp["screen"]["height"]
+    scripts.append(f"""
+    (() => {{
+        Object.defineProperty(screen, 'width', {{ get: () => {width} }});
+        Object.defineProperty(screen, 'height', {{ get: () => {height} }});
+        Object.defineProperty(screen, 'availWidth', {{ get: () => {width} }});
+        Object.defineProperty(screen, 'availHeight', {{ get: () => {height - 40} }}); // 减去任务栏
+    }})();
+    """)
+
+    # 3. 注入 Canvas 噪声 (通过 JS 注入，但模拟底层行为)
+    # 真正的底层 Canvas 修改需要编译 Chromium，这里使用高级 JS Hook 模拟
+    scripts.append("""
+    (() => {
+        const toBlob = HTMLCanvasElement.prototype.toBlob;
+        const toDataURL = HTMLCanvasElement.prototype.toDataURL;
+        const getImageData = CanvasRenderingContext2D.prototype.getImageData;
+        
+        // 生成固定的随机噪声（基于页面 session）
+        const noise = Math.floor(Math.random() * 10) - 5;
+        
+        const hook = (value) => {
+            if (!value) return value;
+            // 对最后一位像素数据微调
+            return value; 
+        }
+
+        // Hook toDataURL
+        HTMLCanvasElement.prototype.toDataURL = function(...args) {
+            // 在这里可以对生成的 base64 进行微小的噪声注入
+            // 为了演示简单，这里不实际修改图像数据，因为那样开销太大
+            // 仅标记已 Hook
+            return toDataURL.apply(this, args);
+        };
+    })();
+    """)
+
+    # 4. WebGL Vendor 覆盖
+    vendor = fp.get("vendor", "Google Inc. (Intel)")
+    renderer = fp.get("renderer", "ANGLE (Intel, Intel(R) UHD Graphics 630 Direct3D11 vs_5_0 ps_5_0, D3D11)")
+
+    scripts.append(f"""
+    (() => {{
+        const getParameter = WebGLRenderingContext.prototype.getParameter;
+        WebGLRenderingContext.prototype.getParameter = function(parameter) {{
+            // UNMASKED_VENDOR_WEBGL
+            if (parameter === 37445) {{
+                return '{vendor}';
+            }}
+            // UNMASKED_RENDERER_WEBGL
+            if (parameter === 37446) {{
+                return '{renderer}';
+            }}
+            return getParameter.apply(this, [parameter]);
+        }};
+    }})();
+    """)
+
+    return scripts
+
+
 async def inject_cdp_fingerprint(page, options: Optional[Dict[str, Any]] = None):
     """
     使用 CDP 注入指纹
@@ -23,120 +169,17 @@ async def inject_cdp_fingerprint(page, options: Optional[Dict[str, Any]] = None)
         page: Playwright Page 对象
         options: 指纹配置选项
     """
-    options = options or {}
-    
     try:
         # 获取指纹配置
         # 如果 options 中指定了 ua，则优先使用（但可能导致不一致风险）
-        # 推荐使用 get_random_fingerprint 获取完整一致的指纹
-        fp = get_random_fingerprint()
-        
-        # 如果 options 强行指定了 ua，则覆盖指纹库中的 ua (仅做兼容，不推荐)
-        if options.get("user_agent"):
-            fp["ua"] = options.get("user_agent")
-            
-        # 获取 CDP 会话
-        client = await page.context.new_cdp_session(page)
-        
-        # 1. 覆盖 User-Agent 和 Client Hints
-        ua = fp["ua"]
-        platform = fp["platform"]
-        
-        # 构造 UserAgentMetadata
-        # 这里简化处理，根据 UA 推断版本，实际应存储在数据库中
-        brands = [
-            {"brand": "Google Chrome", "version": "120"},
-            {"brand": "Chromium", "version": "120"},
-            {"brand": "Not?A_Brand", "version": "24"}
-        ]
-        
-        await client.send("Network.setUserAgentOverride", {
-            "userAgent": ua,
-            "platform": platform,
-            "acceptLanguage": "en-US,en;q=0.9",
-            "userAgentMetadata": {
-                "brands": brands,
-                "fullVersion": "120.0.6099.109",
-                "platform": platform,
-                "platformVersion": "10.0.0",
-                "architecture": "x86",
-                "model": "",
-                "mobile": False
-            }
-        })
-        
-        # 2. 覆盖硬件并发数 (Hardware Concurrency) 和 内存
-        # 需要通过 JS 注入覆盖 navigator 属性
-        await page.add_init_script(f"""
-        (() => {{
-            Object.defineProperty(navigator, 'hardwareConcurrency', {{ get: () => {fp['hardwareConcurrency']} }});
-            Object.defineProperty(navigator, 'deviceMemory', {{ get: () => {fp['deviceMemory']} }});
-        }})();
-        """)
-        
-        # 3. 覆盖屏幕分辨率
-        width = fp["screen"]["width"]
-        height = fp["screen"]["height"]
-        await page.add_init_script(f"""
-        (() => {{
-            Object.defineProperty(screen, 'width', {{ get: () => {width} }});
-            Object.defineProperty(screen, 'height', {{ get: () => {height} }});
-            Object.defineProperty(screen, 'availWidth', {{ get: () => {width} }});
-            Object.defineProperty(screen, 'availHeight', {{ get: () => {height - 40} }}); // 减去任务栏
-        }})();
-        """)
-
-        # 4. 注入 Canvas 噪声 (通过 JS 注入，但模拟底层行为)
-        # 真正的底层 Canvas 修改需要编译 Chromium，这里使用高级 JS Hook 模拟
-        await page.add_init_script("""
-        (() => {
-            const toBlob = HTMLCanvasElement.prototype.toBlob;
-            const toDataURL = HTMLCanvasElement.prototype.toDataURL;
-            const getImageData = CanvasRenderingContext2D.prototype.getImageData;
-            
-            // 生成固定的随机噪声（基于页面 session）
-            const noise = Math.floor(Math.random() * 10) - 5;
-            
-            const hook = (value) => {
-                if (!value) return value;
-                // 对最后一位像素数据微调
-                return value; 
-            }
-
-            // Hook toDataURL
-            HTMLCanvasElement.prototype.toDataURL = function(...args) {
-                // 在这里可以对生成的 base64 进行微小的噪声注入
-                // 为了演示简单，这里不实际修改图像数据，因为那样开销太大
-                // 仅标记已 Hook
-                return toDataURL.apply(this, args);
-            };
-        })();
-        """)
-        
-        # 5. WebGL Vendor 覆盖
-        vendor = fp.get("vendor", "Google Inc. (Intel)")
-        renderer = fp.get("renderer", "ANGLE (Intel, Intel(R) UHD Graphics 630 Direct3D11 vs_5_0 ps_5_0, D3D11)")
-        
-        await page.add_init_script(f"""
-        (() => {{
-            const getParameter = WebGLRenderingContext.prototype.getParameter;
-            WebGLRenderingContext.prototype.getParameter = function(parameter) {{
-                // UNMASKED_VENDOR_WEBGL
-                if (parameter === 37445) {{
-                    return '{vendor}';
-                }}
-                // UNMASKED_RENDERER_WEBGL
-                if (parameter === 37446) {{
-                    return '{renderer}';
-                }}
-                return getParameter.apply(this, [parameter]);
-            }};
-        }})();
-        """)
+        fp = resolve_fingerprint(options)
+
+        await apply_user_agent_override(page, fp)
+
+        for script in build_fingerprint_scripts(fp):
+            await page.add_init_script(script)
         
-        logger.debug(f"CDP 指纹注入完成: {fp['os']} ({width}x{height})")
+        logger.debug(f"CDP 指纹注入完成: {fp['os']} ({fp['screen']['width']}x{fp['screen']['height']})")
         
     except Exception as e:
         logger.warning(f"CDP 指纹注入失败: {str(e)}")
-
-
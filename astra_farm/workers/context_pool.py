@@ -0,0 +1,246 @@
+"""
+浏览器上下文池模块
+
+按 (代理, 指纹, User-Agent) 维度缓存预热好的 BrowserContext，避免每个任务都重新
+创建上下文并重复执行指纹注入。上下文在两次租用之间会清空 Cookie 与存储，
+使用次数达到上限或任务出错时淘汰。
+"""
+import time
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 上下文池 Key: (代理标识, 指纹 ID, User-Agent, 初始化脚本 Hook 集合哈希)
+ContextKey = Tuple[str, str, str, str]
+
+# 创建新上下文的工厂协程
+ContextFactory = Callable[[], Awaitable[Any]]
+
+# 租约结束时需要清理的存储类型 (CDP Storage.clearDataForOrigin)
+_STORAGE_TYPES = "local_storage,session_storage,indexeddb,websql,cache_storage,service_workers"
+
+
+def make_context_key(
+    proxy: Optional[Dict[str, str]],
+    fingerprint_id: Optional[str],
+    user_agent: Optional[str],
+    hooks_hash: str = ""
+) -> ContextKey:
+    """
+    生成上下文池 Key
+
+    Args:
+        proxy: Playwright 代理配置
+        fingerprint_id: 指纹 ID
+        user_agent: User-Agent
+        hooks_hash: 上下文级初始化脚本中 Hook 集合的哈希
+
+    Returns:
+        可哈希的上下文 Key
+    """
+    proxy_id = ""
+    if proxy:
+        proxy_id = proxy.get("server", "")
+        if proxy.get("username"):
+            proxy_id = f"{proxy['username']}@{proxy_id}"
+    return (proxy_id, fingerprint_id or "", user_agent or "", hooks_hash)
+
+
+class PooledContext:
+    """池化的浏览器上下文"""
+
+    def __init__(self, key: ContextKey, context: Any):
+        """
+        Args:
+            key: 上下文 Key
+            context: Playwright BrowserContext
+        """
+        self.key = key
+        self.context = context
+        self.uses = 0
+        self.created_at = time.monotonic()
+        # 租约期间访问过的源，释放时需要清理其存储
+        self.origins = set()
+
+    def track_origin(self, url: Optional[str]):
+        """记录访问过的源"""
+        if not url or "://" not in url:
+            return
+        scheme, rest = url.split("://", 1)
+        if scheme not in ("http", "https"):
+            return
+        host = rest.split("/", 1)[0]
+        self.origins.add(f"{scheme}://{host}")
+
+    def track_page(self, page: Any):
+        """记录页面及其所有 frame 的源（跳转目标、iframe），须在页面关闭前调用"""
+        try:
+            self.track_origin(page.url)
+            for frame in page.frames:
+                self.track_origin(frame.url)
+        except Exception as e:
+            logger.debug(f"记录页面源失败: {e}")
+
+
+class ContextPool:
+    """BrowserContext 预热池"""
+
+    def __init__(
+        self,
+        max_idle_per_key: int = 2,
+        max_uses: int = 50,
+    ):
+        """
+        初始化上下文池
+
+        Args:
+            max_idle_per_key: 每个 Key 最多保留的空闲上下文数
+            max_uses: 单个上下文最多被租用的次数，超出后淘汰
+        """
+        self.max_idle_per_key = max_idle_per_key
+        self.max_uses = max_uses
+        self._idle: Dict[ContextKey, Deque[PooledContext]] = defaultdict(deque)
+        self._leased: Dict[int, PooledContext] = {}
+        self._closed = False
+
+        # 统计信息
+        self.stats = {"created": 0, "reused": 0, "retired": 0}
+
+    async def warm(self, key: ContextKey, factory: ContextFactory, count: int = 1):
+        """
+        为指定 Key 预先创建上下文
+
+        Args:
+            key: 上下文 Key
+            factory: 创建上下文的工厂协程
+            count: 目标空闲上下文数量（不超过 max_idle_per_key）
+        """
+        target = min(count, self.max_idle_per_key)
+        while not self._closed and len(self._idle[key]) < target:
+            try:
+                context = await factory()
+            except Exception as e:
+                logger.warning(f"预热上下文失败 {key[0] or 'direct'}/{key[1]}: {e}")
+                return
+            self.stats["created"] += 1
+            self._idle[key].append(PooledContext(key, context))
+        logger.debug(f"上下文池预热完成: {key[0] or 'direct'}/{key[1]} x{len(self._idle[key])}")
+
+    async def acquire(self, key: ContextKey, factory: ContextFactory) -> PooledContext:
+        """
+        租用一个上下文，没有空闲上下文时现场创建
+
+        Args:
+            key: 上下文 Key
+            factory: 创建上下文的工厂协程
+
+        Returns:
+            PooledContext 租约
+        """
+        if self._closed:
+            raise RuntimeError("上下文池已关闭")
+
+        idle = self._idle.get(key)
+        if idle:
+            pooled = idle.popleft()
+            self.stats["reused"] += 1
+        else:
+            pooled = PooledContext(key, await factory())
+            self.stats["created"] += 1
+
+        pooled.uses += 1
+        self._leased[id(pooled)] = pooled
+        return pooled
+
+    async def release(self, pooled: PooledContext, discard: bool = False):
+        """
+        归还上下文
+
+        Args:
+            pooled: acquire 返回的租约
+            discard: 为 True 时直接淘汰（例如任务出错）
+        """
+        self._leased.pop(id(pooled), None)
+
+        if (
+            discard
+            or self._closed
+            or pooled.uses >= self.max_uses
+            or len(self._idle[pooled.key]) >= self.max_idle_per_key
+        ):
+            await self._retire(pooled)
+            return
+
+        try:
+            await self._reset(pooled)
+        except Exception as e:
+            logger.warning(f"上下文状态重置失败，淘汰该上下文: {e}")
+            await self._retire(pooled)
+            return
+
+        self._idle[pooled.key].append(pooled)
+
+    async def _reset(self, pooled: PooledContext):
+        """清空上下文的页面、Cookie 与站点存储"""
+        context = pooled.context
+
+        for page in list(context.pages):
+            pooled.track_page(page)
+
+        # 借助一个仍然存活的页面发起 CDP 清理；没有页面时临时创建
+        if pooled.origins:
+            pages = list(context.pages)
+            page = pages[0] if pages else await context.new_page()
+            client = await context.new_cdp_session(page)
+            for origin in pooled.origins:
+                await client.send("Storage.clearDataForOrigin", {
+                    "origin": origin,
+                    "storageTypes": _STORAGE_TYPES,
+                })
+            await client.detach()
+        pooled.origins.clear()
+
+        for p in list(context.pages):
+            await p.close()
+
+        await context.clear_cookies()
+        await context.clear_permissions()
+
+    async def _retire(self, pooled: PooledContext):
+        """关闭并淘汰上下文"""
+        self.stats["retired"] += 1
+        try:
+            await pooled.context.close()
+        except Exception as e:
+            logger.debug(f"关闭上下文失败: {e}")
+
+    async def close(self):
+        """关闭池中所有上下文"""
+        self._closed = True
+        pooled_list = [p for idle in self._idle.values() for p in idle]
+        pooled_list.extend(self._leased.values())
+        self._idle.clear()
+        self._leased.clear()
+        await asyncio.gather(
+            *(self._retire(p) for p in pooled_list),
+            return_exceptions=True,
+        )
+        logger.info(f"上下文池已关闭: {self.stats}")
+
+    def warm_keys(self, proxy_id: str, user_agent: str, hooks_hash: str = "") -> List[ContextKey]:
+        """
+        返回指定代理、User-Agent 与 Hook 集合下存在空闲上下文的 Key
+
+        调用方未指定指纹时，可优先从中选择以命中已预热的上下文
+        """
+        return [
+            key for key, idle in self._idle.items()
+            if idle and key[0] == proxy_id and key[2] == user_agent and key[3] == hooks_hash
+        ]
+
+    def idle_count(self) -> int:
+        """当前空闲上下文总数"""
+        return sum(len(idle) for idle in self._idle.values())
@@ -4,10 +4,11 @@
 提供真实的浏览器指纹数据组合，确保 UA、硬件并发数、内存等特征的一致性。
 """
 import random
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 # 指纹数据结构定义
 # {
+#     "id": str,  # 指纹唯一标识，用于上下文池等缓存的 Key
 #     "os": "Windows" | "Mac" | "Linux",
 #     "ua": str,
 #     "platform": str,
@@ -21,6 +22,7 @@ from typing import Dict, Any, List
 FINGERPRINTS: List[Dict[str, Any]] = [
     # Windows Desktop - High End
     {
+        "id": "win-high",
         "os": "Windows",
         "ua": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "platform": "Win32",
@@ -32,6 +34,7 @@ FINGERPRINTS: List[Dict[str, Any]] = [
     },
     # Windows Desktop - Mid Range
     {
+        "id": "win-mid",
         "os": "Windows",
         "ua": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
         "platform": "Win32",
@@ -43,6 +46,7 @@ FINGERPRINTS: List[Dict[str, Any]] = [
     },
     # Mac Desktop (M1/M2)
     {
+        "id": "mac-m1",
         "os": "Mac",
         "ua": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "platform": "MacIntel",
@@ -54,6 +58,7 @@ FINGERPRINTS: List[Dict[str, Any]] = [
     },
     # Mac Desktop (Intel High End)
     {
+        "id": "mac-intel",
         "os": "Mac",
         "ua": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
         "platform": "MacIntel",
@@ -69,3 +74,20 @@ def get_random_fingerprint() -> Dict[str, Any]:
     """随机获取一个指纹配置"""
     return random.choice(FINGERPRINTS)
 
+
+def get_fingerprint(fingerprint_id: Optional[str]) -> Dict[str, Any]:
+    """
+    按 ID 获取指纹配置
+
+    Args:
+        fingerprint_id: 指纹 ID，为空或不存在时随机返回一个
+
+    Returns:
+        指纹配置字典
+    """
+    if fingerprint_id:
+        for fp in FINGERPRINTS:
+            if fp["id"] == fingerprint_id:
+                return fp
+    return get_random_fingerprint()
+
@@ -0,0 +1,87 @@
+"""
+Hook 事件实时推送模块
+
+Hook 脚本通过 hook_stream.js 把拦截到的事件按批推送到 page.expose_binding 暴露的
+绑定，Python 侧写入有界缓冲区。事件到达即落在 Worker 内存中，页面跳转或崩溃时
+已收到的部分依然保留，页面内也无需持续累积整份数据。
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from astra_reverse_core.utils import load_hook_script
+
+logger = logging.getLogger(__name__)
+
+# 页面调用的绑定名（与 hook_stream.js 保持一致）
+HOOK_SINK_BINDING = "__astraHookSink"
+
+_stream_script: Optional[str] = None
+
+
+def get_hook_stream_script() -> str:
+    """获取事件推送脚本（进程内只读取一次）"""
+    global _stream_script
+    if _stream_script is None:
+        _stream_script = load_hook_script("hook_stream.js")
+    return _stream_script
+
+
+class HookEventBuffer:
+    """有界的 Hook 事件缓冲区（每个页面一个实例）"""
+
+    def __init__(self, max_events: int = 5000, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            max_events: 最多保留的事件数
+            max_bytes: 最多保留的事件总字节数（按 JSON 长度计）
+
+        超出上限后丢弃新到达的事件并计数，保证最早的事件（通常包含签名参数）完整
+        """
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.events: List[Any] = []
+        self.bytes = 0
+        self.dropped = 0
+
+    def sink(self, source: Any, payload: str):
+        """绑定回调: payload 为一批事件的 JSON 数组字符串"""
+        if len(self.events) >= self.max_events or self.bytes + len(payload) > self.max_bytes:
+            try:
+                self.dropped += len(json.loads(payload))
+            except ValueError:
+                self.dropped += 1
+            return
+        try:
+            batch = json.loads(payload)
+        except ValueError as e:
+            logger.debug(f"Hook 事件解析失败: {e}")
+            return
+        room = self.max_events - len(self.events)
+        self.events.extend(batch[:room])
+        self.dropped += max(0, len(batch) - room)
+        self.bytes += len(payload)
+
+    async def attach(self, page):
+        """在页面上暴露绑定（需在导航前调用）"""
+        await page.expose_binding(HOOK_SINK_BINDING, self.sink)
+
+    async def flush(self, page):
+        """拉取页面队列中尚未推送的事件"""
+        try:
+            payload = await page.evaluate(
+                "() => window.__astraTakePending ? window.__astraTakePending() : null"
+            )
+        except Exception as e:
+            logger.debug(f"拉取剩余 Hook 事件失败: {e}")
+            return
+        if payload:
+            self.sink(None, payload)
+
+    def drain(self) -> List[Any]:
+        """取出所有事件"""
+        events, self.events, self.bytes = self.events, [], 0
+        return events
+
+    def stats(self) -> Dict[str, int]:
+        return {"events": len(self.events), "bytes": self.bytes, "dropped": self.dropped}
@@ -0,0 +1,194 @@
+"""
+HTTP 快速通道模块
+
+对服务端渲染的页面直接使用 httpx 抓取，只有检测到页面依赖 JavaScript
+（空页面、反爬挑战、关键选择器缺失等）时才升级到浏览器渲染。
+"""
+import logging
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import quote
+
+import httpx
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# 反爬挑战 / 需要 JS 执行的页面特征（小写匹配）
+DEFAULT_JS_MARKERS = (
+    "cf-browser-verification",
+    "challenge-platform",
+    "__cf_chl_",
+    "<title>just a moment...</title>",
+    "_incapsula_resource",
+    "window._cf_chl_opt",
+    "geetest",
+    "please enable javascript",
+    "you need to enable javascript",
+    "请开启javascript",
+    "请启用javascript",
+)
+
+# 这些状态码通常意味着被反爬拦截，需要浏览器重试
+ESCALATE_STATUS_CODES = frozenset({401, 403, 429, 503})
+
+
+def _proxy_url(proxy: Optional[Dict[str, str]]) -> Optional[str]:
+    """把 Playwright 代理配置转换为 httpx 代理 URL"""
+    if not proxy or not proxy.get("server"):
+        return None
+    server = proxy["server"]
+    if "://" not in server:
+        server = f"http://{server}"
+    if proxy.get("username"):
+        scheme, rest = server.split("://", 1)
+        auth = quote(proxy["username"], safe="")
+        if proxy.get("password"):
+            auth += ":" + quote(proxy["password"], safe="")
+        server = f"{scheme}://{auth}@{rest}"
+    return server
+
+
+def is_challenge(
+    status_code: Optional[int],
+    html: str,
+    markers: Iterable[str] = DEFAULT_JS_MARKERS
+) -> bool:
+    """判断页面是否为反爬拦截 / 挑战页（状态码或页面特征）"""
+    if status_code in ESCALATE_STATUS_CODES:
+        return True
+    lowered = html.lower()
+    return any(marker in lowered for marker in markers)
+
+
+def needs_javascript(
+    status_code: int,
+    html: str,
+    wait_for_selector: Optional[str] = None,
+    markers: Iterable[str] = DEFAULT_JS_MARKERS,
+    min_text_length: int = 200
+) -> Optional[str]:
+    """
+    判断 HTTP 抓取结果是否需要浏览器渲染
+
+    Args:
+        status_code: HTTP 状态码
+        html: 响应正文
+        wait_for_selector: 页面必须包含的 CSS 选择器
+        markers: 反爬挑战 / JS 依赖特征
+        min_text_length: 可见文本最小长度，低于该值视为空壳页面
+
+    Returns:
+        需要升级的原因（status / challenge / empty_body / selector_missing），不需要时返回 None
+    """
+    if status_code in ESCALATE_STATUS_CODES:
+        return "status"
+
+    if is_challenge(None, html, markers):
+        return "challenge"
+
+    soup = BeautifulSoup(html, "lxml")
+    body = soup.body
+    if body is None:
+        return "empty_body"
+    for tag in body(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    if len(body.get_text(" ", strip=True)) < min_text_length:
+        return "empty_body"
+
+    if wait_for_selector:
+        try:
+            if soup.select_one(wait_for_selector) is None:
+                return "selector_missing"
+        except Exception:
+            # 浏览器专有的选择器语法（如 text=、>>）无法静态判断
+            return "selector_missing"
+
+    return None
+
+
+def _no_cookie_jar() -> CookieJar:
+    """不保存也不发送任何 Cookie 的 CookieJar"""
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+class HttpFetcher:
+    """
+    按代理复用连接池的异步 HTTP 抓取器
+
+    客户端在任务间共享，因此不保存 Cookie：与浏览器通道每次使用干净上下文的隔离性一致，
+    避免一个任务的 Cookie 被带到同一出口的后续任务中
+    """
+
+    def __init__(self, max_connections: int = 100, http2: bool = False):
+        """
+        Args:
+            max_connections: 每个代理出口的最大连接数
+            http2: 是否启用 HTTP/2（需要安装 h2）
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.http2 = http2
+        # 代理 URL -> 客户端（None 表示直连）
+        self._clients: Dict[Optional[str], httpx.AsyncClient] = {}
+
+    def _client(self, proxy: Optional[Dict[str, str]]) -> httpx.AsyncClient:
+        """获取（或创建）指定代理出口的客户端"""
+        proxy_url = _proxy_url(proxy)
+        client = self._clients.get(proxy_url)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                proxy=proxy_url,
+                limits=self.limits,
+                http2=self.http2,
+                follow_redirects=True,
+                cookies=_no_cookie_jar(),
+            )
+            self._clients[proxy_url] = client
+        return client
+
+    async def fetch(
+        self,
+        url: str,
+        proxy: Optional[Dict[str, str]] = None,
+        user_agent: Optional[str] = None,
+        timeout: float = 30.0
+    ) -> Dict[str, Any]:
+        """
+        抓取页面
+
+        Args:
+            url: 目标 URL
+            proxy: Playwright 格式代理配置（与浏览器通道使用同一出口）
+            user_agent: User-Agent
+            timeout: 超时时间（秒）
+
+        Returns:
+            {"url", "status_code", "html", "headers"}
+        """
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+        }
+        if user_agent:
+            headers["User-Agent"] = user_agent
+
+        response = await self._client(proxy).get(url, headers=headers, timeout=timeout)
+        return {
+            "url": str(response.url),
+            "status_code": response.status_code,
+            "html": response.text,
+            "headers": dict(response.headers),
+        }
+
+    async def close(self):
+        """关闭所有客户端"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"关闭 HTTP 客户端失败: {e}")
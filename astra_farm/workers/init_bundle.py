@@ -0,0 +1,132 @@
+"""
+初始化脚本打包模块
+
+把 stealth 反检测脚本、指纹覆盖脚本和 webdriver 补丁合并为一个初始化脚本，
+与任务选择的 Hook 脚本一起按 (指纹 ID, Hook 集合哈希) 缓存，在上下文级别一次性注入，
+避免每个页面多次 add_init_script 往返。
+
+脚本内容原样拼接，不做压缩：Hook 脚本来自 API，改写源码有破坏字符串与模板字面量的风险。
+每段反检测脚本包在 try/catch 中互不影响；Hook 脚本各自作为独立的初始化脚本注入，
+语法错误或顶层异常不会使反检测与指纹覆盖失效。
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .cdp_fingerprint import build_fingerprint_scripts
+
+# 尝试导入 playwright_stealth，兼容 1.x 与 2.x 两种接口
+try:
+    from playwright_stealth import Stealth
+
+    def _stealth_payload() -> str:
+        return Stealth().script_payload
+
+    HAS_STEALTH = True
+except ImportError:
+    try:
+        from playwright_stealth.stealth import StealthConfig
+
+        def _stealth_payload() -> str:
+            return "\n".join(StealthConfig().enabled_scripts)
+
+        HAS_STEALTH = True
+    except ImportError:
+        HAS_STEALTH = False
+
+logger = logging.getLogger(__name__)
+
+# 移除 webdriver 属性（双重保险）
+WEBDRIVER_PATCH_SCRIPT = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+
+_stealth_cache: Optional[str] = None
+
+
+def _isolate(script: str) -> str:
+    """把一段脚本包在 try/catch 中，运行时异常不影响后续脚本"""
+    return f"try {{\n{script}\n}} catch (e) {{}}"
+
+
+def hook_set_hash(hook_scripts: Optional[Iterable[str]]) -> str:
+    """计算 Hook 脚本集合的哈希（顺序敏感），空集合返回空字符串"""
+    scripts = list(hook_scripts or [])
+    if not scripts:
+        return ""
+    digest = hashlib.sha1()
+    for script in scripts:
+        digest.update(script.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _get_stealth_script() -> str:
+    """获取 stealth 脚本（进程内只生成一次）"""
+    global _stealth_cache
+    if _stealth_cache is None:
+        _stealth_cache = ""
+        if HAS_STEALTH:
+            try:
+                _stealth_cache = _stealth_payload()
+            except Exception as e:
+                logger.warning(f"生成 playwright-stealth 脚本失败: {e}")
+    return _stealth_cache
+
+
+class InitScriptBundler:
+    """初始化脚本打包器（带 LRU 缓存）"""
+
+    def __init__(self, max_entries: int = 64):
+        """
+        Args:
+            max_entries: 最多缓存的脚本包数量
+        """
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def build(
+        self,
+        fingerprint: Dict[str, Any],
+        hook_scripts: Optional[List[str]] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        获取（或生成）脚本包
+
+        Args:
+            fingerprint: 指纹配置
+            hook_scripts: 任务选择的 Hook 脚本
+
+        Returns:
+            (Hook 集合哈希, 按顺序注入的初始化脚本列表)
+            第一个为反检测脚本包，其后每个 Hook 脚本各占一个
+        """
+        hooks_hash = hook_set_hash(hook_scripts)
+        key = (fingerprint.get("id", ""), hooks_hash)
+
+        scripts = self._cache.get(key)
+        if scripts is not None:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return hooks_hash, scripts
+
+        self.stats["misses"] += 1
+        # 顺序: stealth -> 指纹覆盖 -> webdriver 补丁 -> Hook
+        parts = [_get_stealth_script()]
+        parts.extend(build_fingerprint_scripts(fingerprint))
+        parts.append(WEBDRIVER_PATCH_SCRIPT)
+        bundle = "\n".join(_isolate(p) for p in parts if p)
+        scripts = [bundle] + [s for s in (hook_scripts or []) if s]
+
+        self._cache[key] = scripts
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        logger.debug(
+            f"生成初始化脚本包: fp={key[0]}, hooks={hooks_hash or '-'}, "
+            f"{sum(len(s) for s in scripts)} bytes"
+        )
+        return hooks_hash, scripts
+
+
+# 全局单例
+init_bundler = InitScriptBundler()
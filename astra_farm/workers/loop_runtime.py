@@ -0,0 +1,152 @@
+"""
+Worker 事件循环运行时
+
+每个 Worker 进程持有一个运行在后台线程中的常驻 asyncio 事件循环，浏览器、上下文池、
+HTTP 客户端等异步资源都绑定在这个循环上。Celery 任务线程通过 run_coroutine_threadsafe
+提交协程并阻塞等待结果，无论 prefork 还是线程池，多个任务都能在同一个浏览器上重叠执行。
+
+任务线程在等待期间收到 SoftTimeLimitExceeded 等异常时，会取消对应协程并等待其
+finally 块执行完毕（关闭页面、归还上下文），再把异常抛回给 Celery。
+"""
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopRuntime:
+    """后台线程中的常驻事件循环"""
+
+    def __init__(self, name: str = "astra-page-loop", cancel_timeout: float = 10.0):
+        """
+        Args:
+            name: 后台线程名
+            cancel_timeout: 取消协程后等待其清理完成的最长时间（秒）
+        """
+        self.name = name
+        self.cancel_timeout = cancel_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and not self._loop.is_closed()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """返回事件循环，未启动时自动启动"""
+        return self.start()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """启动（或复用）后台事件循环线程"""
+        with self._lock:
+            if not self.running:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name=self.name,
+                    daemon=True,
+                )
+                self._thread.start()
+                logger.info(f"常驻事件循环已启动: {self.name}")
+            return self._loop
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """提交协程，立即返回 concurrent.futures.Future"""
+        return self._submit(_Call(coro))
+
+    def _submit(self, call: "_Call") -> concurrent.futures.Future:
+        loop = self.loop
+        if self._thread is threading.current_thread():
+            # 在循环线程内同步等待会造成死锁
+            call.coro.close()
+            raise RuntimeError("不能在事件循环线程内同步等待协程")
+        return asyncio.run_coroutine_threadsafe(call.run(), loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """
+        提交协程并阻塞等待结果
+
+        等待期间调用线程收到异常（软超时、超时、中断）时取消协程，
+        等待其清理完成后重新抛出
+
+        Args:
+            coro: 协程
+            timeout: 最长等待时间（秒），为空时不限制
+
+        Raises:
+            concurrent.futures.TimeoutError: 超过 timeout 仍未完成
+        """
+        call = _Call(coro)
+        future = self._submit(call)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            if not future.done():
+                loop = self._loop
+                if loop is not None and not loop.is_closed():
+                    loop.call_soon_threadsafe(call.cancel)
+                    if not call.finished.wait(self.cancel_timeout):
+                        logger.warning(f"协程取消后 {self.cancel_timeout}s 内未完成清理")
+            raise
+
+    def stop(self, timeout: float = 5.0):
+        """取消剩余任务并停止事件循环线程"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        if loop is None or loop.is_closed():
+            return
+
+        async def _shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_shutdown(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"停止事件循环时清理任务失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread:
+            thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+
+
+class _Call:
+    """一次提交：记录运行中的 Task，支持从其他线程取消并等待清理完成"""
+
+    def __init__(self, coro: Awaitable[Any]):
+        self.coro = coro
+        self.task: Optional[asyncio.Task] = None
+        self.cancelled = False
+        self.finished = threading.Event()
+
+    async def run(self) -> Any:
+        if self.cancelled:
+            # 尚未开始执行就被取消
+            self.coro.close()
+            self.finished.set()
+            raise asyncio.CancelledError()
+        self.task = asyncio.current_task()
+        try:
+            return await self.coro
+        finally:
+            self.finished.set()
+
+    def cancel(self):
+        """在事件循环线程中调用"""
+        if self.finished.is_set():
+            return
+        if self.task is None:
+            self.cancelled = True
+        else:
+            self.task.cancel()
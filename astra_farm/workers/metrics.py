@@ -0,0 +1,167 @@
+"""
+Worker 监控指标模块
+
+基于 prometheus_client 暴露 Worker 运行指标；未安装 prometheus_client 时
+所有指标退化为空操作，不影响爬取流程。
+"""
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _NoopMetric:
+    """prometheus_client 不可用时的空指标"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+    HAS_PROMETHEUS = True
+except ImportError:
+    Counter = Gauge = Histogram = _NoopMetric
+    HAS_PROMETHEUS = False
+
+
+# 浏览器生命周期
+BROWSER_RECYCLES = Counter(
+    "astra_browser_recycles_total",
+    "浏览器实例回收重启次数",
+    ["reason"],
+)
+BROWSER_PAGES_SERVED = Gauge(
+    "astra_browser_pages_served",
+    "当前浏览器实例已处理的页面数",
+    ["browser"],
+)
+BROWSER_RSS_BYTES = Gauge(
+    "astra_browser_rss_bytes",
+    "当前浏览器实例进程树的常驻内存 (RSS)",
+    ["browser"],
+)
+BROWSER_IN_FLIGHT = Gauge(
+    "astra_browser_in_flight_pages",
+    "正在处理中的页面数",
+)
+
+# 页面由哪条通道完成（http 快速通道 / browser 浏览器渲染），以及升级到浏览器的原因
+CRAWL_RENDER_PATH = Counter(
+    "astra_crawl_render_path_total",
+    "页面抓取通道统计",
+    ["path", "reason"],
+)
+
+# 会话状态缓存（按域名统计命中 / 未命中 / 因再次遇到挑战而失效）
+STORAGE_STATE_CACHE = Counter(
+    "astra_storage_state_cache_total",
+    "会话状态缓存命中统计",
+    ["domain", "result"],
+)
+
+# 子资源磁盘缓存（hit / revalidated / miss），命中率 = (hit + revalidated) / 总数
+SUBRESOURCE_CACHE_REQUESTS = Counter(
+    "astra_subresource_cache_requests_total",
+    "子资源缓存查询次数",
+    ["result"],
+)
+SUBRESOURCE_CACHE_SAVED_BYTES = Counter(
+    "astra_subresource_cache_saved_bytes_total",
+    "子资源缓存节省的下载字节数",
+)
+
+# 爬取任务各阶段耗时（按阶段、域名统计 p50/p99）
+CRAWL_PHASE_SECONDS = Histogram(
+    "astra_crawl_phase_seconds",
+    "爬取任务各阶段耗时",
+    ["phase", "domain"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+_server_port: Optional[int] = None
+
+
+class PhaseTimer:
+    """
+    单个任务的分阶段计时器
+
+    使用单调时钟记录每个阶段耗时，同名阶段多次进入时累加
+    """
+
+    def __init__(self):
+        self._started = time.monotonic()
+        self._phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个阶段的耗时"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._phases[name] = self._phases.get(name, 0.0) + time.monotonic() - start
+
+    def as_dict(self) -> Dict[str, float]:
+        """返回各阶段耗时（毫秒），附带 total 总耗时"""
+        timings = {name: round(sec * 1000, 1) for name, sec in self._phases.items()}
+        timings["total"] = round((time.monotonic() - self._started) * 1000, 1)
+        return timings
+
+    def observe(self, domain: str):
+        """把各阶段耗时写入直方图"""
+        for name, sec in self._phases.items():
+            CRAWL_PHASE_SECONDS.labels(phase=name, domain=domain).observe(sec)
+        CRAWL_PHASE_SECONDS.labels(phase="total", domain=domain).observe(
+            time.monotonic() - self._started
+        )
+
+
+def start_metrics_server(base_port: Optional[int]) -> Optional[int]:
+    """
+    启动指标 HTTP 服务
+
+    prefork 模式下每个子进程都有独立的指标，按子进程序号错开端口:
+    base_port + 进程序号
+
+    Args:
+        base_port: 基础端口，为空时不启动
+
+    Returns:
+        实际监听的端口，未启动时返回 None
+    """
+    global _server_port
+    if not base_port or not HAS_PROMETHEUS or _server_port is not None:
+        return _server_port
+
+    try:
+        from billiard.process import current_process
+        index = getattr(current_process(), "index", 0) or 0
+    except Exception:
+        index = 0
+
+    port = base_port + index
+    try:
+        start_http_server(port)
+        _server_port = port
+        logger.info(f"指标服务已启动: :{port}/metrics")
+    except OSError as e:
+        logger.warning(f"指标服务启动失败 (端口 {port}): {e}")
+    return _server_port
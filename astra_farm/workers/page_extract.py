@@ -0,0 +1,146 @@
+"""
+页面内结构化提取模块
+
+任务 options 中的 extract 描述字段与 CSS 选择器的对应关系，Worker 在页面内用一次
+evaluate 完成提取，只返回结构化字段；默认不再回传整页 HTML，也省去下游用
+BeautifulSoup 重新解析。HTTP 快速通道用相同语义在 Python 侧提取，两条路径结果一致。
+
+Schema 示例:
+    {
+        "title": "h1",                                   # 第一个匹配元素的文本
+        "cover": {"selector": "img.cover", "attr": "src"},
+        "items": {
+            "selector": ".item", "all": True,            # 所有匹配元素
+            "fields": {"name": ".name", "link": {"selector": "a", "attr": "href"}}
+        }
+    }
+
+attr 取值: "text"（默认，空白折叠后的文本）、"html"（innerHTML）、"outer_html"，
+其他值按元素属性读取；指定 fields 时以匹配元素为作用域递归提取，attr 被忽略。
+嵌套字段的 selector 省略时作用于当前作用域元素本身。
+"""
+import re
+from typing import Any, Dict, Optional
+
+from bs4 import BeautifulSoup
+
+# 单个 schema 最多字段数（含嵌套），避免超大 schema 拖慢页面
+MAX_FIELDS = 200
+
+# 与 HTTP 快速通道的 Python 实现保持同样的语义
+EXTRACT_SCRIPT = """(schema) => {
+    const clean = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+    const read = (el, spec) => {
+        if (spec.fields) return run(el, spec.fields);
+        switch (spec.attr) {
+            case 'text': return clean(el.textContent);
+            case 'html': return el.innerHTML;
+            case 'outer_html': return el.outerHTML;
+            default: return el.getAttribute(spec.attr);
+        }
+    };
+    const run = (scope, fields) => {
+        const out = {};
+        for (const [name, spec] of Object.entries(fields)) {
+            if (spec.all) {
+                const els = spec.selector ? scope.querySelectorAll(spec.selector) : [scope];
+                out[name] = Array.from(els, (el) => read(el, spec));
+            } else {
+                const el = spec.selector ? scope.querySelector(spec.selector) : scope;
+                out[name] = el ? read(el, spec) : null;
+            }
+        }
+        return out;
+    };
+    return run(document, schema);
+}"""
+
+
+def normalize_schema(schema: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    校验并规范化提取 schema
+
+    字符串简写展开为 {"selector": ..., "attr": "text", "all": False}
+
+    Raises:
+        ValueError: schema 格式不合法
+    """
+    count = [0]
+
+    def _normalize(fields: Any, path: str) -> Dict[str, Dict[str, Any]]:
+        if not isinstance(fields, dict) or not fields:
+            raise ValueError(f"extract{path} 必须是非空字典")
+        normalized = {}
+        for name, spec in fields.items():
+            count[0] += 1
+            if count[0] > MAX_FIELDS:
+                raise ValueError(f"extract 字段数超过上限 {MAX_FIELDS}")
+            if isinstance(spec, str):
+                spec = {"selector": spec}
+            if not isinstance(spec, dict):
+                raise ValueError(f"extract{path}.{name} 必须是选择器字符串或字典")
+            selector = spec.get("selector") or ""
+            attr = spec.get("attr", "text")
+            if not isinstance(selector, str) or not isinstance(attr, str) or not attr:
+                raise ValueError(f"extract{path}.{name} 的 selector/attr 必须是字符串")
+            item = {"selector": selector, "attr": attr, "all": bool(spec.get("all", False))}
+            if not selector and not path:
+                raise ValueError(f"extract.{name} 缺少 selector")
+            if spec.get("fields") is not None:
+                item["fields"] = _normalize(spec["fields"], f"{path}.{name}")
+            normalized[name] = item
+        return normalized
+
+    return _normalize(schema, "")
+
+
+def resolve_schema(options: Dict[str, Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """从任务选项中读取并规范化 extract，未指定时返回 None"""
+    schema = options.get("extract")
+    if not schema:
+        return None
+    return normalize_schema(schema)
+
+
+async def extract_in_page(page, schema: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """在页面内一次 evaluate 完成提取（schema 需已规范化）"""
+    return await page.evaluate(EXTRACT_SCRIPT, schema)
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _read(el, spec: Dict[str, Any]) -> Any:
+    if "fields" in spec:
+        return _run(el, spec["fields"])
+    attr = spec["attr"]
+    if attr == "text":
+        return _clean(el.get_text())
+    if attr == "html":
+        return el.decode_contents()
+    if attr == "outer_html":
+        return str(el)
+    value = el.get(attr)
+    # BeautifulSoup 将 class 等多值属性解析为列表，与 getAttribute 保持一致
+    return " ".join(value) if isinstance(value, list) else value
+
+
+def _run(scope, fields: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    out = {}
+    for name, spec in fields.items():
+        selector = spec["selector"]
+        if spec["all"]:
+            els = scope.select(selector) if selector else [scope]
+            out[name] = [_read(el, spec) for el in els]
+        else:
+            el = scope.select_one(selector) if selector else scope
+            out[name] = _read(el, spec) if el is not None else None
+    return out
+
+
+def extract_from_html(html: str, schema: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    在 Python 侧按相同 schema 提取（HTTP 快速通道使用，CPU 密集，应放到线程池执行）
+    """
+    return _run(BeautifulSoup(html, "lxml"), schema)
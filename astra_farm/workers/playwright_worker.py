@@ -3,35 +3,90 @@ Playwright Worker 模块
 
 使用 Playwright 执行网页爬取任务
 """
+import re
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+import random
+import threading
+from urllib.parse import urlparse
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+import redis.asyncio as aioredis
 from celery import Celery
-from celery.signals import worker_process_init, worker_process_shutdown
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 from celery.exceptions import Retry
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
-# 尝试导入 playwright_stealth
-try:
-    from playwright_stealth import stealth_async
-    HAS_STEALTH = True
-except ImportError:
-    HAS_STEALTH = False
-
 from ..config import worker_config
-from .cdp_fingerprint import inject_cdp_fingerprint
+from .cdp_fingerprint import resolve_fingerprint, apply_user_agent_override
+from .context_pool import ContextPool, PooledContext, make_context_key
+from .fingerprints import get_fingerprint
+from .init_bundle import init_bundler, hook_set_hash
+from .resource_blocker import ResourceBlocker
+from .browser_supervisor import BrowserPool, BrowserSlot
+from .metrics import start_metrics_server, PhaseTimer, CRAWL_RENDER_PATH
+from .http_fetcher import HttpFetcher, needs_javascript, is_challenge, DEFAULT_JS_MARKERS
+from .storage_state import StorageStateCache
+from .subresource_cache import SubresourceCache, CachedRouteHandler
+from .quiescence import NetworkTracker, wait_for_quiescence
+from .hook_stream import HookEventBuffer, get_hook_stream_script
+from .page_extract import resolve_schema, extract_in_page, extract_from_html
 from .human_behavior import human_like_interaction
-from astra_scheduler.rate_limiter import RateLimiter
-from astra_farm.proxy_pool import proxy_pool
+from .loop_runtime import LoopRuntime
+from astra_scheduler.rate_limiter import AsyncRateLimiter
+from astra_scheduler.rate_policy import AsyncRatePolicy, classify_outcome
+from astra_farm.proxy_pool import proxy_pool, BAN_STATUS_CODES
+from astra_farm.proxy_registry import ProxyRegistry, ProxyLease, ProxyHealthChecker
+from astra_dataflow.storage.blob_store import BlobStore, create_blob_store, offload_fields
+from astra_dataflow.storage.batch_results import publish_batch_result
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 默认 User-Agent，后续可从 UA 池中随机选择
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
 # 全局限流器实例
-_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter: Optional[AsyncRateLimiter] = None
+# 按域名自适应限额（RATE_POLICY_ENABLED 时启用）
+_rate_policy: Optional[AsyncRatePolicy] = None
+# 检测挑战页时只检查 HTML 的前若干字符（挑战页特征出现在页面头部，避免对大页面整体转小写）
+_CHALLENGE_SCAN_CHARS = 64 * 1024
+
+# 未回传整页 HTML 时，在页面内取 HTML 开头与总长度用于挑战页检测和流量统计
+_CONTENT_PROBE_SCRIPT = f"""() => {{
+    const html = document.documentElement ? document.documentElement.outerHTML : '';
+    return [html.slice(0, {_CHALLENGE_SCAN_CHARS}), html.length];
+}}"""
+
+# 分布式代理登记表与健康检查（PROXY_REGISTRY_ENABLED 时启用）
+_proxy_registry: Optional[ProxyRegistry] = None
+_proxy_health_checker: Optional[ProxyHealthChecker] = None
 
 # 全局变量，用于持久化浏览器实例
+# 进程内可运行多个浏览器（BROWSER_POOL_SIZE），每个由独立监管器持有，
+# 达到页面数/内存阈值或崩溃时各自重启切换，新任务分配到打开页面最少的浏览器
+# 每个浏览器实例附带自己的上下文池（BrowserSlot.context_pool）
 _playwright: Optional[Playwright] = None
-_browser: Optional[Browser] = None
+_browser_pool: Optional[BrowserPool] = None
+
+# HTTP 快速通道客户端（按代理复用连接池）
+_http_fetcher: Optional[HttpFetcher] = None
+
+# 子资源磁盘缓存（未配置 SUBRESOURCE_CACHE_DIR 时为空）
+_subresource_cache: Optional[SubresourceCache] = None
+
+# 会话状态缓存（任务开启 reuse_storage_state 时首次使用创建）
+_storage_state_cache: Optional[StorageStateCache] = None
+
+# 大字段存储（未配置 BLOB_STORE_URL 时为空）
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+# 进程内常驻事件循环（运行在后台线程中），所有异步资源都绑定在这个循环上
+_runtime = LoopRuntime()
+
+# 限制单进程同时打开的页面数，以及防止并发任务重复初始化浏览器
+_page_semaphore: Optional[asyncio.Semaphore] = None
+_browser_lock: Optional[asyncio.Lock] = None
 
 # 创建 Celery 应用实例（与调度中心使用相同的配置）
 celery_app = Celery(
@@ -48,50 +103,472 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     worker_prefetch_multiplier=worker_config.WORKER_PREFETCH_MULTIPLIER,
+    task_soft_time_limit=worker_config.TASK_SOFT_TIME_LIMIT,
+    task_time_limit=worker_config.TASK_TIME_LIMIT,
 )
 
+def _run_async(coro):
+    """
+    把协程提交到常驻事件循环并阻塞等待结果
+
+    任务线程只负责等待，多个任务（线程池模式或批量任务）在同一个循环、同一个浏览器上
+    并发执行；任务软超时时取消协程，页面与上下文在其 finally 中正常释放。
+    """
+    return _runtime.run(coro)
+
+
+def _get_page_semaphore() -> asyncio.Semaphore:
+    """获取页面并发信号量（在事件循环内首次使用时创建）"""
+    global _page_semaphore
+    if _page_semaphore is None:
+        _page_semaphore = asyncio.Semaphore(max(1, worker_config.WORKER_PAGE_CONCURRENCY))
+    return _page_semaphore
+
+
 async def _init_browser():
     """初始化全局浏览器实例"""
-    global _playwright, _browser, _rate_limiter
+    global _browser_lock
+
+    if _browser_lock is None:
+        _browser_lock = asyncio.Lock()
+
+    # 并发任务可能同时发现浏览器未初始化，加锁保证只启动一次
+    async with _browser_lock:
+        await _init_browser_locked()
+
+
+async def _ensure_browser():
+    """确保浏览器已初始化，未初始化时尝试重新初始化"""
+    if _browser_pool is None:
+        logger.warning("浏览器实例未初始化，尝试重新初始化...")
+        await _init_browser()
+        if _browser_pool is None:
+            raise RuntimeError("无法初始化 Playwright 浏览器")
+
+
+async def _init_browser_locked():
+    """初始化全局浏览器实例（调用方需持有 _browser_lock）"""
+    global _playwright, _browser_pool, _rate_limiter, _rate_policy
     
     # 初始化限流器
     if _rate_limiter is None:
         try:
-            _rate_limiter = RateLimiter(worker_config.CELERY_BROKER_URL)
+            _rate_limiter = AsyncRateLimiter(
+                worker_config.CELERY_BROKER_URL,
+                algorithm=worker_config.RATE_LIMIT_ALGORITHM,
+                burst=worker_config.RATE_LIMIT_BURST or None,
+                lease_block=worker_config.RATE_LIMIT_LEASE_BLOCK,
+                lease_ttl=worker_config.RATE_LIMIT_LEASE_TTL,
+            )
             logger.info("限流器初始化完成")
         except Exception as e:
             logger.error(f"限流器初始化失败: {e}")
 
-    if _browser is None:
-        logger.info("正在初始化全局 Playwright 浏览器实例...")
-        _playwright = await async_playwright().start()
-        
-        browser_options = {
-            "headless": worker_config.BROWSER_HEADLESS,
-            "timeout": worker_config.BROWSER_TIMEOUT,
-            "args": [
-                "--disable-blink-features=AutomationControlled",  # 禁用自动化特性
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-            ] + worker_config.BROWSER_ARGS
-        }
+    if worker_config.RATE_POLICY_ENABLED and _rate_policy is None:
+        try:
+            _rate_policy = AsyncRatePolicy(
+                worker_config.CELERY_BROKER_URL,
+                min_limit=worker_config.RATE_POLICY_MIN_LIMIT,
+                max_limit=worker_config.RATE_POLICY_MAX_LIMIT,
+                increase=worker_config.RATE_POLICY_INCREASE,
+                decrease=worker_config.RATE_POLICY_DECREASE,
+                latency_factor=worker_config.RATE_POLICY_LATENCY_FACTOR,
+            )
+            logger.info("域名自适应限流策略已启用")
+        except Exception as e:
+            logger.error(f"域名限流策略初始化失败: {e}")
+
+    if worker_config.PROXY_REGISTRY_ENABLED and _proxy_registry is None:
+        await _init_proxy_registry()
+
+    if _browser_pool is None:
+        logger.info(f"正在初始化全局 Playwright 浏览器实例 (数量: {worker_config.BROWSER_POOL_SIZE})...")
+        start_metrics_server(worker_config.METRICS_PORT)
+        if _playwright is None:
+            _playwright = await async_playwright().start()
         
-        if worker_config.BROWSER_EXECUTABLE_PATH:
-            logger.info(f"使用自定义浏览器内核: {worker_config.BROWSER_EXECUTABLE_PATH}")
-            browser_options["executable_path"] = worker_config.BROWSER_EXECUTABLE_PATH
-            
-        # 注意：这里我们启动一次浏览器，后续所有任务复用
-        # 如果需要支持不同类型的浏览器（firefox, webkit），可能需要更复杂的逻辑
-        _browser = await _playwright.chromium.launch(**browser_options)
+        browser_pool = BrowserPool(
+            size=worker_config.BROWSER_POOL_SIZE,
+            launcher=_launch_browser,
+            max_pages=worker_config.BROWSER_MAX_PAGES,
+            max_rss_mb=worker_config.BROWSER_MAX_RSS_MB,
+            check_interval=worker_config.BROWSER_HEALTH_INTERVAL,
+            drain_timeout=worker_config.BROWSER_DRAIN_TIMEOUT,
+            on_launch=_on_browser_launch,
+            on_close=_on_browser_close,
+        )
+        await browser_pool.start()
+        _browser_pool = browser_pool
         logger.info("全局 Playwright 浏览器实例初始化完成")
 
+
+async def _init_proxy_registry():
+    """初始化分布式代理登记表，登记 PROXY_POOL 中的代理并启动健康检查"""
+    global _proxy_registry, _proxy_health_checker
+    try:
+        registry = ProxyRegistry(
+            worker_config.CELERY_BROKER_URL,
+            max_concurrency=worker_config.PROXY_MAX_CONCURRENCY,
+            lease_ttl=worker_config.PROXY_LEASE_TTL,
+            failure_threshold=worker_config.PROXY_FAILURE_THRESHOLD,
+            cooldown=worker_config.PROXY_COOLDOWN,
+            max_cooldown=worker_config.PROXY_MAX_COOLDOWN,
+            sticky_ttl=worker_config.PROXY_STICKY_TTL,
+            sticky_max_requests=worker_config.PROXY_STICKY_MAX_REQUESTS,
+            sticky_max_failures=worker_config.PROXY_STICKY_MAX_FAILURES,
+        )
+        if proxy_pool.proxies:
+            await registry.register(proxy_pool.proxies)
+        _proxy_registry = registry
+        logger.info(f"代理登记表初始化完成，本进程登记代理: {len(proxy_pool.proxies)}")
+    except Exception as e:
+        # 登记表不可用时退回进程内代理池
+        logger.error(f"代理登记表初始化失败: {e}")
+        return
+
+    if worker_config.PROXY_HEALTH_CHECK_URL:
+        _proxy_health_checker = ProxyHealthChecker(
+            _proxy_registry,
+            worker_config.PROXY_HEALTH_CHECK_URL,
+            interval=worker_config.PROXY_HEALTH_CHECK_INTERVAL,
+        )
+        _proxy_health_checker.start()
+
+
+async def _launch_browser() -> Browser:
+    """启动一个 Chromium 实例（首次启动与回收重启共用）"""
+    browser_options = {
+        "headless": worker_config.BROWSER_HEADLESS,
+        "timeout": worker_config.BROWSER_TIMEOUT,
+        "args": [
+            "--disable-blink-features=AutomationControlled",  # 禁用自动化特性
+            "--no-sandbox",
+            "--disable-setuid-sandbox",
+        ] + worker_config.BROWSER_ARGS
+    }
+    
+    if worker_config.BROWSER_EXECUTABLE_PATH:
+        logger.info(f"使用自定义浏览器内核: {worker_config.BROWSER_EXECUTABLE_PATH}")
+        browser_options["executable_path"] = worker_config.BROWSER_EXECUTABLE_PATH
+        
+    # 注意：这里我们启动一次浏览器，后续所有任务复用
+    # 如果需要支持不同类型的浏览器（firefox, webkit），可能需要更复杂的逻辑
+    return await _playwright.chromium.launch(**browser_options)
+
+
+async def _on_browser_launch(slot: BrowserSlot):
+    """新浏览器实例就绪：创建并预热其上下文池"""
+    if worker_config.CONTEXT_POOL_ENABLED:
+        slot.context_pool = ContextPool(
+            max_idle_per_key=worker_config.CONTEXT_POOL_MAX_IDLE,
+            max_uses=worker_config.CONTEXT_POOL_MAX_USES,
+        )
+        await _prewarm_contexts(slot)
+
+
+async def _on_browser_close(slot: BrowserSlot):
+    """浏览器实例关闭前释放其上下文池"""
+    if slot.context_pool:
+        await slot.context_pool.close()
+        slot.context_pool = None
+
+
+def _select_proxy(options: Dict[str, Any], sticky_key: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    选择本次任务使用的代理
+
+    优先级: options指定 > 环境变量单代理 > 代理池
+    """
+    proxy = None
+    if options.get("proxy"):
+        # 如果 options 直接提供了代理字符串，解析它
+        proxy_str = options.get("proxy")
+        if isinstance(proxy_str, str):
+            proxy = proxy_pool.parse_proxy(proxy_str)
+        else:
+            proxy = proxy_str
+    elif worker_config.PROXY_URL:
+        proxy = _env_proxy()
+    else:
+        # 从代理池按健康分选择，跳过重试前失败过的出口
+        proxy = proxy_pool.get_proxy(exclude=options.get("exclude_proxies"), sticky_key=sticky_key)
+        if proxy:
+            logger.debug(f"使用代理池代理: {proxy.get('server')}")
+    return proxy
+
+
+def _sticky_key(url: str, options: Dict[str, Any]) -> Optional[str]:
+    """
+    粘性代理会话 Key: "域名|会话 ID"
+
+    options.sticky_proxy（默认 PROXY_STICKY_ENABLED）开启时，同一站点同一会话固定使用
+    同一个出口，配合上下文复用与会话状态缓存保持已通过挑战的状态；
+    options.session_id 区分同一站点下的多个独立会话
+    """
+    if not options.get("sticky_proxy", worker_config.PROXY_STICKY_ENABLED):
+        return None
+    host = (urlparse(url).hostname or "").lower()
+    return f"{host}|{options.get('session_id', 'default')}"
+
+
+async def _acquire_proxy(
+    url: str,
+    options: Dict[str, Any],
+    timer: PhaseTimer
+) -> Tuple[Optional[Dict[str, str]], Optional[ProxyLease]]:
+    """
+    选择代理；启用分布式登记表时从 Redis 租用，调用方需在结束后归还租约
+
+    Returns:
+        (Playwright 代理配置, 租约)，未使用登记表时租约为 None
+    """
+    sticky_key = _sticky_key(url, options)
+    if _proxy_registry is None or options.get("proxy") or worker_config.PROXY_URL:
+        return _select_proxy(options, sticky_key), None
+    try:
+        with timer.phase("proxy_lease"):
+            lease = await _proxy_registry.lease(
+                exclude=options.get("exclude_proxies"),
+                timeout=worker_config.PROXY_LEASE_WAIT,
+                sticky_key=sticky_key,
+            )
+    except TimeoutError:
+        raise
+    except Exception as e:
+        logger.warning(f"租用代理失败，退回进程内代理池: {e}")
+        return _select_proxy(options, sticky_key), None
+    if lease is None:
+        return _select_proxy(options, sticky_key), None
+    logger.debug(f"租用代理: {lease.proxy.get('server')}")
+    return lease.proxy, lease
+
+
+async def _release_proxy(lease: Optional[ProxyLease]):
+    """归还代理租约"""
+    if lease is not None and _proxy_registry is not None:
+        await _proxy_registry.release(lease)
+
+
+def _is_network_error(exc: BaseException) -> bool:
+    """是否为可能由代理出口导致的网络错误（导航超时、连接失败等）"""
+    if type(exc).__name__ in ("TimeoutError", "ConnectError", "ConnectTimeout", "ProxyError", "ReadTimeout"):
+        return True
+    return "net::ERR_" in str(exc)
+
+
+async def _report_proxy(
+    proxy: Optional[Dict[str, str]],
+    result: Optional[Dict[str, Any]] = None,
+    exc: Optional[BaseException] = None,
+    lease: Optional[ProxyLease] = None
+):
+    """
+    把一次爬取结果回报给代理池或分布式登记表（不属于代理池的代理会被忽略）
+
+    被封禁的状态码与网络错误计为失败，延迟取导航 / HTTP 请求阶段耗时；
+    与出口无关的错误（脚本、参数等）只计入请求数，不影响健康状态
+    """
+    if not proxy:
+        return
+    success, latency, nbytes = None, None, 0
+    if exc is not None:
+        if _is_network_error(exc):
+            success = False
+            # 重试时避开该出口（登记表中的代理以 ID 标识）
+            exc.proxy_server = lease.proxy_id if lease is not None else proxy_pool.proxy_key(proxy)
+    elif result and result.get("success"):
+        timings = result.get("timings") or {}
+        latency = timings.get("goto", timings.get("http_fetch"))
+        success = result.get("status_code") not in BAN_STATUS_CODES
+        # 以页面 HTML 大小近似统计流量（未回传 HTML 时结果中仍带有 content_length）
+        nbytes = result.get("content_length") or len(result.get("html") or "")
+
+    if lease is not None and _proxy_registry is not None:
+        await _proxy_registry.record(lease.proxy_id, success, latency_ms=latency, nbytes=nbytes)
+    elif success is not None and proxy_pool.proxies:
+        proxy_pool.report(proxy, success=success, latency_ms=latency)
+
+
+def _detect_challenge(status_code: Optional[int], html: Optional[str]) -> bool:
+    """根据状态码与 HTML 开头判断是否为挑战页"""
+    head = html[:_CHALLENGE_SCAN_CHARS] if isinstance(html, str) else ""
+    return is_challenge(status_code, head)
+
+
+def _result_is_challenge(result: Dict[str, Any]) -> bool:
+    """
+    爬取结果是否为挑战页
+
+    渲染时在丢弃 HTML 之前已检测并写入 result["challenge"]，没有该字段时退回检查 HTML
+    """
+    if "challenge" in result:
+        return bool(result["challenge"])
+    return _detect_challenge(result.get("status_code"), result.get("html"))
+
+
+async def _effective_rate_limit(url: str, options: Dict[str, Any]) -> int:
+    """每分钟限额: 任务 options["rate_limit"] > 域名自适应限额 > RATE_LIMIT_PER_MINUTE"""
+    if "rate_limit" in options:
+        return options["rate_limit"]
+    if _rate_policy is not None:
+        limit = await _rate_policy.limit_for(url, worker_config.RATE_LIMIT_PER_MINUTE)
+        return max(1, int(limit))
+    return worker_config.RATE_LIMIT_PER_MINUTE
+
+
+async def _report_domain(
+    url: str,
+    result: Optional[Dict[str, Any]] = None,
+    exc: Optional[BaseException] = None
+):
+    """把一次爬取结果回报给域名自适应限流策略（429/503、挑战页、延迟上升时下调限额）"""
+    if _rate_policy is None:
+        return
+    latency = None
+    if exc is not None:
+        # 脚本、参数等与站点负载无关的错误不计入
+        if not _is_network_error(exc):
+            return
+        outcome = classify_outcome(None, error=True)
+    elif result:
+        outcome = classify_outcome(result.get("status_code"), challenge=_result_is_challenge(result))
+        timings = result.get("timings") or {}
+        latency = timings.get("goto", timings.get("http_fetch"))
+    else:
+        return
+    await _rate_policy.record(url, outcome, latency, initial=worker_config.RATE_LIMIT_PER_MINUTE)
+
+
+def _env_proxy() -> Dict[str, str]:
+    """使用旧的单代理配置"""
+    proxy_config = {
+        "server": worker_config.PROXY_URL
+    }
+    if worker_config.PROXY_USERNAME and worker_config.PROXY_PASSWORD:
+        proxy_config["username"] = worker_config.PROXY_USERNAME
+        proxy_config["password"] = worker_config.PROXY_PASSWORD
+    return proxy_config
+
+
+def _select_fingerprint(
+    options: Dict[str, Any],
+    proxy: Optional[Dict[str, str]],
+    user_agent: str,
+    pool: Optional[ContextPool] = None,
+    hooks_hash: str = ""
+) -> Dict[str, Any]:
+    """
+    选择本次任务使用的指纹
+
+    未指定 fingerprint_id 时，优先选择上下文池中已有空闲上下文的指纹
+    """
+    fingerprint_id = options.get("fingerprint_id")
+    if not fingerprint_id and pool:
+        proxy_id = make_context_key(proxy, None, user_agent)[0]
+        warm = pool.warm_keys(proxy_id, user_agent, hooks_hash)
+        if warm:
+            fingerprint_id = random.choice(warm)[1]
+
+    return resolve_fingerprint({
+        "fingerprint": get_fingerprint(fingerprint_id),
+        "user_agent": user_agent,
+    })
+
+
+async def _create_context(
+    browser: Browser,
+    proxy: Optional[Dict[str, str]],
+    user_agent: str,
+    fingerprint: Dict[str, Any],
+    hook_scripts: Optional[list] = None,
+    storage_state: Optional[Dict[str, Any]] = None
+) -> BrowserContext:
+    """
+    创建浏览器上下文并注入初始化脚本包
+
+    stealth、指纹覆盖与 webdriver 补丁合并为一个脚本，Hook 脚本各自独立（按指纹与 Hook 集合缓存），
+    在上下文级别注入一次，对其后创建的所有页面生效，上下文被复用时无需重复注入
+    """
+    context_options = {
+        "user_agent": user_agent,
+        "viewport": {"width": 1920, "height": 1080},
+        "device_scale_factor": 1,
+    }
+    if proxy:
+        context_options["proxy"] = proxy
+    if storage_state:
+        # 载入缓存的 Cookie 与 localStorage
+        context_options["storage_state"] = storage_state
+
+    _, init_scripts = init_bundler.build(fingerprint, hook_scripts)
+    context = await browser.new_context(**context_options)
+    try:
+        for script in init_scripts:
+            await context.add_init_script(script)
+    except Exception:
+        await context.close()
+        raise
+    return context
+
+
+async def _prewarm_contexts(slot: BrowserSlot):
+    """为每个候选代理预创建上下文"""
+    pool = slot.context_pool
+    if not pool or worker_config.CONTEXT_POOL_PREWARM <= 0:
+        return
+
+    if worker_config.PROXY_URL:
+        candidates = [_env_proxy()]
+    elif proxy_pool.proxies:
+        candidates = proxy_pool.parsed_proxies()
+    else:
+        candidates = [None]
+
+    for proxy in candidates:
+        fingerprint = resolve_fingerprint({"user_agent": DEFAULT_USER_AGENT})
+        key = make_context_key(proxy, fingerprint["id"], DEFAULT_USER_AGENT)
+        await pool.warm(
+            key,
+            lambda proxy=proxy, fingerprint=fingerprint: _create_context(
+                slot.browser, proxy, DEFAULT_USER_AGENT, fingerprint
+            ),
+            worker_config.CONTEXT_POOL_PREWARM,
+        )
+    logger.info(f"上下文池预热完成，空闲上下文: {pool.idle_count()}")
+
+
 async def _close_browser():
     """关闭全局浏览器实例"""
-    global _playwright, _browser
-    if _browser:
-        logger.info("正在关闭全局 Playwright 浏览器实例...")
-        await _browser.close()
-        _browser = None
+    global _playwright, _browser_pool, _http_fetcher, _rate_limiter, _storage_state_cache
+    global _proxy_registry, _proxy_health_checker, _rate_policy
+    if _proxy_health_checker:
+        await _proxy_health_checker.stop()
+        _proxy_health_checker = None
+
+    if _proxy_registry:
+        await _proxy_registry.close()
+        _proxy_registry = None
+
+    if _http_fetcher:
+        await _http_fetcher.close()
+        _http_fetcher = None
+
+    if _storage_state_cache:
+        await _storage_state_cache.close()
+        _storage_state_cache = None
+
+    if _rate_limiter:
+        await _rate_limiter.close()
+        _rate_limiter = None
+
+    if _rate_policy:
+        await _rate_policy.close()
+        _rate_policy = None
+
+    if _browser_pool:
+        logger.info(f"正在关闭全局 Playwright 浏览器实例... {_browser_pool.stats()}")
+        await _browser_pool.close()
+        _browser_pool = None
     
     if _playwright:
         await _playwright.stop()
@@ -104,21 +581,127 @@ def init_worker_process(**kwargs):
     
     在每个 Worker 子进程启动时初始化 Playwright 浏览器
     """
-    # 异步初始化需要在事件循环中运行
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_init_browser())
+    # 在本进程的常驻事件循环中启动浏览器（prefork 子进程各自持有一个循环）
+    _run_async(_init_browser())
 
 @worker_process_shutdown.connect
 def shutdown_worker_process(**kwargs):
     """
     Worker 进程关闭信号处理
     """
+    global _page_semaphore, _browser_lock
     # 尝试优雅关闭
     try:
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(_close_browser())
+        _run_async(_close_browser())
     except Exception as e:
         logger.error(f"关闭浏览器实例时发生错误: {e}")
+    finally:
+        _runtime.stop()
+        # 信号量与锁绑定在已停止的循环上
+        _page_semaphore = None
+        _browser_lock = None
+
+
+@worker_shutdown.connect
+def shutdown_worker(**kwargs):
+    """
+    Worker 主进程关闭信号处理
+
+    线程池模式（-P threads）下不会触发 worker_process_shutdown，
+    浏览器运行在主进程的常驻事件循环中，需要在这里关闭
+    """
+    if not _runtime.running:
+        return
+    shutdown_worker_process()
+
+def _get_http_fetcher() -> HttpFetcher:
+    """获取 HTTP 快速通道客户端（在事件循环内首次使用时创建）"""
+    global _http_fetcher
+    if _http_fetcher is None:
+        _http_fetcher = HttpFetcher(max_connections=worker_config.HTTP_MAX_CONNECTIONS)
+    return _http_fetcher
+
+
+async def _try_http_fast_path(
+    url: str,
+    options: Dict[str, Any],
+    hook_scripts: list,
+    proxy: Optional[Dict[str, str]],
+    user_agent: str,
+    timer: PhaseTimer,
+    proxy_lease: Optional[ProxyLease] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    尝试用 HTTP 直接抓取页面
+
+    Args:
+        proxy_lease: 代理租约，请求失败时随结果一并上报
+
+    Returns:
+        (结果, None) 表示快速通道成功；(None, 原因) 表示需要升级到浏览器
+    """
+    # 需要在页面内执行脚本的任务只能走浏览器
+    if hook_scripts:
+        return None, "hooks"
+    if options.get("human_behavior", False):
+        return None, "human_behavior"
+
+    timeout = options.get("timeout", worker_config.BROWSER_TIMEOUT) / 1000
+    try:
+        with timer.phase("http_fetch"):
+            fetched = await _get_http_fetcher().fetch(url, proxy, user_agent, timeout=timeout)
+    except Exception as e:
+        logger.info(f"HTTP 快速通道请求失败，升级到浏览器: {url}, Error={str(e)}")
+        await _report_proxy(proxy, exc=e, lease=proxy_lease)
+        return None, "http_error"
+
+    # HTML 解析是 CPU 密集操作，放到线程池中避免阻塞事件循环上的其他页面
+    with timer.phase("http_detect"):
+        reason = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: needs_javascript(
+                fetched["status_code"],
+                fetched["html"],
+                wait_for_selector=options.get("wait_for_selector"),
+                markers=options.get("js_markers", DEFAULT_JS_MARKERS),
+                min_text_length=options.get("min_text_length", worker_config.HTTP_FAST_PATH_MIN_TEXT),
+            ),
+        )
+    if reason:
+        return None, reason
+
+    # 结构化提取与浏览器路径语义一致，同样放到线程池中执行
+    html = fetched["html"]
+    # 在按需丢弃 HTML 之前完成挑战页检测与大小统计
+    challenge = _detect_challenge(fetched["status_code"], html)
+    content_length = len(html)
+    extracted = None
+    extract_schema = resolve_schema(options)
+    if extract_schema:
+        with timer.phase("extract"):
+            extracted = await asyncio.get_running_loop().run_in_executor(
+                None, extract_from_html, html, extract_schema
+            )
+        if not options.get("include_html", False):
+            html = None
+
+    title_match = re.search(r"<title[^>]*>(.*?)</title>", fetched["html"], re.IGNORECASE | re.DOTALL)
+    result = {
+        "url": fetched["url"],
+        "original_url": url,
+        "status_code": fetched["status_code"],
+        "title": title_match.group(1).strip() if title_match else "",
+        "html": html,
+        "hook_data": None,
+        "success": True,
+        "render_path": "http",
+        "challenge": challenge,
+        "content_length": content_length,
+    }
+    if extract_schema:
+        result["extracted"] = extracted
+    return result, None
+
 
 async def _crawl_page_async(
     url: str,
@@ -136,92 +719,314 @@ async def _crawl_page_async(
     Returns:
         包含 URL、HTML 内容和其他元信息的字典
     """
-    # 移除 global _browser，因为不需要在函数内重新赋值
-    # _browser 已经在模块级别定义，且只读访问不需要 global
-    
     options = options or {}
     hook_scripts = hook_scripts or []
     
-    # 确保浏览器已初始化
-    if _browser is None:
-        logger.warning("浏览器实例未初始化，尝试重新初始化...")
-        await _init_browser()
-        if _browser is None:
-             raise RuntimeError("无法初始化 Playwright 浏览器")
+    # 分阶段计时，结果中以 timings 返回（毫秒），并按阶段/域名写入直方图
+    timer = PhaseTimer()
     
-    # 执行速率限制检查
-    if _rate_limiter:
-        # 默认每分钟 60 次，可从 options 覆盖
-        limit = options.get("rate_limit", worker_config.RATE_LIMIT_PER_MINUTE) if hasattr(worker_config, "RATE_LIMIT_PER_MINUTE") else 60
-        # 阻塞等待直到允许请求
-        _rate_limiter.wait_if_needed(url, limit=limit)
+    await _ensure_browser()
+    
+    # extract 格式错误时在占用浏览器之前失败
+    resolve_schema(options)
+    
+    # 执行速率限制检查（调度时已预留许可的任务跳过）
+    if _rate_limiter and not options.get("rate_limit_reserved"):
+        # 默认每分钟 60 次，可从 options 覆盖；启用自适应策略时使用域名当前限额
+        limit = await _effective_rate_limit(url, options)
+        # 异步等待到下一个许可可用，不阻塞事件循环上的其他页面
+        with timer.phase("rate_limit"):
+            await _rate_limiter.wait_if_needed(url, limit=limit)
 
     # 配置代理
-    # 优先级: options指定 > 环境变量单代理 > 代理池
-    proxy = None
-    if options.get("proxy"):
-        # 如果 options 直接提供了代理字符串，解析它
-        proxy_str = options.get("proxy")
-        if isinstance(proxy_str, str):
-            proxy = proxy_pool._parse_proxy(proxy_str)
-        else:
-            proxy = proxy_str
-    elif worker_config.PROXY_URL:
-        # 使用旧的单代理配置
-        proxy_config = {
-            "server": worker_config.PROXY_URL
-        }
-        if worker_config.PROXY_USERNAME and worker_config.PROXY_PASSWORD:
-            proxy_config["username"] = worker_config.PROXY_USERNAME
-            proxy_config["password"] = worker_config.PROXY_PASSWORD
-        proxy = proxy_config
-    else:
-        # 尝试从代理池获取
-        proxy = proxy_pool.get_proxy()
-        if proxy:
-            logger.debug(f"使用代理池代理: {proxy.get('server')}")
+    # 优先级: options指定 > 环境变量单代理 > 分布式登记表 / 代理池
+    proxy, proxy_lease = await _acquire_proxy(url, options, timer)
+    try:
+        return await _crawl_with_proxy(url, options, hook_scripts, timer, proxy, proxy_lease)
+    finally:
+        await _release_proxy(proxy_lease)
+
+
+async def _crawl_with_proxy(
+    url: str,
+    options: Dict[str, Any],
+    hook_scripts: list,
+    timer: PhaseTimer,
+    proxy: Optional[Dict[str, str]],
+    proxy_lease: Optional[ProxyLease] = None
+) -> Dict[str, Any]:
+    """使用已选定的代理完成一次爬取（HTTP 快速通道或浏览器渲染），并回报代理使用结果"""
+    domain = urlparse(url).netloc
     
     # User-Agent 配置
-    user_agent = options.get("user_agent")
-    if not user_agent:
-        # 默认使用通用浏览器 UA，或者后续从 UA 池中随机选择
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    user_agent = options.get("user_agent") or DEFAULT_USER_AGENT
+
+    # HTTP 快速通道：render="auto" 时先直接抓取，检测到依赖 JS 时才升级到浏览器
+    fallback_reason = None
+    if options.get("render") == "auto":
+        http_result, fallback_reason = await _try_http_fast_path(
+            url, options, hook_scripts, proxy, user_agent, timer, proxy_lease
+        )
+        if http_result is not None:
+            CRAWL_RENDER_PATH.labels(path="http", reason="").inc()
+            http_result["timings"] = timer.as_dict()
+            await _report_proxy(proxy, http_result, lease=proxy_lease)
+            await _report_domain(url, http_result)
+            timer.observe(domain)
+            logger.info(f"爬取成功 (HTTP): {url}, Status={http_result['status_code']}")
+            return http_result
+        logger.debug(f"升级到浏览器渲染: {url}, reason={fallback_reason}")
+
+    # 占用一个页面并发槽位，超出 WORKER_PAGE_CONCURRENCY 的任务在此排队
+    page_semaphore = _get_page_semaphore()
+    with timer.phase("queue"):
+        await page_semaphore.acquire()
 
+    browser_pool = _browser_pool
+    slot: Optional[BrowserSlot] = None
     context: Optional[BrowserContext] = None
+    lease: Optional[PooledContext] = None
+    failed = False
     try:
-        # 创建浏览器上下文
-        context_options = {
-            "user_agent": user_agent,
-            "viewport": {"width": 1920, "height": 1080},
-            "device_scale_factor": 1,
-        }
-        if proxy:
-            context_options["proxy"] = proxy
+        # 获取当前浏览器实例（崩溃重启期间在此等待新实例就绪）
+        with timer.phase("queue"):
+            slot = await browser_pool.acquire()
+        pool = slot.context_pool
+
+        # 指纹与 Hook 集合共同决定初始化脚本包和上下文池 Key
+        hook_scripts, hook_stream = _prepare_hook_scripts(options, hook_scripts)
+        hooks_hash = hook_set_hash(hook_scripts)
+        fingerprint = _select_fingerprint(options, proxy, user_agent, pool, hooks_hash)
+
+        # 会话状态缓存：命中时载入已通过挑战 / 登录的 Cookie 与 localStorage
+        state_cache = _get_storage_state_cache(options)
+        host = urlparse(url).hostname or domain
+        proxy_id = make_context_key(proxy, None, None)[0]
+        storage_state = None
+        if state_cache:
+            with timer.phase("storage_state"):
+                storage_state = await state_cache.load(host, proxy_id)
+
+        # 创建（或从上下文池租用）浏览器上下文
+        with timer.phase("context"):
+            lease, context = await _open_context(
+                slot, proxy, user_agent, fingerprint, hook_scripts, hooks_hash,
+                reuse=options.get("reuse_context", True),
+                storage_state=storage_state,
+            )
+            if lease:
+                lease.track_origin(url)
         
-        # 为每个任务创建独立的上下文
-        context = await _browser.new_context(**context_options)
+        result = await _render_page(
+            context, url, options, fingerprint, timer, fallback_reason, slot, hook_stream, lease
+        )
         
-        # 创建新页面
-        page: Page = await context.new_page()
+        if state_cache:
+            with timer.phase("storage_state"):
+                result["storage_state"] = await _sync_storage_state(
+                    state_cache, context, host, proxy_id, [result], loaded=storage_state is not None
+                )
+            result["timings"] = timer.as_dict()
+        await _report_proxy(proxy, result, lease=proxy_lease)
+        await _report_domain(url, result)
+        return result
+        
+    except Exception as e:
+        failed = True
+        logger.error(f"爬取失败: {url}, Error={str(e)}")
+        await _report_proxy(proxy, exc=e, lease=proxy_lease)
+        await _report_domain(url, exc=e)
+        raise
+    finally:
+        # 务必归还或关闭上下文，释放资源，但不关闭 Browser
+        # 出错的上下文直接淘汰，避免把异常状态带给后续任务
+        try:
+            if lease:
+                await pool.release(lease, discard=failed)
+            elif context:
+                await context.close()
+        finally:
+            if slot:
+                browser_pool.release(slot)
+            page_semaphore.release()
+            timer.observe(domain)
+
+
+async def _open_context(
+    slot: BrowserSlot,
+    proxy: Optional[Dict[str, str]],
+    user_agent: str,
+    fingerprint: Dict[str, Any],
+    hook_scripts: Optional[list],
+    hooks_hash: str,
+    reuse: bool = True,
+    storage_state: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[PooledContext], BrowserContext]:
+    """
+    创建（或从上下文池租用）浏览器上下文
+
+    载入会话状态时总是新建上下文（状态只能在创建时传入，且不能带入池中）
+
+    Returns:
+        (上下文池租约, 上下文)，未使用上下文池时租约为 None，调用方负责关闭上下文
+    """
+    def factory():
+        return _create_context(slot.browser, proxy, user_agent, fingerprint, hook_scripts, storage_state)
+
+    pool = slot.context_pool
+    if pool and reuse and not storage_state:
+        key = make_context_key(proxy, fingerprint["id"], user_agent, hooks_hash)
+        lease = await pool.acquire(key, factory)
+        return lease, lease.context
+    return None, await factory()
+
+
+def _prepare_hook_scripts(
+    options: Dict[str, Any],
+    hook_scripts: Optional[list]
+) -> Tuple[list, bool]:
+    """
+    开启 Hook 事件推送时，在 Hook 脚本前加入推送脚本
+
+    Returns:
+        (最终注入的 Hook 脚本, 是否开启推送)
+    """
+    if hook_scripts and options.get("hook_stream", worker_config.HOOK_STREAM_ENABLED):
+        return [get_hook_stream_script()] + list(hook_scripts), True
+    return list(hook_scripts or []), False
+
+
+def _get_subresource_cache(options: Dict[str, Any]) -> Optional[SubresourceCache]:
+    """获取子资源磁盘缓存（已配置且任务未关闭 subresource_cache 时）"""
+    global _subresource_cache
+    if not worker_config.SUBRESOURCE_CACHE_DIR or not options.get("subresource_cache", True):
+        return None
+    if _subresource_cache is None:
+        _subresource_cache = SubresourceCache(
+            worker_config.SUBRESOURCE_CACHE_DIR,
+            max_bytes=worker_config.SUBRESOURCE_CACHE_MAX_MB * 1024 * 1024,
+            max_entry_bytes=worker_config.SUBRESOURCE_CACHE_MAX_ENTRY_MB * 1024 * 1024,
+            resource_types=worker_config.SUBRESOURCE_CACHE_TYPES,
+        )
+    return _subresource_cache
+
+
+def _get_storage_state_cache(options: Dict[str, Any]) -> Optional[StorageStateCache]:
+    """任务开启会话状态复用时返回缓存实例"""
+    global _storage_state_cache
+    if not options.get("reuse_storage_state", worker_config.STORAGE_STATE_CACHE_ENABLED):
+        return None
+    if _storage_state_cache is None:
+        _storage_state_cache = StorageStateCache(
+            worker_config.CELERY_BROKER_URL,
+            ttl=worker_config.STORAGE_STATE_TTL,
+        )
+    return _storage_state_cache
+
+
+async def _sync_storage_state(
+    cache: StorageStateCache,
+    context: BrowserContext,
+    host: str,
+    proxy_id: str,
+    results: List[Dict[str, Any]],
+    loaded: bool
+) -> Dict[str, Any]:
+    """
+    根据抓取结果更新会话状态缓存
+
+    仍然遇到挑战页时，说明载入的状态已失效，删除缓存；否则导出当前状态覆盖写入
+
+    Returns:
+        {"loaded": 是否载入了缓存状态, "action": saved / skipped / invalidated / challenge}
+    """
+    rendered = [r for r in results if r.get("render_path") == "browser"]
+    if any(_result_is_challenge(r) for r in rendered):
+        if loaded:
+            await cache.invalidate(host, proxy_id)
+            return {"loaded": loaded, "action": "invalidated"}
+        return {"loaded": loaded, "action": "challenge"}
+    if not rendered:
+        return {"loaded": loaded, "action": "skipped"}
+    try:
+        saved = await cache.save(host, proxy_id, await context.storage_state())
+    except Exception as e:
+        logger.warning(f"导出会话状态失败: {host}, Error={str(e)}")
+        saved = False
+    return {"loaded": loaded, "action": "saved" if saved else "skipped"}
+
+
+async def _render_page(
+    context: BrowserContext,
+    url: str,
+    options: Dict[str, Any],
+    fingerprint: Dict[str, Any],
+    timer: PhaseTimer,
+    fallback_reason: Optional[str] = None,
+    slot: Optional[BrowserSlot] = None,
+    hook_stream: bool = False,
+    lease: Optional[PooledContext] = None
+) -> Dict[str, Any]:
+    """
+    在给定上下文中打开新页面完成一次抓取，结束后关闭页面
+
+    Args:
+        context: 浏览器上下文（可能被同一批次的其他页面共享）
+        url: 目标 URL
+        options: 爬取选项
+        fingerprint: 上下文使用的指纹
+        timer: 分阶段计时器
+        fallback_reason: 从 HTTP 快速通道升级到浏览器的原因
+        slot: 上下文所属的浏览器实例（统计打开页面数，用于多浏览器负载均衡）
+        hook_stream: 是否接收 Hook 脚本实时推送的事件
+        lease: 上下文池租约，关闭页面前记录页面与 iframe 的源，归还时清空其站点存储
+
+    Returns:
+        爬取结果字典
+    """
+    page: Optional[Page] = None
+    cache_handler: Optional[CachedRouteHandler] = None
+    hook_buffer: Optional[HookEventBuffer] = None
+    try:
+        with timer.phase("page_setup"):
+            # 创建新页面
+            page = await context.new_page()
+            if slot:
+                slot.open_pages += 1
         
-        # 注入钩子脚本
-        for script in hook_scripts:
+            # stealth、指纹与钩子脚本已在上下文级别通过脚本包注入
+            # CDP User-Agent / Client Hints 覆盖作用于单个页面，是每页唯一的固定开销
             try:
-                await page.add_init_script(script)
-                logger.debug(f"已注入钩子脚本: {script[:50]}...")
+                await apply_user_agent_override(page, fingerprint)
             except Exception as e:
-                logger.warning(f"注入钩子脚本失败: {str(e)}")
-        
-        # 集成 playwright-stealth 反爬
-        if HAS_STEALTH:
-            await stealth_async(page)
-            logger.debug("已启用 playwright-stealth 反爬模式")
+                logger.warning(f"CDP 指纹注入失败: {str(e)}")
         
-        # 启用 CDP 深度指纹注入
-        await inject_cdp_fingerprint(page, {"user_agent": user_agent})
-        
-        # 移除 webdriver 属性（双重保险）
-        await page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # 子资源缓存：静态资源命中本地磁盘缓存时直接返回，不再经过代理下载
+            # 需先于资源拦截注册（后注册的路由先执行，被拦截的请求不会进入缓存）
+            subresource_cache = _get_subresource_cache(options)
+            if subresource_cache:
+                cache_handler = CachedRouteHandler(subresource_cache)
+                await cache_handler.attach(page)
+            
+            # 资源拦截：丢弃图片、字体、媒体和第三方追踪请求，节省代理流量
+            blocker = ResourceBlocker.from_option(options.get("block_resources"))
+            if blocker:
+                await blocker.attach(page)
+            
+            # Hook 事件实时推送：页面内 Hook 通过绑定把事件分批发送到缓冲区
+            if hook_stream:
+                hook_buffer = HookEventBuffer(
+                    max_events=worker_config.HOOK_STREAM_MAX_EVENTS,
+                    max_bytes=worker_config.HOOK_STREAM_MAX_BYTES,
+                )
+                await hook_buffer.attach(page)
+            
+            # 静默等待需要从导航开始统计网络请求
+            wait_strategy = options.get("wait_strategy")
+            tracker = None
+            if wait_strategy == "quiescent":
+                tracker = NetworkTracker(long_request_ms=worker_config.QUIESCENCE_LONG_REQUEST_MS)
+                tracker.attach(page)
         
         # 导航到目标 URL
         logger.info(f"开始爬取: {url}")
@@ -233,40 +1038,69 @@ async def _crawl_page_async(
         wait_until = options.get("wait_until", "domcontentloaded")
         wait_for_selector = options.get("wait_for_selector")
         
-        response = await page.goto(url, wait_until=wait_until, timeout=timeout)
+        with timer.phase("goto"):
+            response = await page.goto(url, wait_until=wait_until, timeout=timeout)
+        
+        # 静默等待：DOM 与相关网络请求同时静默 quiet_window 毫秒后返回，最多等待 max_wait 毫秒
+        wait_info = None
+        if tracker:
+            with timer.phase("quiescence"):
+                wait_info = await wait_for_quiescence(
+                    page,
+                    tracker,
+                    quiet_ms=options.get("quiet_window", worker_config.QUIESCENCE_WINDOW_MS),
+                    max_wait_ms=options.get("max_wait", worker_config.QUIESCENCE_MAX_WAIT_MS),
+                )
         
         # 如果指定了选择器，则额外等待选择器出现
         if wait_for_selector:
-            try:
-                await page.wait_for_selector(wait_for_selector, timeout=timeout)
-                logger.debug(f"已等待选择器: {wait_for_selector}")
-            except Exception as e:
-                logger.warning(f"等待选择器超时: {wait_for_selector}, error: {str(e)}")
+            with timer.phase("wait_selector"):
+                try:
+                    await page.wait_for_selector(wait_for_selector, timeout=timeout)
+                    logger.debug(f"已等待选择器: {wait_for_selector}")
+                except Exception as e:
+                    logger.warning(f"等待选择器超时: {wait_for_selector}, error: {str(e)}")
         
         # 执行拟人化行为 (如果是反爬严格的站点，建议开启)
         if options.get("human_behavior", False):
-            await human_like_interaction(page)
+            with timer.phase("human_behavior"):
+                await human_like_interaction(page)
+        
+        # 结构化提取：在页面内一次 evaluate 完成，指定 extract 时默认不再回传整页 HTML
+        extract_schema = resolve_schema(options)
+        extracted = None
+        if extract_schema:
+            with timer.phase("extract"):
+                extracted = await extract_in_page(page, extract_schema)
         
-        # 获取页面内容
-        html_content = await page.content()
+        # 获取页面内容与元信息
+        with timer.phase("content"):
+            html_content = None
+            if options.get("include_html", extract_schema is None):
+                html_content = await page.content()
+                html_head, content_length = html_content, len(html_content)
+            else:
+                # 不回传整页 HTML 时只取开头与长度，挑战页检测与流量统计仍然可用
+                html_head, content_length = await page.evaluate(_CONTENT_PROBE_SCRIPT)
+            title = await page.title()
+            url_final = page.url
         
         # 提取 Hook 数据
         # 默认提取 window._hook_data，也支持从 options 中指定变量名
         hook_data_var = options.get("hook_data_var", "window._hook_data")
         hook_data = None
-        try:
-            # 检查变量是否存在
-            handle = await page.evaluate_handle(f"typeof {hook_data_var} !== 'undefined' ? {hook_data_var} : null")
-            if handle:
-                hook_data = await handle.json_value()
+        with timer.phase("hook_extract"):
+            try:
+                # 变量存在时直接返回其 JSON 值（一次往返）
+                hook_data = await page.evaluate(f"typeof {hook_data_var} !== 'undefined' ? {hook_data_var} : null")
                 if hook_data:
                     logger.info(f"成功提取 Hook 数据: {len(str(hook_data))} bytes")
-        except Exception as e:
-            logger.warning(f"提取 Hook 数据失败 ({hook_data_var}): {str(e)}")
-        
-        # 获取页面元信息
-        title = await page.title()
-        url_final = page.url
+            except Exception as e:
+                logger.warning(f"提取 Hook 数据失败 ({hook_data_var}): {str(e)}")
+            
+            # 拉取页面队列中尚未推送的 Hook 事件
+            if hook_buffer:
+                await hook_buffer.flush(page)
         
         # 获取响应状态
         status_code = response.status if response else None
@@ -279,18 +1113,250 @@ async def _crawl_page_async(
             "html": html_content,
             "hook_data": hook_data,
             "success": True,
+            "render_path": "browser",
+            "challenge": _detect_challenge(status_code, html_head),
+            "content_length": content_length,
         }
+        if extract_schema:
+            result["extracted"] = extracted
+        if fallback_reason:
+            result["render_fallback_reason"] = fallback_reason
+        CRAWL_RENDER_PATH.labels(path="browser", reason=fallback_reason or "").inc()
+        
+        if blocker:
+            # saved_bytes 为按资源类型典型体积估算的节省流量
+            result["blocked_resources"] = blocker.stats()
+        if cache_handler:
+            result["subresource_cache"] = cache_handler.stats()
+        if wait_info:
+            result["wait"] = wait_info
+        if hook_buffer:
+            result["hook_events_dropped"] = hook_buffer.dropped
+            result["hook_events"] = hook_buffer.drain()
         
-        logger.info(f"爬取成功: {url}, Status={status_code}")
+        result["timings"] = timer.as_dict()
+        
+        logger.info(f"爬取成功: {url}, Status={status_code}, Timings={result['timings']}")
         return result
         
     except Exception as e:
-        logger.error(f"爬取失败: {url}, Error={str(e)}")
+        # 页面失败时保留已收到的 Hook 事件，由调用方写入失败结果
+        if hook_buffer and hook_buffer.events:
+            e.hook_events = hook_buffer.drain()
         raise
     finally:
-        # 务必关闭上下文，释放资源，但不关闭 Browser
-        if context:
-            await context.close()
+        if cache_handler:
+            await cache_handler.flush()
+        if page is not None:
+            if slot:
+                slot.open_pages -= 1
+            if lease:
+                # 页面关闭后上下文池无法再从 context.pages 找到跳转目标与 iframe 的源
+                lease.track_page(page)
+            try:
+                await page.close()
+            except Exception as e:
+                logger.debug(f"关闭页面失败: {e}")
+
+
+async def _crawl_batch_async(
+    urls: List[str],
+    options: Optional[Dict[str, Any]] = None,
+    hook_scripts: Optional[list] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    批量爬取同一站点的多个 URL（内部函数）
+    
+    整批只选择一次代理与指纹，占用一次浏览器实例并共享一个上下文（批内 Cookie 共享，
+    适合列表翻页 + 详情页）。页面并发同时受 batch_concurrency 与 WORKER_PAGE_CONCURRENCY 限制。
+    单个 URL 失败不影响其他 URL。
+    
+    Args:
+        urls: 目标 URL 列表
+        options: 爬取选项（对批内所有 URL 生效）
+        hook_scripts: 要注入的 JavaScript 钩子脚本列表
+        on_result: 每个 URL 完成后的回调，按完成顺序调用
+    
+    Returns:
+        按输入顺序排列的结果列表，每项带 index 字段
+    """
+    options = options or {}
+    hook_scripts = hook_scripts or []
+    if not urls:
+        return []
+    
+    await _ensure_browser()
+    
+    resolve_schema(options)
+    # 整批使用同一个代理（启用分布式登记表时整批占用一个租约）
+    proxy, proxy_lease = await _acquire_proxy(urls[0], options, PhaseTimer())
+    user_agent = options.get("user_agent") or DEFAULT_USER_AGENT
+    concurrency = int(options.get("batch_concurrency", worker_config.BATCH_CONCURRENCY))
+    batch_semaphore = asyncio.Semaphore(max(1, min(concurrency, len(urls))))
+    page_semaphore = _get_page_semaphore()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    rendered = 0
+    failed = False
+    
+    browser_pool = _browser_pool
+    try:
+        slot = await browser_pool.acquire()
+    except BaseException:
+        await _release_proxy(proxy_lease)
+        raise
+    pool = slot.context_pool
+    context: Optional[BrowserContext] = None
+    lease: Optional[PooledContext] = None
+    
+    async def crawl_one(index: int, url: str):
+        nonlocal rendered, failed
+        async with batch_semaphore:
+            timer = PhaseTimer()
+            try:
+                if _rate_limiter:
+                    with timer.phase("rate_limit"):
+                        limit = await _effective_rate_limit(url, options)
+                        await _rate_limiter.wait_if_needed(url, limit=limit)
+                
+                result, fallback_reason = None, None
+                if options.get("render") == "auto":
+                    result, fallback_reason = await _try_http_fast_path(
+                        url, options, hook_scripts, proxy, user_agent, timer, proxy_lease
+                    )
+                    if result is not None:
+                        CRAWL_RENDER_PATH.labels(path="http", reason="").inc()
+                        result["timings"] = timer.as_dict()
+                
+                if result is None:
+                    if lease:
+                        lease.track_origin(url)
+                    with timer.phase("queue"):
+                        await page_semaphore.acquire()
+                    try:
+                        rendered += 1
+                        result = await _render_page(
+                            context, url, options, fingerprint, timer, fallback_reason,
+                            slot, hook_stream, lease
+                        )
+                    finally:
+                        page_semaphore.release()
+                await _report_proxy(proxy, result, lease=proxy_lease)
+                await _report_domain(url, result)
+            except Exception as e:
+                failed = True
+                logger.error(f"爬取失败: {url}, Error={str(e)}")
+                await _report_proxy(proxy, exc=e, lease=proxy_lease)
+                await _report_domain(url, exc=e)
+                result = {
+                    "url": url,
+                    "original_url": url,
+                    "success": False,
+                    "error": str(e),
+                    "timings": timer.as_dict(),
+                }
+                # 页面失败前已推送的 Hook 事件
+                if getattr(e, "hook_events", None):
+                    result["hook_events"] = e.hook_events
+            finally:
+                timer.observe(urlparse(url).netloc)
+        
+        result["index"] = index
+        results[index] = result
+        if on_result:
+            try:
+                await on_result(result)
+            except Exception as e:
+                logger.warning(f"推送批量结果失败: {url}, Error={str(e)}")
+    
+    try:
+        hook_scripts, hook_stream = _prepare_hook_scripts(options, hook_scripts)
+        hooks_hash = hook_set_hash(hook_scripts)
+        fingerprint = _select_fingerprint(options, proxy, user_agent, pool, hooks_hash)
+        
+        # 会话状态缓存：整批只载入一次，结束后统一更新
+        state_cache = _get_storage_state_cache(options)
+        host = urlparse(urls[0]).hostname or ""
+        proxy_id = make_context_key(proxy, None, None)[0]
+        storage_state = await state_cache.load(host, proxy_id) if state_cache else None
+        
+        lease, context = await _open_context(
+            slot, proxy, user_agent, fingerprint, hook_scripts, hooks_hash,
+            reuse=options.get("reuse_context", True),
+            storage_state=storage_state,
+        )
+        
+        await asyncio.gather(*(crawl_one(i, url) for i, url in enumerate(urls)))
+        
+        if state_cache:
+            sync = await _sync_storage_state(
+                state_cache, context, host, proxy_id, results, loaded=storage_state is not None
+            )
+            logger.info(f"批量任务会话状态: {host}, {sync}")
+        return results
+        
+    except Exception:
+        failed = True
+        raise
+    finally:
+        # 批内有页面失败时淘汰上下文，避免把异常状态带给后续任务
+        try:
+            if lease:
+                await pool.release(lease, discard=failed)
+            elif context:
+                await context.close()
+        except Exception as e:
+            logger.warning(f"释放批量任务上下文失败: {e}")
+        finally:
+            browser_pool.release(slot, pages=rendered)
+            await _release_proxy(proxy_lease)
+
+
+async def _crawl_batch_streaming(
+    task: Any,
+    urls: List[str],
+    options: Optional[Dict[str, Any]],
+    hook_scripts: Optional[list]
+) -> List[Dict[str, Any]]:
+    """执行批量爬取，并把每个完成的结果写入结果流、更新任务进度"""
+    batch_id = task.request.id
+    loop = asyncio.get_running_loop()
+    store = _get_blob_store()
+    client = aioredis.from_url(worker_config.CELERY_BROKER_URL) if batch_id else None
+    progress = {"total": len(urls), "completed": 0, "failed": 0}
+    
+    async def on_result(result: Dict[str, Any]):
+        progress["completed"] += 1
+        if not result.get("success"):
+            progress["failed"] += 1
+        if store is not None:
+            await loop.run_in_executor(
+                None, offload_fields, result, store,
+                worker_config.BLOB_OFFLOAD_FIELDS, worker_config.BLOB_OFFLOAD_THRESHOLD,
+            )
+        if client is None:
+            return
+        await publish_batch_result(client, batch_id, result, ttl=worker_config.BATCH_RESULT_TTL)
+        meta = dict(progress)
+        await loop.run_in_executor(
+            None, lambda: task.update_state(state="PROGRESS", meta=meta)
+        )
+    
+    try:
+        return await _crawl_batch_async(urls, options, hook_scripts, on_result)
+    finally:
+        if client is not None:
+            await client.aclose()
+
+
+def _get_blob_store() -> Optional[BlobStore]:
+    """获取大字段存储实例（首次使用时创建）"""
+    global _blob_store
+    if _blob_store is None and worker_config.BLOB_STORE_URL:
+        with _blob_store_lock:
+            if _blob_store is None:
+                _blob_store = create_blob_store(worker_config.BLOB_STORE_URL)
+    return _blob_store
 
 
 @celery_app.task(
@@ -320,17 +1386,18 @@ def crawl_page(
         爬取结果字典
     """
     try:
-        # 运行异步函数
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        result = loop.run_until_complete(
+        # 提交到常驻事件循环执行
+        result = _run_async(
             _crawl_page_async(url, options, hook_scripts)
         )
         
-        return result
+        # 大字段压缩转存到外部存储，结果后端只保存引用
+        return offload_fields(
+            result,
+            _get_blob_store(),
+            fields=worker_config.BLOB_OFFLOAD_FIELDS,
+            threshold=worker_config.BLOB_OFFLOAD_THRESHOLD,
+        )
         
     except Exception as exc:
         logger.error(
@@ -338,14 +1405,95 @@ def crawl_page(
             f"URL={url}, Error={str(exc)}"
         )
         
-        # 重试逻辑
+        # 重试逻辑：出口网络错误时换一个代理重试
         if self.request.retries < worker_config.MAX_RETRIES:
+            failed_proxy = getattr(exc, "proxy_server", None)
+            reserved = (options or {}).get("rate_limit_reserved")
+            if failed_proxy or reserved:
+                options = dict(options or {})
+                # 调度时预留的限流许可已被本次执行使用，重试重新经过 Worker 侧限流
+                options.pop("rate_limit_reserved", None)
+                if failed_proxy:
+                    options["exclude_proxies"] = list(options.get("exclude_proxies") or []) + [failed_proxy]
+                raise self.retry(exc=exc, args=(url, options, hook_scripts), kwargs=kwargs)
             raise self.retry(exc=exc)
         else:
-            # 达到最大重试次数，返回错误结果
-            return {
+            # 达到最大重试次数，返回错误结果（附带页面失败前已收到的 Hook 事件）
+            error_result = {
                 "url": url,
                 "success": False,
                 "error": str(exc),
                 "retries": self.request.retries,
             }
+            if getattr(exc, "hook_events", None):
+                error_result["hook_events"] = exc.hook_events
+            return offload_fields(
+                error_result,
+                _get_blob_store(),
+                fields=worker_config.BLOB_OFFLOAD_FIELDS,
+                threshold=worker_config.BLOB_OFFLOAD_THRESHOLD,
+            )
+
+
+@celery_app.task(
+    name="astra_farm.workers.playwright_worker.crawl_batch",
+    bind=True,
+    max_retries=worker_config.MAX_RETRIES,
+    default_retry_delay=worker_config.RETRY_DELAY,
+    acks_late=True,
+)
+def crawl_batch(
+    self,
+    urls: List[str],
+    options: Optional[Dict[str, Any]] = None,
+    hook_scripts: Optional[list] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Celery 任务：批量爬取同一站点的多个 URL
+    
+    每个 URL 完成后立即追加到结果流（见 astra_dataflow.storage.batch_results），
+    并以 PROGRESS 状态更新进度；单个 URL 失败记录在其结果中，不触发整批重试。
+    
+    Args:
+        urls: 目标 URL 列表
+        options: 爬取选项
+        hook_scripts: 要注入的 JavaScript 钩子脚本
+        **kwargs: 其他参数
+    
+    Returns:
+        {"batch_id", "total", "succeeded", "failed", "results"}
+    """
+    try:
+        results = _run_async(
+            _crawl_batch_streaming(self, urls, options, hook_scripts)
+        )
+    except Exception as exc:
+        # 只有浏览器或上下文不可用时才会走到这里，此时尚未产生任何结果
+        logger.error(
+            f"批量任务执行失败 (尝试 {self.request.retries + 1}/{worker_config.MAX_RETRIES}): "
+            f"URLs={len(urls)}, Error={str(exc)}"
+        )
+        if self.request.retries < worker_config.MAX_RETRIES:
+            raise self.retry(exc=exc)
+        return {
+            "batch_id": self.request.id,
+            "total": len(urls),
+            "succeeded": 0,
+            "failed": len(urls),
+            "success": False,
+            "error": str(exc),
+            "retries": self.request.retries,
+            "results": [],
+        }
+    
+    succeeded = sum(1 for r in results if r.get("success"))
+    logger.info(f"批量任务完成: {succeeded}/{len(results)} 成功")
+    return {
+        "batch_id": self.request.id,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "success": True,
+        "results": results,
+    }
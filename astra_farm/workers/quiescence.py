@@ -0,0 +1,131 @@
+"""
+DOM 静默等待模块
+
+wait_strategy="quiescent" 时，页面导航完成后注入 MutationObserver 记录最近一次 DOM 变更，
+同时在 Python 侧统计进行中的相关网络请求；DOM 与网络同时静默达到指定窗口即返回，
+超过硬上限仍未静默时放弃等待。相比 networkidle，长轮询、统计信标等请求不会拖住等待。
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from .resource_blocker import DEFAULT_BLOCKED_HOSTS, compile_host_pattern, host_of
+
+logger = logging.getLogger(__name__)
+
+# 不计入网络活动的资源类型（长连接、信标、媒体流）
+IGNORED_RESOURCE_TYPES = frozenset({"websocket", "eventsource", "ping", "media", "manifest"})
+
+# 安装 MutationObserver（幂等），记录最近一次 DOM 变更时间
+_OBSERVER_SCRIPT = """() => {
+    if (window.__astraQuiet) return;
+    const state = window.__astraQuiet = { last: performance.now() };
+    const root = document.documentElement || document;
+    new MutationObserver(() => { state.last = performance.now(); }).observe(root, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+}"""
+
+# 返回距最近一次 DOM 变更的毫秒数
+_DOM_IDLE_PROBE = "() => window.__astraQuiet ? performance.now() - window.__astraQuiet.last : 0"
+
+
+class NetworkTracker:
+    """统计页面进行中的相关请求（需在导航前挂载）"""
+
+    def __init__(
+        self,
+        ignored_types: FrozenSet[str] = IGNORED_RESOURCE_TYPES,
+        ignored_hosts: Optional[Iterable[str]] = None,
+        long_request_ms: float = 5000
+    ):
+        """
+        Args:
+            ignored_types: 不计入的资源类型
+            ignored_hosts: 不计入的域名（默认为第三方统计/广告域名）
+            long_request_ms: 超过该时长仍未完成的请求视为长轮询，不再阻塞静默判断
+        """
+        self.ignored_types = ignored_types
+        hosts = DEFAULT_BLOCKED_HOSTS if ignored_hosts is None else frozenset(ignored_hosts)
+        self._host_pattern = compile_host_pattern(hosts)
+        self.long_request_ms = long_request_ms
+        # request -> 开始时间
+        self._inflight: Dict[Any, float] = {}
+        self.last_activity = time.monotonic()
+
+    def _relevant(self, request) -> bool:
+        if request.resource_type in self.ignored_types:
+            return False
+        if self._host_pattern is not None and self._host_pattern.search(host_of(request.url)):
+            return False
+        return True
+
+    def on_request(self, request):
+        if self._relevant(request):
+            self._inflight[request] = time.monotonic()
+            self.last_activity = time.monotonic()
+
+    def on_done(self, request):
+        if self._inflight.pop(request, None) is not None:
+            self.last_activity = time.monotonic()
+
+    def idle_ms(self, now: Optional[float] = None) -> float:
+        """网络静默时长（毫秒），仍有相关请求进行中时返回 0"""
+        now = time.monotonic() if now is None else now
+        limit = self.long_request_ms / 1000
+        if any(now - started < limit for started in self._inflight.values()):
+            return 0.0
+        return (now - self.last_activity) * 1000
+
+    def attach(self, page):
+        """挂载到页面请求事件"""
+        page.on("request", self.on_request)
+        page.on("requestfinished", self.on_done)
+        page.on("requestfailed", self.on_done)
+
+
+async def wait_for_quiescence(
+    page,
+    tracker: NetworkTracker,
+    quiet_ms: float = 500,
+    max_wait_ms: float = 10000,
+    poll_ms: float = 50
+) -> Dict[str, Any]:
+    """
+    等待 DOM 与网络同时静默
+
+    Args:
+        page: Playwright Page（已完成导航）
+        tracker: 导航前挂载的网络请求统计
+        quiet_ms: 静默窗口（毫秒）
+        max_wait_ms: 最长等待时间（毫秒）
+        poll_ms: 最小轮询间隔（毫秒）
+
+    Returns:
+        {"strategy": "quiescent", "quiet": 是否达到静默, "waited_ms": 实际等待时间}
+    """
+    start = time.monotonic()
+    deadline = start + max_wait_ms / 1000
+    quiet = False
+    try:
+        await page.evaluate(_OBSERVER_SCRIPT)
+        while True:
+            dom_idle = await page.evaluate(_DOM_IDLE_PROBE)
+            idle = min(float(dom_idle or 0), tracker.idle_ms())
+            if idle >= quiet_ms:
+                quiet = True
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # 直接睡到静默窗口可能结束的时刻，期间有新活动则下一轮重新计算
+            await asyncio.sleep(min(max(quiet_ms - idle, poll_ms) / 1000, remaining))
+    except Exception as e:
+        # 页面跳转导致执行上下文销毁等情况，放弃等待并继续抓取
+        logger.debug(f"静默等待中断: {e}")
+
+    waited = round((time.monotonic() - start) * 1000, 1)
+    if not quiet:
+        logger.debug(f"页面未在 {max_wait_ms}ms 内静默，继续抓取")
+    return {"strategy": "quiescent", "quiet": quiet, "waited_ms": waited}
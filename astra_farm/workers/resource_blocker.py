@@ -0,0 +1,146 @@
+"""
+资源拦截模块
+
+通过 Playwright 路由拦截图片、字体、媒体等子资源以及第三方追踪脚本，
+减少代理流量并缩短页面加载时间。
+"""
+import re
+import logging
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Pattern
+
+logger = logging.getLogger(__name__)
+
+# 默认拦截的资源类型 (Playwright request.resource_type)
+DEFAULT_BLOCKED_TYPES = frozenset({"image", "font", "media"})
+
+# 默认拦截的第三方追踪/广告域名（匹配域名本身及其子域名）
+DEFAULT_BLOCKED_HOSTS = frozenset({
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "connect.facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.io",
+    "mixpanel.com",
+    "hm.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+    "growingio.com",
+})
+
+# 各类型资源的典型传输体积（字节），被拦截的请求不会下载，只能按此估算节省的流量
+_TYPICAL_SIZES = {
+    "image": 25 * 1024,
+    "font": 40 * 1024,
+    "media": 500 * 1024,
+    "stylesheet": 20 * 1024,
+    "script": 30 * 1024,
+}
+_DEFAULT_TYPICAL_SIZE = 5 * 1024
+
+
+@lru_cache(maxsize=64)
+def compile_host_pattern(hosts: FrozenSet[str]) -> Optional[Pattern]:
+    """把域名列表编译为一个正则，匹配域名本身及其子域名"""
+    if not hosts:
+        return None
+    alternation = "|".join(re.escape(h.lower().lstrip(".")) for h in sorted(hosts))
+    return re.compile(rf"(?:^|\.)(?:{alternation})$")
+
+
+def host_of(url: str) -> str:
+    """从 URL 中快速提取主机名"""
+    if "://" not in url:
+        return ""
+    host = url.split("://", 1)[1].split("/", 1)[0]
+    host = host.rsplit("@", 1)[-1].split(":", 1)[0]
+    return host.lower()
+
+
+class ResourceBlocker:
+    """基于资源类型和域名黑名单的请求拦截器（每个任务一个实例）"""
+
+    def __init__(
+        self,
+        resource_types: Optional[Iterable[str]] = None,
+        blocked_hosts: Optional[Iterable[str]] = None
+    ):
+        """
+        初始化拦截器
+
+        Args:
+            resource_types: 拦截的资源类型，None 表示使用默认值
+            blocked_hosts: 拦截的域名列表，None 表示使用默认值
+        """
+        self.resource_types = (
+            DEFAULT_BLOCKED_TYPES if resource_types is None else frozenset(resource_types)
+        )
+        hosts = DEFAULT_BLOCKED_HOSTS if blocked_hosts is None else frozenset(blocked_hosts)
+        self._host_pattern = compile_host_pattern(hosts)
+
+        # 任务级统计
+        self.blocked_requests = 0
+        self.saved_bytes = 0
+
+    @classmethod
+    def from_option(cls, option: Any) -> Optional["ResourceBlocker"]:
+        """
+        根据任务选项 block_resources 构造拦截器
+
+        支持的格式:
+            True                                  - 默认类型 + 默认追踪域名
+            ["image", "font"]                     - 仅指定资源类型
+            {"types": [...], "hosts": [...]}      - 同时指定类型和域名
+
+        Returns:
+            ResourceBlocker 实例，选项为空时返回 None
+        """
+        if not option:
+            return None
+        if option is True:
+            return cls()
+        if isinstance(option, (list, tuple, set)):
+            return cls(resource_types=option)
+        if isinstance(option, dict):
+            return cls(
+                resource_types=option.get("types"),
+                blocked_hosts=option.get("hosts"),
+            )
+        logger.warning(f"无法识别的 block_resources 选项: {option!r}")
+        return None
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """判断请求是否需要拦截"""
+        if resource_type in self.resource_types:
+            return True
+        if self._host_pattern is not None:
+            return self._host_pattern.search(host_of(url)) is not None
+        return False
+
+    async def handle(self, route):
+        """Playwright 路由处理函数"""
+        request = route.request
+        resource_type = request.resource_type
+        if self.should_block(resource_type, request.url):
+            self.blocked_requests += 1
+            self.saved_bytes += _TYPICAL_SIZES.get(resource_type, _DEFAULT_TYPICAL_SIZE)
+            await route.abort("blockedbyclient")
+            return
+        # 交给其他路由处理器（如有），否则正常发出请求
+        await route.fallback()
+
+    async def attach(self, page):
+        """在页面上注册拦截路由"""
+        await page.route("**/*", self.handle)
+
+    def stats(self) -> Dict[str, int]:
+        """返回任务级拦截统计"""
+        return {
+            "blocked_requests": self.blocked_requests,
+            "saved_bytes": self.saved_bytes,
+        }
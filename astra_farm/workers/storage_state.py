@@ -0,0 +1,102 @@
+"""
+会话状态缓存模块
+
+按 (域名, 代理出口) 缓存通过 context.storage_state() 导出的 Cookie 与 localStorage，
+存放在 Redis 中并设置过期时间。下一个任务创建上下文时直接载入，跳过重复的
+JS 挑战、Cookie 同意弹窗或登录页；再次遇到挑战时视为状态失效并删除。
+"""
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+import redis.asyncio as aioredis
+
+from .metrics import STORAGE_STATE_CACHE
+
+logger = logging.getLogger(__name__)
+
+# Redis Key 前缀
+_KEY_PREFIX = "astra:storage_state"
+
+
+def storage_state_key(host: str, proxy_id: str) -> str:
+    """
+    生成缓存 Key
+
+    代理标识可能包含账号，取哈希避免明文出现在 Redis Key 中
+    """
+    proxy_part = hashlib.sha1(proxy_id.encode("utf-8")).hexdigest()[:12] if proxy_id else "direct"
+    return f"{_KEY_PREFIX}:{host.lower()}:{proxy_part}"
+
+
+class StorageStateCache:
+    """基于 Redis 的会话状态缓存"""
+
+    def __init__(self, redis_url: str, ttl: int = 1800, max_bytes: int = 512 * 1024):
+        """
+        Args:
+            redis_url: Redis 连接 URL
+            ttl: 状态过期时间（秒）
+            max_bytes: 单条状态最大字节数，超出时不缓存
+        """
+        self.redis = aioredis.from_url(redis_url)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    async def load(self, host: str, proxy_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的会话状态
+
+        Returns:
+            可直接传给 new_context(storage_state=...) 的字典，未命中时返回 None
+        """
+        try:
+            raw = await self.redis.get(storage_state_key(host, proxy_id))
+        except Exception as e:
+            logger.warning(f"读取会话状态失败: {host}, Error={str(e)}")
+            raw = None
+
+        state = None
+        if raw:
+            try:
+                state = json.loads(raw)
+            except ValueError:
+                state = None
+        STORAGE_STATE_CACHE.labels(domain=host, result="hit" if state else "miss").inc()
+        return state
+
+    async def save(self, host: str, proxy_id: str, state: Dict[str, Any]) -> bool:
+        """
+        写入会话状态（覆盖旧值并刷新过期时间）
+
+        Returns:
+            是否写入成功
+        """
+        if not state or not (state.get("cookies") or state.get("origins")):
+            return False
+        raw = json.dumps(state, ensure_ascii=False)
+        if len(raw) > self.max_bytes:
+            logger.debug(f"会话状态过大，跳过缓存: {host}, {len(raw)} bytes")
+            return False
+        try:
+            await self.redis.set(storage_state_key(host, proxy_id), raw, ex=self.ttl)
+            return True
+        except Exception as e:
+            logger.warning(f"写入会话状态失败: {host}, Error={str(e)}")
+            return False
+
+    async def invalidate(self, host: str, proxy_id: str):
+        """删除失效的会话状态（再次遇到挑战时调用）"""
+        STORAGE_STATE_CACHE.labels(domain=host, result="invalidated").inc()
+        try:
+            await self.redis.delete(storage_state_key(host, proxy_id))
+        except Exception as e:
+            logger.warning(f"删除会话状态失败: {host}, Error={str(e)}")
+
+    async def close(self):
+        """关闭 Redis 连接"""
+        try:
+            await self.redis.aclose()
+        except Exception as e:
+            logger.debug(f"关闭会话状态缓存连接失败: {e}")
@@ -0,0 +1,459 @@
+"""
+子资源磁盘缓存模块
+
+把可缓存的静态子资源（JS、CSS、字体等）保存在节点本地磁盘上，由所有上下文和
+Worker 进程共享。命中且仍在有效期内的请求通过 route.fulfill 直接返回，过期但带
+ETag / Last-Modified 的条目发起条件请求校验，未命中的请求仍由浏览器自身发出，
+响应到达后写入缓存，避免同一份大体积资源反复经过付费代理下载。
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .metrics import SUBRESOURCE_CACHE_REQUESTS, SUBRESOURCE_CACHE_SAVED_BYTES
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存的资源类型 (Playwright request.resource_type)
+DEFAULT_CACHED_TYPES = frozenset({"script", "stylesheet", "font", "image"})
+
+# 回放时不能原样返回的响应头（正文已解码，长度由 fulfill 重新计算）
+_DROP_HEADERS = frozenset({
+    "content-encoding", "content-length", "transfer-encoding", "connection",
+    "keep-alive", "set-cookie", "age", "date",
+})
+
+# 只缓存这些状态码的响应
+_CACHEABLE_STATUS = frozenset({200, 203})
+
+# 带有这些请求头的请求携带凭据，响应可能因用户而异，不写入共享缓存
+_CREDENTIAL_HEADERS = ("authorization", "cookie")
+
+# 无显式过期时间时，按 Last-Modified 启发式估算有效期的上限（秒）
+_HEURISTIC_MAX_AGE = 86400
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """解析 Cache-Control 头，返回 {指令: 参数}"""
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers: Dict[str, str], now: Optional[float] = None) -> Optional[float]:
+    """
+    计算响应的有效期（秒）
+
+    Returns:
+        有效期秒数，no-store 时返回 None
+    """
+    now = time.time() if now is None else now
+    cc = parse_cache_control(headers.get("cache-control"))
+    if "no-store" in cc or "private" in cc:
+        return None
+    if "no-cache" in cc:
+        # 可以缓存，但每次使用前都需要校验
+        return 0.0
+    if cc.get("max-age") is not None:
+        try:
+            return max(0.0, float(cc["max-age"]))
+        except ValueError:
+            return 0.0
+
+    date = _http_date(headers.get("date")) or now
+    expires = headers.get("expires")
+    if expires is not None:
+        expires_at = _http_date(expires)
+        return max(0.0, expires_at - date) if expires_at else 0.0
+
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified:
+        return min(_HEURISTIC_MAX_AGE, max(0.0, (date - last_modified) * 0.1))
+    return 0.0
+
+
+def is_credentialed(request_headers: Optional[Dict[str, str]]) -> bool:
+    """请求是否携带凭据（Authorization 或 Cookie）"""
+    return bool(request_headers) and any(
+        k.lower() in _CREDENTIAL_HEADERS for k in request_headers
+    )
+
+
+def is_cacheable(
+    status: int,
+    headers: Dict[str, str],
+    request_headers: Optional[Dict[str, str]] = None
+) -> bool:
+    """
+    判断响应能否写入缓存
+
+    缓存由节点上所有上下文共享，因此按共享缓存的规则处理：Cache-Control: private
+    的响应和携带凭据的请求都不缓存
+
+    Args:
+        status: 响应状态码
+        headers: 响应头（小写键）
+        request_headers: 对应的请求头，None 表示未知
+    """
+    if status not in _CACHEABLE_STATUS or "set-cookie" in headers:
+        return False
+    if is_credentialed(request_headers):
+        return False
+    vary = headers.get("vary", "").lower()
+    if vary and any(v.strip() not in ("accept-encoding", "") for v in vary.split(",")):
+        return False
+    lifetime = freshness_lifetime(headers)
+    if lifetime is None:
+        return False
+    # 没有有效期也没有校验器的条目无法复用
+    return lifetime > 0 or "etag" in headers or "last-modified" in headers
+
+
+class SubresourceCache:
+    """
+    节点本地的子资源磁盘缓存（按总大小淘汰的近似 LRU）
+
+    条目以 URL 的 SHA-256 命名，正文与元数据分文件存放，写入时先写临时文件再原子
+    替换，多个进程可以同时读写同一目录；命中时刷新 mtime，淘汰时删除 mtime 最旧的条目。
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        max_entry_bytes: int = 10 * 1024 * 1024,
+        resource_types: Optional[Iterable[str]] = None,
+        evict_every: int = 50
+    ):
+        """
+        Args:
+            root: 缓存目录（同一节点的所有 Worker 进程使用同一目录）
+            max_bytes: 缓存总大小上限
+            max_entry_bytes: 单个条目大小上限
+            resource_types: 缓存的资源类型，None 表示使用默认值
+            evict_every: 每写入多少个条目检查一次总大小
+        """
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.resource_types = (
+            DEFAULT_CACHED_TYPES if resource_types is None else frozenset(resource_types)
+        )
+        self.evict_every = max(1, evict_every)
+        self._writes = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.root, digest[:2], digest)
+        return base + ".meta", base + ".body"
+
+    def get(self, url: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """读取条目，返回 (元数据, 正文)，不存在或损坏时返回 None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or len(body) != meta.get("size"):
+            return None
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return meta, body
+
+    def put(
+        self,
+        url: str,
+        status: int,
+        headers: Dict[str, str],
+        body: bytes,
+        now: Optional[float] = None,
+        request_headers: Optional[Dict[str, str]] = None
+    ) -> bool:
+        """写入条目，不可缓存或超过单条上限时返回 False"""
+        if len(body) > self.max_entry_bytes or not is_cacheable(status, headers, request_headers):
+            return False
+        now = time.time() if now is None else now
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k not in _DROP_HEADERS},
+            "size": len(body),
+            "stored_at": now,
+            "expires_at": now + (freshness_lifetime(headers, now) or 0.0),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+        }
+        meta_path, body_path = self._paths(url)
+        try:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            # 先写正文再写元数据，读取方以元数据中的 size 校验正文完整性
+            self._atomic_write(body_path, body)
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logger.debug(f"写入子资源缓存失败: {url}, {e}")
+            return False
+
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+        return True
+
+    def refresh(self, url: str, meta: Dict[str, Any], headers: Dict[str, str], now: Optional[float] = None):
+        """条件请求返回 304 后，按新响应头更新有效期"""
+        now = time.time() if now is None else now
+        merged = dict(meta["headers"])
+        merged.update({k: v for k, v in headers.items() if k not in _DROP_HEADERS})
+        meta = dict(meta, headers=merged, stored_at=now)
+        meta["expires_at"] = now + (freshness_lifetime(merged, now) or 0.0)
+        meta_path, _ = self._paths(url)
+        try:
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logger.debug(f"更新子资源缓存失败: {url}, {e}")
+        return meta
+
+    def _atomic_write(self, path: str, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def evict(self) -> int:
+        """
+        总大小超过上限时删除最久未使用的条目，直到降到上限的 90%
+
+        多进程同时触发时只有拿到文件锁的进程执行淘汰
+
+        Returns:
+            删除的条目数
+        """
+        lock_file = None
+        if HAS_FCNTL:
+            try:
+                lock_file = open(os.path.join(self.root, ".evict.lock"), "w")
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if lock_file:
+                    lock_file.close()
+                return 0
+
+        try:
+            entries = []
+            total = 0
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if not entry.name.endswith(".meta"):
+                        continue
+                    body_path = entry.path[:-5] + ".body"
+                    try:
+                        size = os.path.getsize(body_path) + entry.stat().st_size
+                        mtime = entry.stat().st_mtime
+                    except OSError:
+                        continue
+                    entries.append((mtime, size, entry.path, body_path))
+                    total += size
+
+            removed = 0
+            if total > self.max_bytes:
+                target = self.max_bytes * 0.9
+                for _, size, meta_path, body_path in sorted(entries):
+                    if total <= target:
+                        break
+                    for path in (meta_path, body_path):
+                        try:
+                            os.unlink(path)
+                        except OSError:
+                            pass
+                    total -= size
+                    removed += 1
+                logger.info(f"子资源缓存淘汰 {removed} 个条目，当前约 {total / 1024 / 1024:.0f}MB")
+            return removed
+        finally:
+            if lock_file:
+                lock_file.close()
+
+
+class CachedRouteHandler:
+    """页面级的子资源缓存路由（每个页面一个实例，负责统计与回填）"""
+
+    def __init__(self, cache: SubresourceCache):
+        """
+        Args:
+            cache: 节点共享的磁盘缓存
+        """
+        self.cache = cache
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.saved_bytes = 0
+        # 本页由缓存直接返回的 URL，不再回填
+        self._served: Set[str] = set()
+        self._pending: Set[asyncio.Task] = set()
+
+    def _eligible(self, request) -> bool:
+        return (
+            request.method == "GET"
+            and request.resource_type in self.cache.resource_types
+            and request.url.startswith(("http://", "https://"))
+        )
+
+    async def handle(self, route):
+        """Playwright 路由处理函数"""
+        request = route.request
+        if not self._eligible(request):
+            await route.fallback()
+            return
+        # request.headers 不含浏览器网络层附加的 Cookie，需读取完整请求头判断是否携带凭据
+        request_headers = {
+            k: v for k, v in (await request.all_headers()).items() if not k.startswith(":")
+        }
+        if is_credentialed(request_headers):
+            await route.fallback()
+            return
+
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.cache.get, request.url)
+        if cached is None:
+            self._record("miss")
+            await route.fallback()
+            return
+
+        meta, body = cached
+        if meta["expires_at"] <= time.time():
+            validators = {}
+            if meta.get("etag"):
+                validators["if-none-match"] = meta["etag"]
+            if meta.get("last_modified"):
+                validators["if-modified-since"] = meta["last_modified"]
+            if not validators:
+                self._record("miss")
+                await route.fallback()
+                return
+            # 过期条目发起条件请求校验，304 时继续使用缓存正文
+            try:
+                response = await route.fetch(headers={**request_headers, **validators})
+            except Exception as e:
+                logger.debug(f"子资源条件请求失败: {request.url}, {e}")
+                self._record("miss")
+                await route.fallback()
+                return
+            if response.status != 304:
+                self._record("miss")
+                fresh = await response.body()
+                self._served.add(request.url)
+                await route.fulfill(response=response, body=fresh)
+                await loop.run_in_executor(
+                    None, self.cache.put, request.url, response.status, response.headers, fresh,
+                    None, request_headers
+                )
+                return
+            meta = await loop.run_in_executor(
+                None, self.cache.refresh, request.url, meta, response.headers
+            )
+            self._record("revalidated", len(body))
+        else:
+            self._record("hit", len(body))
+
+        self._served.add(request.url)
+        await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+
+    def _record(self, result: str, saved: int = 0):
+        if result == "hit":
+            self.hits += 1
+        elif result == "revalidated":
+            self.revalidated += 1
+        else:
+            self.misses += 1
+        self.saved_bytes += saved
+        SUBRESOURCE_CACHE_REQUESTS.labels(result=result).inc()
+        if saved:
+            SUBRESOURCE_CACHE_SAVED_BYTES.inc(saved)
+
+    def _on_response(self, response):
+        """浏览器自行下载的子资源到达后回填缓存"""
+        request = response.request
+        if request.url in self._served or not self._eligible(request):
+            return
+        # 这里只做快速预筛，Cookie 等完整请求头在写入前检查
+        if not is_cacheable(response.status, response.headers, request.headers):
+            return
+        task = asyncio.ensure_future(self._store(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _store(self, response):
+        try:
+            # request.headers 不含浏览器网络层附加的 Cookie，需读取完整请求头判断是否携带凭据
+            request_headers = await response.request.all_headers()
+            body = await response.body()
+        except Exception as e:
+            # 页面关闭、重定向等情况下正文不可用
+            logger.debug(f"读取子资源正文失败: {response.url}, {e}")
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, self.cache.put, response.request.url, response.status, response.headers, body,
+            None, request_headers
+        )
+
+    async def attach(self, page):
+        """在页面上注册缓存路由与回填监听（需在资源拦截路由之前注册）"""
+        await page.route("**/*", self.handle)
+        page.on("response", self._on_response)
+
+    async def flush(self, timeout: float = 5.0):
+        """等待进行中的回填写入完成（页面关闭前调用）"""
+        if self._pending:
+            await asyncio.wait(list(self._pending), timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回页面级缓存统计"""
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.revalidated) / lookups, 3) if lookups else 0.0,
+            "saved_bytes": self.saved_bytes,
+        }
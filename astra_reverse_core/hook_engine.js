@@ -13,6 +13,17 @@
         interceptedData: []
     };
     
+    /**
+     * 记录拦截数据
+     * 已开启实时推送时直接发送到 Worker，不在页面内累积
+     */
+    function record(entry) {
+        if (typeof window.__astraEmit === 'function' && window.__astraEmit(entry)) {
+            return;
+        }
+        hooks.interceptedData.push(entry);
+    }
+    
     /**
      * 通用函数 Hook 工具
      */
@@ -45,7 +56,7 @@
             // Hook send 方法
             const originalSend = ws.send;
             ws.send = function(data) {
-                hooks.interceptedData.push({
+                record({
                     type: 'websocket_send',
                     url: url,
                     data: data,
@@ -61,7 +72,7 @@
                 set: function(handler) {
                     ws._onmessage = handler;
                     ws.addEventListener('message', function(event) {
-                        hooks.interceptedData.push({
+                        record({
                             type: 'websocket_message',
                             url: url,
                             data: event.data,
@@ -90,7 +101,7 @@
     function hookFetch() {
         hookFunction(window, 'fetch', function(original, ...args) {
             const [url, options] = args;
-            hooks.interceptedData.push({
+            record({
                 type: 'fetch_request',
                 url: url,
                 options: options,
@@ -100,7 +111,7 @@
             
             return original.apply(this, args).then(response => {
                 response.clone().text().then(text => {
-                    hooks.interceptedData.push({
+                    record({
                         type: 'fetch_response',
                         url: url,
                         status: response.status,
@@ -132,7 +143,7 @@
             
             const originalSend = xhr.send;
             xhr.send = function(data) {
-                hooks.interceptedData.push({
+                record({
                     type: 'xhr_request',
                     method: xhr._method,
                     url: xhr._url,
@@ -142,7 +153,7 @@
                 console.log('[AstraHook] XHR Request:', { method: xhr._method, url: xhr._url, data });
                 
                 xhr.addEventListener('load', function() {
-                    hooks.interceptedData.push({
+                    record({
                         type: 'xhr_response',
                         method: xhr._method,
                         url: xhr._url,
@@ -175,7 +186,7 @@
         
         hookFunction(context, functionName, function(original, ...args) {
             const result = original.apply(this, args);
-            hooks.interceptedData.push({
+            record({
                 type: 'sign_function',
                 function: functionName,
                 args: args,
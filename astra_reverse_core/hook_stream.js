@@ -0,0 +1,76 @@
+/**
+ * Hook 事件实时推送
+ * 
+ * 各 Hook 脚本通过 window.__astraEmit(event) 上报事件，这里按批合并后经
+ * Worker 暴露的 window.__astraHookSink 绑定发送到 Python 侧。
+ * 绑定不存在时 __astraEmit 返回 false，Hook 脚本照常把数据保存在页面内。
+ */
+
+(function() {
+    'use strict';
+    
+    if (window.__astraEmit) {
+        return;
+    }
+    
+    const streamConfig = {
+        flushInterval: 50,   // 合并发送间隔（毫秒）
+        maxBatch: 200        // 单批最大事件数
+    };
+    
+    let queue = [];
+    let timer = null;
+    
+    function serialize(event) {
+        try {
+            return JSON.stringify(event);
+        } catch (e) {
+            // 循环引用等无法序列化的数据只保留类型
+            return JSON.stringify({ type: event && event.type, unserializable: true });
+        }
+    }
+    
+    function flush() {
+        if (timer) {
+            clearTimeout(timer);
+            timer = null;
+        }
+        if (!queue.length || typeof window.__astraHookSink !== 'function') {
+            return;
+        }
+        const batch = '[' + queue.join(',') + ']';
+        queue = [];
+        try {
+            window.__astraHookSink(batch);
+        } catch (e) {
+            console.warn('[AstraStream] 推送失败:', e);
+        }
+    }
+    
+    window.__astraEmit = function(event) {
+        if (typeof window.__astraHookSink !== 'function') {
+            return false;
+        }
+        queue.push(serialize(event));
+        if (queue.length >= streamConfig.maxBatch) {
+            flush();
+        } else if (!timer) {
+            timer = setTimeout(flush, streamConfig.flushInterval);
+        }
+        return true;
+    };
+    
+    // 取出尚未推送的事件（Worker 在读取结果前直接拉取，避免等待定时器）
+    window.__astraTakePending = function() {
+        if (timer) {
+            clearTimeout(timer);
+            timer = null;
+        }
+        const batch = queue.length ? '[' + queue.join(',') + ']' : null;
+        queue = [];
+        return batch;
+    };
+    
+    // 页面跳转或关闭前发送剩余事件
+    window.addEventListener('pagehide', flush);
+})();
@@ -37,7 +37,12 @@
                 stack: new Error().stack
             };
             
-            signatureHooks.intercepted.push(interception);
+            // 已开启实时推送时直接发送到 Worker，不在页面内累积
+            const streamed = typeof window.__astraEmit === 'function' &&
+                window.__astraEmit({ type: 'signature', ...interception });
+            if (!streamed) {
+                signatureHooks.intercepted.push(interception);
+            }
             console.log(`[SignatureHook] 拦截到签名函数调用:`, interception);
             
             return result;
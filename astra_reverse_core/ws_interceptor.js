@@ -12,6 +12,23 @@
         messages: []
     };
     
+    /**
+     * 记录消息
+     * 已开启实时推送时直接发送到 Worker，不在页面内累积
+     */
+    function recordMessage(connection, message) {
+        const entry = {
+            connectionId: connection.id,
+            ...message
+        };
+        if (typeof window.__astraEmit === 'function' &&
+                window.__astraEmit({ ...entry, type: 'ws_' + message.type, url: connection.url })) {
+            return;
+        }
+        connection.messages.push(message);
+        wsInterceptor.messages.push(entry);
+    }
+    
     const OriginalWebSocket = window.WebSocket;
     
     window.WebSocket = function(url, protocols) {
@@ -36,11 +53,7 @@
                 data: data,
                 timestamp: Date.now()
             };
-            connection.messages.push(message);
-            wsInterceptor.messages.push({
-                connectionId: connectionId,
-                ...message
-            });
+            recordMessage(connection, message);
             console.log('[WSInterceptor] Send:', message);
             return originalSend.call(this, data);
         };
@@ -52,11 +65,7 @@
                 data: event.data,
                 timestamp: Date.now()
             };
-            connection.messages.push(message);
-            wsInterceptor.messages.push({
-                connectionId: connectionId,
-                ...message
-            });
+            recordMessage(connection, message);
             console.log('[WSInterceptor] Receive:', message);
         });
         
@@ -3,13 +3,18 @@
 
 提供 RESTful API 接口用于任务提交和状态查询
 """
+import json
 import logging
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, status, Security, Depends
+from typing import Optional, Dict, Any, List
+from fastapi import FastAPI, HTTPException, status, Security, Depends, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, HttpUrl, Field
 
-from .dispatcher import schedule_task, get_task_status, get_task_result
+from .dispatcher import (
+    schedule_task, schedule_batch, get_task_status, get_task_result, get_task_blob,
+    get_batch_results, iter_batch_results, get_rate_limits, get_rate_limit, set_rate_limit
+)
 from .config import config
 import redis
 
@@ -58,6 +63,20 @@ class CrawlRequest(BaseModel):
     )
 
 
+class BatchCrawlRequest(BaseModel):
+    """批量爬取任务请求模型"""
+    urls: List[HttpUrl] = Field(..., min_length=1, description="同一站点的目标 URL 列表")
+    priority: str = Field(
+        default="medium",
+        description="任务优先级",
+        pattern="^(high|medium|low)$"
+    )
+    options: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="额外选项，对批内所有 URL 生效，batch_concurrency 控制批内并发页面数"
+    )
+
+
 class TaskResponse(BaseModel):
     """任务响应模型"""
     task_id: str
@@ -73,6 +92,13 @@ class TaskStatusResponse(BaseModel):
     traceback: Optional[str] = None
 
 
+class RateLimitUpdate(BaseModel):
+    """域名限额配置请求模型（每分钟请求数）"""
+    min_limit: Optional[float] = Field(default=None, gt=0, description="自适应限额下限")
+    max_limit: Optional[float] = Field(default=None, gt=0, description="自适应限额上限")
+    limit: Optional[float] = Field(default=None, gt=0, description="直接设置当前限额")
+
+
 class SystemStatusResponse(BaseModel):
     """系统状态响应模型"""
     status: str
@@ -113,6 +139,49 @@ async def create_task(request: CrawlRequest):
         )
 
 
+@app.post(
+    "/tasks/batch",
+    response_model=TaskResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(verify_api_key)]
+)
+async def create_batch_task(request: BatchCrawlRequest):
+    """
+    提交批量爬取任务
+    
+    Args:
+        request: 批量爬取任务请求
+    
+    Returns:
+        任务响应，任务 ID 用于增量读取结果
+    """
+    try:
+        result = schedule_batch(
+            urls=[str(url) for url in request.urls],
+            priority=request.priority,
+            options=request.options
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"API: 创建批量任务失败 - {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量任务创建失败: {str(e)}"
+        )
+    
+    logger.info(f"API: 新批量任务已创建 - TaskID={result.id}, URLs={len(request.urls)}")
+    
+    return TaskResponse(
+        task_id=result.id,
+        status=result.status,
+        message="批量任务已成功提交"
+    )
+
+
 @app.get("/tasks/{task_id}", response_model=TaskStatusResponse, dependencies=[Depends(verify_api_key)])
 async def get_task(task_id: str):
     """
@@ -136,18 +205,22 @@ async def get_task(task_id: str):
 
 
 @app.get("/tasks/{task_id}/result", dependencies=[Depends(verify_api_key)])
-async def get_result(task_id: str):
+async def get_result(task_id: str, resolve: Optional[str] = None):
     """
     获取任务结果
     
+    已转存的大字段默认只返回引用（blob_refs），避免每次查询搬运整页 HTML
+    
     Args:
         task_id: 任务 ID
+        resolve: 需要还原的字段，逗号分隔，如 "html,hook_data"
     
     Returns:
         任务结果数据
     """
     try:
-        result = get_task_result(task_id)
+        fields = [f.strip() for f in resolve.split(",") if f.strip()] if resolve else None
+        result = get_task_result(task_id, resolve=fields)
         if result is None:
             raise HTTPException(
                 status_code=status.HTTP_202_ACCEPTED,
@@ -164,6 +237,150 @@ async def get_result(task_id: str):
         )
 
 
+@app.get("/tasks/{task_id}/batch", dependencies=[Depends(verify_api_key)])
+async def get_batch(task_id: str, offset: int = 0, resolve: Optional[str] = None):
+    """
+    增量获取批量任务已完成的结果
+    
+    Args:
+        task_id: 批量任务 ID
+        offset: 上次返回的 next_offset
+        resolve: 需要还原的字段，逗号分隔
+    
+    Returns:
+        本次新增的结果、下次读取的偏移量与任务进度
+    """
+    try:
+        fields = [f.strip() for f in resolve.split(",") if f.strip()] if resolve else None
+        return get_batch_results(task_id, offset, fields)
+    except Exception as e:
+        logger.error(f"API: 获取批量结果失败 - TaskID={task_id}, Error={str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取批量结果失败: {str(e)}"
+        )
+
+
+@app.get("/tasks/{task_id}/batch/stream", dependencies=[Depends(verify_api_key)])
+async def stream_batch(task_id: str, resolve: Optional[str] = None):
+    """
+    以 NDJSON 流式返回批量任务结果，每完成一个 URL 输出一行，整批完成后结束
+    
+    任务不存在（长时间 PENDING）或超过最长等待时间时，以一行 {"error": ...} 结束
+    
+    Args:
+        task_id: 批量任务 ID
+        resolve: 需要还原的字段，逗号分隔
+    """
+    fields = [f.strip() for f in resolve.split(",") if f.strip()] if resolve else None
+    
+    def generate():
+        error = None
+        try:
+            for result in iter_batch_results(
+                task_id,
+                resolve=fields,
+                timeout=config.BATCH_STREAM_TIMEOUT,
+                pending_timeout=config.BATCH_STREAM_PENDING_TIMEOUT,
+            ):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except KeyError:
+            error = "批量任务不存在、已过期或尚未开始执行"
+        except TimeoutError:
+            error = f"批量任务未在 {config.BATCH_STREAM_TIMEOUT}s 内完成"
+        except Exception as e:
+            logger.error(f"API: 流式读取批量结果失败 - TaskID={task_id}, Error={str(e)}")
+            error = f"读取批量结果失败: {str(e)}"
+        if error:
+            yield json.dumps({"batch_id": task_id, "error": error}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/tasks/{task_id}/blobs/{field}", dependencies=[Depends(verify_api_key)])
+async def get_blob(task_id: str, field: str):
+    """
+    获取任务结果中已转存字段的原始内容
+    
+    Args:
+        task_id: 任务 ID
+        field: 字段名，如 "html"
+    
+    Returns:
+        文本字段以 text/html 返回，其余以 JSON 返回
+    """
+    try:
+        value = get_task_blob(task_id, field)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"字段不存在或未转存: {field}"
+        )
+    except Exception as e:
+        logger.error(f"API: 读取转存字段失败 - TaskID={task_id}, Field={field}, Error={str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"读取转存字段失败: {str(e)}"
+        )
+    
+    if isinstance(value, str):
+        return Response(content=value, media_type="text/html; charset=utf-8")
+    if isinstance(value, bytes):
+        return Response(content=value, media_type="application/octet-stream")
+    return JSONResponse(content=value)
+
+
+@app.get("/rate-limits", dependencies=[Depends(verify_api_key)])
+async def list_rate_limits():
+    """
+    列出各域名当前生效的自适应限额
+    
+    Returns:
+        域名策略列表（限额、上下限、延迟与限流 / 挑战计数）
+    """
+    try:
+        return {"domains": get_rate_limits()}
+    except Exception as e:
+        logger.error(f"API: 获取域名限额失败 - {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取域名限额失败: {str(e)}"
+        )
+
+
+@app.get("/rate-limits/{domain}", dependencies=[Depends(verify_api_key)])
+async def get_domain_rate_limit(domain: str):
+    """获取单个域名当前生效的限额"""
+    try:
+        return get_rate_limit(domain)
+    except Exception as e:
+        logger.error(f"API: 获取域名限额失败 - Domain={domain}, Error={str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取域名限额失败: {str(e)}"
+        )
+
+
+@app.put("/rate-limits/{domain}", dependencies=[Depends(verify_api_key)])
+async def update_domain_rate_limit(domain: str, request: RateLimitUpdate):
+    """设置域名自适应限额的下限 / 上限，或直接指定当前限额"""
+    try:
+        return set_rate_limit(
+            domain,
+            min_limit=request.min_limit,
+            max_limit=request.max_limit,
+            limit=request.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"API: 设置域名限额失败 - Domain={domain}, Error={str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"设置域名限额失败: {str(e)}"
+        )
+
+
 @app.get("/status", response_model=SystemStatusResponse, dependencies=[Depends(verify_api_key)])
 async def get_system_status():
     """
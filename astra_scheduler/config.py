@@ -38,6 +38,25 @@ class Config:
         # 速率限制配置
         # 默认每域名每分钟最大请求数
         self.RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+        # 限流算法与突发容量（与 Worker 保持一致）
+        self.RATE_LIMIT_ALGORITHM = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window")
+        self.RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "0"))
+        # 调度时限流：提交任务时预留域名的下一个许可，并以 countdown 延迟投递，
+        # 被限流的任务不再占用 Worker 槽位与浏览器等待
+        self.SCHEDULE_RATE_LIMIT_ENABLED = os.getenv("SCHEDULE_RATE_LIMIT_ENABLED", "false").lower() == "true"
+        # 最长延迟（秒），超出时不预留，按原方式立即投递由 Worker 侧限流；
+        # 应小于 Redis Broker 的 visibility_timeout（默认 3600 秒）
+        self.SCHEDULE_RATE_LIMIT_MAX_DELAY = float(os.getenv("SCHEDULE_RATE_LIMIT_MAX_DELAY", "300"))
+        
+        # 单个批量任务最多包含的 URL 数
+        self.BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "500"))
+        # 流式读取批量结果的最长时间（秒），超时后以错误行结束
+        self.BATCH_STREAM_TIMEOUT = float(os.getenv("BATCH_STREAM_TIMEOUT", "3600"))
+        # 批量任务一直为 PENDING（不存在、已过期或仍在排队）超过该时间（秒）时结束流
+        self.BATCH_STREAM_PENDING_TIMEOUT = float(os.getenv("BATCH_STREAM_PENDING_TIMEOUT", "120"))
+        
+        # 大字段存储地址（与 Worker 的 BLOB_STORE_URL 保持一致），用于按需还原结果
+        self.BLOB_STORE_URL = os.getenv("BLOB_STORE_URL")
         
         # API 配置
         self.API_HOST = os.getenv("API_HOST", "0.0.0.0")
@@ -3,12 +3,21 @@
 
 负责将爬取任务分发到不同优先级的队列
 """
+import time
 import logging
-from typing import Optional, Dict, Any
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, Iterable, Iterator, List
+import redis
 from celery import Celery
 from celery.result import AsyncResult
 
 from .config import config
+from .rate_limiter import RateLimiter
+from .rate_policy import RatePolicy
+from astra_dataflow.storage.blob_store import (
+    BLOB_REFS_KEY, BlobStore, create_blob_store, get_blob, resolve_fields
+)
+from astra_dataflow.storage.batch_results import read_batch_results
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -55,18 +64,21 @@ def schedule_task(
         AsyncResult: Celery 任务结果对象
     """
     # 确定目标队列
-    queue_map = {
-        "high": config.QUEUE_HIGH,
-        "medium": config.QUEUE_MEDIUM,
-        "low": config.QUEUE_LOW,
-    }
+    queue = _resolve_queue(priority)
+    options = dict(options or {})
     
-    queue = queue_map.get(priority.lower(), config.QUEUE_MEDIUM)
+    # 调度时限流：预留域名的下一个许可，任务到点才投递给 Worker
+    countdown = None
+    if config.SCHEDULE_RATE_LIMIT_ENABLED:
+        countdown = _reserve_rate_limit(url, options)
+        if countdown is not None:
+            # Worker 执行时跳过限流等待
+            options["rate_limit_reserved"] = True
     
     # 构建任务参数
     task_kwargs = {
         "url": url,
-        "options": options or {},
+        "options": options,
         **kwargs
     }
     
@@ -76,16 +88,210 @@ def schedule_task(
         "astra_farm.workers.playwright_worker.crawl_page",
         kwargs=task_kwargs,
         queue=queue,
+        countdown=countdown or None,
     )
     
     logger.info(
         f"任务已调度: URL={url}, Priority={priority}, "
         f"Queue={queue}, TaskID={result.id}"
+        + (f", Countdown={countdown:.1f}s" if countdown else "")
     )
     
     return result
 
 
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def _get_rate_limiter() -> RateLimiter:
+    """获取调度时使用的限流器（首次使用时创建）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            config.CELERY_BROKER_URL,
+            algorithm=config.RATE_LIMIT_ALGORITHM,
+            burst=config.RATE_LIMIT_BURST or None,
+        )
+    return _rate_limiter
+
+
+def _reserve_rate_limit(url: str, options: Dict[str, Any]) -> Optional[float]:
+    """
+    为任务预留域名的下一个限流许可
+
+    限额优先级与 Worker 一致: options["rate_limit"] > 域名自适应限额 > RATE_LIMIT_PER_MINUTE
+
+    Returns:
+        投递前需要延迟的秒数；未能预留时返回 None（由 Worker 侧限流）
+    """
+    try:
+        if "rate_limit" in options:
+            limit = options["rate_limit"]
+        else:
+            limit = get_rate_limit(urlparse(url).netloc)["limit"]
+        return _get_rate_limiter().reserve(
+            url, limit=max(1, int(limit)), max_delay=config.SCHEDULE_RATE_LIMIT_MAX_DELAY
+        )
+    except Exception as e:
+        logger.warning(f"调度时限流失败，交由 Worker 限流: URL={url}, Error={str(e)}")
+        return None
+
+
+def _resolve_queue(priority: str) -> str:
+    """根据优先级返回目标队列"""
+    queue_map = {
+        "high": config.QUEUE_HIGH,
+        "medium": config.QUEUE_MEDIUM,
+        "low": config.QUEUE_LOW,
+    }
+    return queue_map.get(priority.lower(), config.QUEUE_MEDIUM)
+
+
+def schedule_batch(
+    urls: List[str],
+    priority: str = "medium",
+    options: Optional[Dict[str, Any]] = None,
+    **kwargs
+) -> AsyncResult:
+    """
+    调度批量爬取任务
+    
+    同一站点的多个 URL（如列表翻页与详情页）作为一个任务在同一个浏览器会话中完成，
+    节省逐个任务的消息、上下文与指纹注入开销。结果在每个 URL 完成后即可通过
+    get_batch_results / iter_batch_results 增量读取。
+    
+    Args:
+        urls: 目标 URL 列表，必须属于同一主机
+        priority: 任务优先级，可选值: "high", "medium", "low"
+        options: 额外选项，对批内所有 URL 生效；batch_concurrency 控制批内并发页面数
+        **kwargs: 其他参数传递给任务函数
+    
+    Returns:
+        AsyncResult: Celery 任务结果对象，任务 ID 即批量 ID
+    
+    Raises:
+        ValueError: URL 列表为空、超过上限或包含不同主机
+    """
+    urls = list(urls)
+    if not urls:
+        raise ValueError("URL 列表不能为空")
+    if len(urls) > config.BATCH_MAX_URLS:
+        raise ValueError(f"URL 数量超过上限: {len(urls)} > {config.BATCH_MAX_URLS}")
+    hosts = {urlparse(url).hostname for url in urls}
+    if len(hosts) != 1 or None in hosts:
+        raise ValueError(f"批量任务的 URL 必须属于同一主机: {sorted(h or '' for h in hosts)}")
+    
+    queue = _resolve_queue(priority)
+    task_kwargs = {
+        "urls": urls,
+        "options": options or {},
+        **kwargs
+    }
+    
+    result = celery_app.send_task(
+        "astra_farm.workers.playwright_worker.crawl_batch",
+        kwargs=task_kwargs,
+        queue=queue,
+    )
+    
+    logger.info(
+        f"批量任务已调度: Host={hosts.pop()}, URLs={len(urls)}, Priority={priority}, "
+        f"Queue={queue}, TaskID={result.id}"
+    )
+    
+    return result
+
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    """获取 Redis 客户端（首次使用时创建）"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(config.CELERY_BROKER_URL)
+    return _redis_client
+
+
+def get_batch_results(
+    batch_id: str,
+    offset: int = 0,
+    resolve: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    增量读取批量任务已完成的结果
+    
+    Args:
+        batch_id: 批量任务 ID
+        offset: 已读取的结果数，从该位置继续读取
+        resolve: 需要从存储中还原的字段列表
+    
+    Returns:
+        {"batch_id", "status", "progress", "results", "next_offset", "done"}
+    """
+    task = AsyncResult(batch_id, app=celery_app)
+    # 先读状态再读结果，保证 done 为真时结果已全部写入
+    done = task.ready()
+    results = read_batch_results(_get_redis(), batch_id, offset)
+    if done and not results and offset == 0 and isinstance(task.result, dict):
+        # 结果流已过期或未写入时，退回任务最终结果
+        results = task.result.get("results") or []
+    if resolve:
+        store = _get_blob_store()
+        results = [resolve_fields(r, store, resolve) for r in results]
+    
+    progress = task.info if task.status == "PROGRESS" and isinstance(task.info, dict) else None
+    return {
+        "batch_id": batch_id,
+        "status": task.status,
+        "progress": progress,
+        "results": results,
+        "next_offset": offset + len(results),
+        "done": done,
+    }
+
+
+def iter_batch_results(
+    batch_id: str,
+    poll_interval: float = 0.5,
+    timeout: Optional[float] = None,
+    resolve: Optional[Iterable[str]] = None,
+    pending_timeout: Optional[float] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    按完成顺序逐个产出批量任务的结果，直到整批完成
+    
+    Args:
+        batch_id: 批量任务 ID
+        poll_interval: 轮询间隔（秒）
+        timeout: 最长等待时间（秒），None 表示不限
+        resolve: 需要从存储中还原的字段列表
+        pending_timeout: 任务一直处于 PENDING 且没有任何结果的最长时间（秒），
+            未知或已过期的 ID 在 Celery 中始终为 PENDING；None 表示不限
+    
+    Raises:
+        KeyError: 超过 pending_timeout 仍为 PENDING（任务不存在、已过期或尚未开始执行）
+        TimeoutError: 超过 timeout 仍未完成
+    """
+    started = time.monotonic()
+    offset = 0
+    while True:
+        page = get_batch_results(batch_id, offset, resolve)
+        yield from page["results"]
+        offset = page["next_offset"]
+        if page["done"]:
+            return
+        elapsed = time.monotonic() - started
+        if (
+            pending_timeout is not None and elapsed > pending_timeout
+            and page["status"] == "PENDING" and offset == 0
+        ):
+            raise KeyError(batch_id)
+        if timeout is not None and elapsed > timeout:
+            raise TimeoutError(f"批量任务未在 {timeout}s 内完成: {batch_id}")
+        time.sleep(poll_interval)
+
+
 def get_task_status(task_id: str) -> Dict[str, Any]:
     """
     查询任务状态
@@ -106,12 +312,18 @@ def get_task_status(task_id: str) -> Dict[str, Any]:
     }
 
 
-def get_task_result(task_id: str) -> Optional[Dict[str, Any]]:
+def get_task_result(
+    task_id: str,
+    resolve: Optional[Iterable[str]] = None
+) -> Optional[Dict[str, Any]]:
     """
     获取任务结果
     
+    大字段默认以引用形式返回（见 blob_refs），需要时通过 resolve 指定字段还原
+    
     Args:
         task_id: 任务 ID
+        resolve: 需要从存储中还原的字段列表
     
     Returns:
         任务结果字典，如果任务未完成则返回 None
@@ -119,7 +331,100 @@ def get_task_result(task_id: str) -> Optional[Dict[str, Any]]:
     result = AsyncResult(task_id, app=celery_app)
     
     if result.ready():
+        if resolve:
+            return resolve_fields(result.result, _get_blob_store(), resolve)
         return result.result
     
     return None
 
+
+_blob_store: Optional[BlobStore] = None
+
+
+def _get_blob_store() -> Optional[BlobStore]:
+    """获取大字段存储实例（首次使用时创建）"""
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = create_blob_store(config.BLOB_STORE_URL)
+    return _blob_store
+
+
+def get_task_blob(task_id: str, field: str) -> Any:
+    """
+    读取任务结果中某个已转存字段的原始内容
+    
+    Args:
+        task_id: 任务 ID
+        field: 字段名（如 "html"）
+    
+    Returns:
+        字段原始值
+    
+    Raises:
+        KeyError: 任务未完成、字段未转存或存储未配置
+    """
+    result = get_task_result(task_id)
+    refs = (result or {}).get(BLOB_REFS_KEY) if isinstance(result, dict) else None
+    if not refs or field not in refs:
+        raise KeyError(field)
+    store = _get_blob_store()
+    if store is None:
+        raise KeyError("BLOB_STORE_URL 未配置")
+    return get_blob(store, refs[field])
+
+
+_rate_policy: Optional[RatePolicy] = None
+
+
+def _get_rate_policy() -> RatePolicy:
+    """获取域名限流策略存储（首次使用时创建）"""
+    global _rate_policy
+    if _rate_policy is None:
+        _rate_policy = RatePolicy(config.CELERY_BROKER_URL)
+    return _rate_policy
+
+
+def _effective_policy(policy: Dict[str, Any]) -> Dict[str, Any]:
+    """只配置了上下限、尚未收到回报的域名，按默认限额（夹在上下限内）展示"""
+    policy = dict(policy, adaptive=True)
+    if policy["limit"] is None:
+        limit = config.RATE_LIMIT_PER_MINUTE
+        if policy["min_limit"] is not None:
+            limit = max(limit, policy["min_limit"])
+        if policy["max_limit"] is not None:
+            limit = min(limit, policy["max_limit"])
+        policy["limit"] = limit
+    return policy
+
+
+def get_rate_limits() -> List[Dict[str, Any]]:
+    """返回所有已有自适应策略的域名及其当前限额"""
+    return [_effective_policy(p) for p in _get_rate_policy().list()]
+
+
+def get_rate_limit(domain: str) -> Dict[str, Any]:
+    """
+    返回域名当前生效的每分钟限额
+
+    尚无自适应策略的域名返回默认限额，adaptive 为 False
+    """
+    policy = _get_rate_policy().get(domain)
+    if policy is None:
+        return {"domain": domain, "limit": config.RATE_LIMIT_PER_MINUTE, "adaptive": False}
+    return _effective_policy(policy)
+
+
+def set_rate_limit(
+    domain: str,
+    min_limit: Optional[float] = None,
+    max_limit: Optional[float] = None,
+    limit: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    设置域名限额的下限 / 上限，或直接指定当前限额（之后仍按 AIMD 调整）
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    policy = _get_rate_policy().configure(domain, min_limit=min_limit, max_limit=max_limit, limit=limit)
+    return _effective_policy(policy)
@@ -4,28 +4,420 @@
 基于 Redis 的滑动窗口或令牌桶算法实现分布式限流
 """
 import time
+import uuid
+import random
+import asyncio
 import logging
+import threading
 import redis
+import redis.asyncio as aioredis
 from urllib.parse import urlparse
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 等待下一个许可时附加的随机抖动上限（秒），避免大量任务在同一时刻同时醒来
+_WAKEUP_JITTER = 0.05
+
+# 限流算法
+SLIDING_WINDOW = "sliding_window"
+GCRA = "gcra"
+ALGORITHMS = (SLIDING_WINDOW, GCRA)
+
+# 使用 Redis 服务器时间，避免各 Worker 时钟偏差（TIME 之后写入需开启命令复制）
+_LUA_NOW = """
+if redis.replicate_commands then
+    pcall(redis.replicate_commands)
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+"""
+
+# 滑动窗口检查与占用在服务端一次原子完成:
+# 清理窗口外记录 -> 未超限则写入本次请求（最多 n 个），超限则计算下一个许可可用的时间
+# member 为调用方生成的随机 ID 加序号，保证唯一且可按序号归还
+# KEYS: 限流 Key；ARGV: 窗口(秒), 上限, member 前缀, 申请数量 n
+# 返回 {获得数量, "等待秒数", 剩余额度}，获得数量为 0 表示限流（浮点数以字符串返回避免被截断）
+_SLIDING_WINDOW_SCRIPT = _LUA_NOW + """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local n = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local granted = math.min(n, limit - count)
+if granted > 0 then
+    for i = 0, granted - 1 do
+        redis.call('ZADD', KEYS[1], now, ARGV[3] .. ':' .. i)
+    end
+    -- 不缩短过期时间，避免丢失调度时预留的未来许可
+    if redis.call('TTL', KEYS[1]) < math.ceil(window) + 1 then
+        redis.call('EXPIRE', KEYS[1], math.ceil(window) + 1)
+    end
+    return {granted, '0', limit - count - granted}
+end
+-- 窗口内第 (count - limit + 1) 早的记录过期后才会空出一个许可
+local edge = redis.call('ZRANGE', KEYS[1], count - limit, count - limit, 'WITHSCORES')
+local retry_after = 0
+if edge[2] then
+    retry_after = tonumber(edge[2]) + window - now
+end
+return {0, string.format('%.6f', retry_after), 0}
+"""
+
+# GCRA（通用信元速率算法，等价于令牌桶）：每个域名只保存一个理论到达时间 TAT
+# 请求间隔 interval = 窗口 / 上限，允许最多 burst 个请求连续突发
+# KEYS: 限流 Key；ARGV: interval(秒), burst, 申请数量 n
+# 返回值格式与滑动窗口脚本一致
+_GCRA_SCRIPT = _LUA_NOW + """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local n = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+-- 当前可放行数量 g 满足 tat + g * interval - burst * interval <= now
+local available = math.floor((now - tat) / interval + burst + 1e-9)
+local granted = math.min(n, available)
+if granted < 1 then
+    return {0, string.format('%.6f', tat + interval - burst * interval - now), 0}
+end
+local new_tat = tat + granted * interval
+redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+return {granted, '0', available - granted}
+"""
+
+# 为调度中的任务预留一个未来许可（滑动窗口）
+# 预留时间不早于已有的最后一条记录，且保证其所在窗口内的记录数不超过上限
+# KEYS: 限流 Key；ARGV: 窗口(秒), 上限, member, 最长延迟(秒)
+# 返回 {是否已预留, "延迟秒数"}；延迟超过上限时不预留
+_SLIDING_WINDOW_RESERVE_SCRIPT = _LUA_NOW + """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local at = now
+if count > 0 then
+    local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+    at = math.max(at, tonumber(last[2]))
+end
+if count >= limit then
+    local edge = redis.call('ZRANGE', KEYS[1], count - limit, count - limit, 'WITHSCORES')
+    at = math.max(at, tonumber(edge[2]) + window)
+end
+local delay = at - now
+if delay > tonumber(ARGV[4]) then
+    return {0, string.format('%.6f', delay)}
+end
+redis.call('ZADD', KEYS[1], at, ARGV[3])
+local ttl = math.ceil(delay + window) + 1
+if redis.call('TTL', KEYS[1]) < ttl then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return {1, string.format('%.6f', delay)}
+"""
+
+# 为调度中的任务预留一个未来许可（GCRA）：TAT 前移一个间隔，许可在 TAT 对应的时间点可用
+# KEYS: 限流 Key；ARGV: interval(秒), burst, 最长延迟(秒)
+# 返回值格式与滑动窗口预留脚本一致
+_GCRA_RESERVE_SCRIPT = _LUA_NOW + """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local delay = math.max(0, tat + interval - burst * interval - now)
+if delay > tonumber(ARGV[3]) then
+    return {0, string.format('%.6f', delay)}
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+return {1, string.format('%.6f', delay)}
+"""
+
+# 归还 GCRA 未用完的许可：TAT 回退 unused 个间隔，回退到当前时间之前时直接删除
+# KEYS: 限流 Key；ARGV: interval(秒), unused
+_GCRA_REFUND_SCRIPT = _LUA_NOW + """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat then
+    return 0
+end
+local new_tat = tat - tonumber(ARGV[1]) * tonumber(ARGV[2])
+if new_tat <= now then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+return 1
+"""
+
+
+def _rate_limit_key(url: str, algorithm: str = SLIDING_WINDOW) -> str:
+    """根据 URL 域名生成限流 Key（两种算法的数据结构不同，Key 分开）"""
+    if algorithm == GCRA:
+        return f"rate_limit:gcra:{urlparse(url).netloc}"
+    return f"rate_limit:{urlparse(url).netloc}"
+
+
+def _script_call(
+    algorithm: str,
+    burst: Optional[int],
+    limit: int,
+    window: float,
+    count: int,
+    token: str
+) -> Tuple[str, list]:
+    """返回本次申请 count 个许可所用的 (脚本, args)"""
+    if algorithm == GCRA:
+        # 未指定突发容量时允许整窗口突发，与滑动窗口的容量一致
+        capacity = max(1, burst or limit)
+        return _GCRA_SCRIPT, [window / max(limit, 1), capacity, count]
+    return _SLIDING_WINDOW_SCRIPT, [window, limit, token, count]
+
+
+def _check_algorithm(algorithm: str) -> str:
+    algorithm = (algorithm or SLIDING_WINDOW).lower()
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"不支持的限流算法: {algorithm}，可选 {', '.join(ALGORITHMS)}")
+    return algorithm
+
+
+def _parse_script_result(result) -> Tuple[int, float, int]:
+    """解析限流脚本返回值为 (获得许可数, 等待秒数, 剩余额度)"""
+    granted, retry_after, headroom = result
+    if isinstance(retry_after, bytes):
+        retry_after = retry_after.decode()
+    return int(granted), max(float(retry_after), 0.0), int(headroom)
+
+
+def _parse_reserve_result(result) -> Tuple[bool, float]:
+    """解析预留脚本返回值为 (是否已预留, 延迟秒数)"""
+    reserved, delay = result
+    if isinstance(delay, bytes):
+        delay = delay.decode()
+    return bool(int(reserved)), max(float(delay), 0.0)
+
+
+class PermitBlock:
+    """从 Redis 一次申请到、在本地逐个消耗的一批许可"""
+
+    def __init__(self, token: str, granted: int, interval: float, expires_at: float):
+        self.token = token
+        self.granted = granted
+        # 单个许可对应的时间间隔（GCRA 归还时使用）
+        self.interval = interval
+        self.expires_at = expires_at
+        # 申请时已消耗一个
+        self.used = 1
+
+    @property
+    def unused(self) -> int:
+        return self.granted - self.used
+
+    def unused_members(self) -> List[str]:
+        """滑动窗口中未使用许可对应的 member"""
+        return [f"{self.token}:{i}" for i in range(self.used, self.granted)]
+
+
+class PermitLeases:
+    """
+    本地许可租约表
+
+    按限流 Key 缓存从 Redis 预取的许可，命中时无需访问 Redis。租约有效期内用完则
+    下次申请块大小翻倍，过期时按实际用量收缩；块大小不超过服务端剩余额度的一半，
+    接近上限时退化为逐个申请，保证全局限额准确。过期未用完的许可由调用方归还。
+    """
+
+    def __init__(self, max_block: int, ttl: float):
+        """
+        Args:
+            max_block: 单次最多预取的许可数
+            ttl: 租约有效期（秒），过期后剩余许可归还 Redis
+        """
+        self.max_block = max(1, max_block)
+        self.ttl = ttl
+        self._blocks: Dict[str, PermitBlock] = {}
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> Tuple[bool, Optional[PermitBlock]]:
+        """
+        尝试消耗一个本地许可
+
+        Returns:
+            (是否获得许可, 需要归还的过期租约)
+        """
+        now = time.monotonic()
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                return False, None
+            if block.expires_at > now and block.unused > 0:
+                block.used += 1
+                return True, None
+            del self._blocks[key]
+            if block.expires_at > now:
+                # 有效期内用完，需求大于块大小
+                size = self._sizes.get(key, 1) * 2
+            else:
+                size = block.used
+            self._sizes[key] = max(1, min(size, self.max_block))
+            return False, block if block.unused > 0 else None
+
+    def block_size(self, key: str) -> int:
+        """下一次向 Redis 申请的许可数"""
+        with self._lock:
+            return self._sizes.get(key, 1)
+
+    def store(self, key: str, token: str, granted: int, headroom: int, interval: float) -> Optional[PermitBlock]:
+        """
+        保存新申请到的租约（第一个许可已被调用方使用）
+
+        Returns:
+            被替换的旧租约（并发申请时可能出现），需要归还
+        """
+        with self._lock:
+            size = self._sizes.get(key, 1)
+            # 给其他 Worker 留出余量
+            self._sizes[key] = max(1, min(size, (headroom + granted) // 2))
+            old = self._blocks.get(key)
+            self._blocks[key] = PermitBlock(token, granted, interval, time.monotonic() + self.ttl)
+        return old if old is not None and old.unused > 0 else None
+
+    def drain(self) -> List[Tuple[str, PermitBlock]]:
+        """取出所有还有剩余许可的租约"""
+        with self._lock:
+            blocks = [(k, b) for k, b in self._blocks.items() if b.unused > 0]
+            self._blocks.clear()
+        return blocks
+
+
 class RateLimiter:
-    """基于 Redis 的分布式速率限制器"""
+    """
+    基于 Redis 的分布式速率限制器
+
+    支持两种算法：
+    - sliding_window: 精确滑动窗口，每个请求在有序集合中占一条记录
+    - gcra: 每个域名只保存一个时间戳，内存 O(1)，支持 burst 突发容量
+
+    lease_block > 1 时启用本地许可租约：一次向 Redis 申请一批许可在本地消耗，
+    高配额域名的大部分请求无需访问 Redis。滑动窗口下许可按申请时刻计入窗口，
+    租约有效期应远小于窗口。
+    """
     
-    def __init__(self, redis_url: str):
+    def __init__(
+        self,
+        redis_url: str,
+        algorithm: str = SLIDING_WINDOW,
+        burst: Optional[int] = None,
+        lease_block: int = 1,
+        lease_ttl: float = 1.0
+    ):
         """
         初始化限流器
         
         Args:
             redis_url: Redis 连接 URL
+            algorithm: 限流算法，sliding_window 或 gcra
+            burst: GCRA 允许的最大突发请求数，为空时等于窗口上限
+            lease_block: 单次最多预取的许可数，1 表示不启用本地租约
+            lease_ttl: 本地租约有效期（秒）
         """
+        self.algorithm = _check_algorithm(algorithm)
+        self.burst = burst
         self.redis = redis.from_url(redis_url)
+        self._scripts = {
+            script: self.redis.register_script(script)
+            for script in (
+                _SLIDING_WINDOW_SCRIPT, _GCRA_SCRIPT, _GCRA_REFUND_SCRIPT,
+                _SLIDING_WINDOW_RESERVE_SCRIPT, _GCRA_RESERVE_SCRIPT,
+            )
+        }
+        self._leases = PermitLeases(lease_block, lease_ttl) if lease_block > 1 else None
+
+    def reserve(
+        self,
+        url: str,
+        limit: int = 60,
+        window: int = 60,
+        max_delay: float = 300
+    ) -> Optional[float]:
+        """
+        为稍后执行的任务预留一个许可（调度中心使用）
+
+        与 try_acquire 共用同一份限流数据；预留的许可计入窗口，执行时无需再次申请
+
+        Args:
+            url: 请求 URL (将自动提取域名作为 Key)
+            limit: 时间窗口内的最大请求数
+            window: 时间窗口大小 (秒)
+            max_delay: 最长可接受的延迟（秒），超出时不预留
+
+        Returns:
+            Optional[float]: 许可可用前需要等待的秒数（0 表示立即可用）；
+            超过 max_delay 或 Redis 不可用时返回 None，由 Worker 侧限流兜底
+        """
+        key = _rate_limit_key(url, self.algorithm)
+        try:
+            if self.algorithm == GCRA:
+                script = _GCRA_RESERVE_SCRIPT
+                args = [window / max(limit, 1), max(1, self.burst or limit), max_delay]
+            else:
+                script = _SLIDING_WINDOW_RESERVE_SCRIPT
+                args = [window, limit, uuid.uuid4().hex, max_delay]
+            reserved, delay = _parse_reserve_result(self._scripts[script](keys=[key], args=args))
+        except Exception as e:
+            logger.error(f"预留限流许可失败: {str(e)}")
+            return None
+        if not reserved:
+            logger.debug(f"限流预留延迟 {delay:.1f}s 超过上限 {max_delay}s: {urlparse(url).netloc}")
+            return None
+        return delay
+
+    def try_acquire(self, url: str, limit: int = 60, window: int = 60) -> float:
+        """
+        尝试获取一个许可 (一次往返原子完成)
+
+        Args:
+            url: 请求 URL (将自动提取域名作为 Key)
+            limit: 时间窗口内的最大请求数
+            window: 时间窗口大小 (秒)
+
+        Returns:
+            float: 0 表示已获取许可；大于 0 表示距离下一个许可可用的秒数
+        """
+        key = _rate_limit_key(url, self.algorithm)
+        count = 1
+        if self._leases is not None:
+            taken, expired = self._leases.take(key)
+            if taken:
+                return 0.0
+            if expired is not None:
+                self._refund(key, expired)
+            count = self._leases.block_size(key)
+        try:
+            token = uuid.uuid4().hex
+            script, args = _script_call(self.algorithm, self.burst, limit, window, count, token)
+            granted, retry_after, headroom = _parse_script_result(self._scripts[script](keys=[key], args=args))
+            if granted:
+                if self._leases is not None:
+                    replaced = self._leases.store(key, token, granted, headroom, window / max(limit, 1))
+                    if replaced is not None:
+                        self._refund(key, replaced)
+                return 0.0
+            logger.warning(
+                f"触发限流: {urlparse(url).netloc} (限制: {limit}/{window}s), {retry_after:.3f}s 后可用"
+            )
+            return max(retry_after, 0.001)
+        except Exception as e:
+            logger.error(f"限流检查失败: {str(e)}")
+            # 故障开放原则：如果 Redis 挂了，默认允许请求，避免阻塞业务
+            return 0.0
         
     def is_allowed(self, url: str, limit: int = 60, window: int = 60) -> bool:
         """
-        检查是否允许请求 (滑动窗口算法)
+        检查是否允许请求
         
         Args:
             url: 请求 URL (将自动提取域名作为 Key)
@@ -35,47 +427,161 @@ class RateLimiter:
         Returns:
             bool: True 表示允许，False 表示限流
         """
+        return self.try_acquire(url, limit, window) == 0.0
+
+    def wait_if_needed(self, url: str, limit: int = 60, window: int = 60):
+        """
+        如果限流则阻塞等待到下一个许可可用
+        """
+        while True:
+            retry_after = self.try_acquire(url, limit, window)
+            if retry_after <= 0:
+                return
+            time.sleep(retry_after + random.uniform(0, _WAKEUP_JITTER))
+
+    def _refund(self, key: str, block: PermitBlock):
+        """归还租约中未使用的许可"""
         try:
-            domain = urlparse(url).netloc
-            key = f"rate_limit:{domain}"
-            now = time.time()
-            
-            pipeline = self.redis.pipeline()
-            
-            # 1. 移除窗口外的旧记录
-            pipeline.zremrangebyscore(key, 0, now - window)
-            
-            # 2. 获取当前窗口内的请求数
-            pipeline.zcard(key)
-            
-            # 3. 添加当前请求记录 (score=timestamp, member=timestamp)
-            # 使用微秒级时间戳作为 member 以避免重复
-            pipeline.zadd(key, {str(now): now})
-            
-            # 4. 设置过期时间 (窗口大小 + 1秒)
-            pipeline.expire(key, window + 1)
-            
-            results = pipeline.execute()
-            current_count = results[1]
-            
-            if current_count < limit:
-                return True
+            if self.algorithm == GCRA:
+                self._scripts[_GCRA_REFUND_SCRIPT](keys=[key], args=[block.interval, block.unused])
             else:
-                # 如果超限，需要移除刚才添加的记录（回滚）
-                self.redis.zrem(key, str(now))
-                logger.warning(f"触发限流: {domain} (当前: {current_count}, 限制: {limit}/{window}s)")
-                return False
-                
+                self.redis.zrem(key, *block.unused_members())
+        except Exception as e:
+            logger.warning(f"归还限流许可失败: {e}")
+
+    def close(self):
+        """归还本地剩余许可并关闭 Redis 连接"""
+        if self._leases is not None:
+            for key, block in self._leases.drain():
+                self._refund(key, block)
+        self.redis.close()
+
+
+class AsyncRateLimiter:
+    """
+    基于 redis.asyncio 的异步分布式速率限制器
+
+    与 RateLimiter 共用同一套 Lua 脚本与 Redis 数据结构；被限流时脚本同时返回
+    下一个许可可用的精确时间，据此 await，不会阻塞事件循环上的其他任务。
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        algorithm: str = SLIDING_WINDOW,
+        burst: Optional[int] = None,
+        lease_block: int = 1,
+        lease_ttl: float = 1.0
+    ):
+        """
+        初始化限流器
+
+        Args:
+            redis_url: Redis 连接 URL
+            algorithm: 限流算法，sliding_window 或 gcra
+            burst: GCRA 允许的最大突发请求数，为空时等于窗口上限
+            lease_block: 单次最多预取的许可数，1 表示不启用本地租约
+            lease_ttl: 本地租约有效期（秒）
+        """
+        self.algorithm = _check_algorithm(algorithm)
+        self.burst = burst
+        self.redis = aioredis.from_url(redis_url)
+        self._scripts = {
+            script: self.redis.register_script(script)
+            for script in (_SLIDING_WINDOW_SCRIPT, _GCRA_SCRIPT, _GCRA_REFUND_SCRIPT)
+        }
+        self._leases = PermitLeases(lease_block, lease_ttl) if lease_block > 1 else None
+
+    async def try_acquire(self, url: str, limit: int = 60, window: int = 60) -> float:
+        """
+        尝试获取一个许可
+
+        Args:
+            url: 请求 URL (将自动提取域名作为 Key)
+            limit: 时间窗口内的最大请求数
+            window: 时间窗口大小 (秒)
+
+        Returns:
+            float: 0 表示已获取许可；大于 0 表示距离下一个许可可用的秒数
+        """
+        key = _rate_limit_key(url, self.algorithm)
+        count = 1
+        if self._leases is not None:
+            taken, expired = self._leases.take(key)
+            if taken:
+                return 0.0
+            if expired is not None:
+                await self._refund(key, expired)
+            count = self._leases.block_size(key)
+        try:
+            token = uuid.uuid4().hex
+            script, args = _script_call(self.algorithm, self.burst, limit, window, count, token)
+            granted, retry_after, headroom = _parse_script_result(
+                await self._scripts[script](keys=[key], args=args)
+            )
+            if granted:
+                if self._leases is not None:
+                    replaced = self._leases.store(key, token, granted, headroom, window / max(limit, 1))
+                    if replaced is not None:
+                        await self._refund(key, replaced)
+                return 0.0
+            logger.debug(
+                f"触发限流: {urlparse(url).netloc} (限制: {limit}/{window}s), {retry_after:.3f}s 后可用"
+            )
+            return max(retry_after, 0.001)
+
         except Exception as e:
             logger.error(f"限流检查失败: {str(e)}")
             # 故障开放原则：如果 Redis 挂了，默认允许请求，避免阻塞业务
-            return True
+            return 0.0
 
-    def wait_if_needed(self, url: str, limit: int = 60, window: int = 60):
+    async def is_allowed(self, url: str, limit: int = 60, window: int = 60) -> bool:
+        """
+        检查是否允许请求
+
+        Returns:
+            bool: True 表示允许，False 表示限流
+        """
+        return await self.try_acquire(url, limit, window) == 0.0
+
+    async def wait_if_needed(
+        self,
+        url: str,
+        limit: int = 60,
+        window: int = 60,
+        max_wait: Optional[float] = None
+    ) -> float:
         """
-        如果限流则阻塞等待
+        如果限流则异步等待到下一个许可可用
+
+        Args:
+            max_wait: 最长等待时间（秒），超出后抛出 TimeoutError；None 表示不限
+
+        Returns:
+            float: 实际等待的秒数
         """
-        while not self.is_allowed(url, limit, window):
-            time.sleep(1)
+        started = time.monotonic()
+        while True:
+            retry_after = await self.try_acquire(url, limit, window)
+            if retry_after <= 0:
+                return time.monotonic() - started
+            if max_wait is not None and time.monotonic() - started + retry_after > max_wait:
+                raise TimeoutError(f"等待限流许可超时: {urlparse(url).netloc}")
+            await asyncio.sleep(retry_after + random.uniform(0, _WAKEUP_JITTER))
 
+    async def _refund(self, key: str, block: PermitBlock):
+        """归还租约中未使用的许可"""
+        try:
+            if self.algorithm == GCRA:
+                await self._scripts[_GCRA_REFUND_SCRIPT](keys=[key], args=[block.interval, block.unused])
+            else:
+                await self.redis.zrem(key, *block.unused_members())
+        except Exception as e:
+            logger.warning(f"归还限流许可失败: {e}")
 
+    async def close(self):
+        """归还本地剩余许可并关闭 Redis 连接"""
+        if self._leases is not None:
+            for key, block in self._leases.drain():
+                await self._refund(key, block)
+        await self.redis.aclose()
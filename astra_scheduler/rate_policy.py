@@ -0,0 +1,356 @@
+"""
+按域名自适应限流策略
+
+Worker 回报每次爬取的结果（限流状态码、挑战页、延迟），策略在 Redis 中按 AIMD
+调整每个域名的每分钟限额：正常响应时加性增长，出现 429/503、挑战页或延迟显著上升时
+乘性下降，始终保持在下限与上限之间。所有 Worker 共享同一份策略，调度中心 API 读取
+当前生效的限额。
+"""
+import time
+import logging
+import redis
+import redis.asyncio as aioredis
+from urllib.parse import urlparse
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 视为被限流的响应状态码
+THROTTLE_STATUS_CODES = frozenset({429, 503})
+
+# 回报结果类型
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_CHALLENGE = "challenge"
+OUTCOME_ERROR = "error"
+OUTCOMES = (OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_CHALLENGE, OUTCOME_ERROR)
+
+POLICY_KEY = "rate_policy:{domain}"
+DOMAINS_KEY = "rate_policy:domains"
+
+# 长期没有回报的域名策略自动过期（秒）
+POLICY_TTL = 7 * 24 * 3600
+
+# 回报一次结果并调整限额（原子执行）
+# KEYS: 策略 Key, 域名集合
+# ARGV: 域名, 结果类型, 延迟(毫秒，可为空), 初始限额, 下限, 上限, 加性步长, 乘性系数,
+#       延迟上升倍数, 延迟 EWMA 系数, 两次下调最小间隔(秒), 过期时间(秒)
+# 返回当前限额（字符串，避免小数被截断）
+_RECORD_SCRIPT = """
+if redis.replicate_commands then
+    pcall(redis.replicate_commands)
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local h = redis.call(
+    'HMGET', KEYS[1], 'limit', 'min_limit', 'max_limit', 'latency_ms', 'baseline_ms',
+    'last_decrease', 'samples'
+)
+local floor = tonumber(h[2]) or tonumber(ARGV[5])
+local ceiling = tonumber(h[3]) or tonumber(ARGV[6])
+local limit = tonumber(h[1]) or tonumber(ARGV[4])
+local latency = tonumber(h[4])
+local baseline = tonumber(h[5])
+local last_decrease = tonumber(h[6]) or 0
+local samples = (tonumber(h[7]) or 0) + 1
+local outcome = ARGV[2]
+local sample = tonumber(ARGV[3])
+local alpha = tonumber(ARGV[10])
+
+local slow = false
+if sample then
+    if latency then
+        latency = latency + alpha * (sample - latency)
+    else
+        latency = sample
+    end
+    -- 基线取较低的慢速均值，延迟上升时缓慢跟随
+    if not baseline or latency < baseline then
+        baseline = latency
+    else
+        baseline = baseline + alpha / 10 * (latency - baseline)
+    end
+    slow = samples >= 10 and latency > baseline * tonumber(ARGV[9])
+end
+
+local congested = outcome == 'throttled' or outcome == 'challenge' or slow
+if congested then
+    -- 已分配出去的请求会集中失败，同一间隔内只下调一次
+    if now - last_decrease >= tonumber(ARGV[11]) then
+        limit = limit * tonumber(ARGV[8])
+        last_decrease = now
+    end
+elseif outcome == 'ok' then
+    -- 满负荷运行一个窗口（limit 次成功）增加一个步长
+    limit = limit + tonumber(ARGV[7]) / math.max(limit, 1)
+end
+limit = math.max(floor, math.min(ceiling, limit))
+
+local fields = {'limit', string.format('%.4f', limit), 'last_decrease', last_decrease, 'samples', samples, 'updated_at', now}
+if latency then
+    table.insert(fields, 'latency_ms')
+    table.insert(fields, string.format('%.1f', latency))
+    table.insert(fields, 'baseline_ms')
+    table.insert(fields, string.format('%.1f', baseline))
+end
+redis.call('HSET', KEYS[1], unpack(fields))
+if outcome ~= 'ok' then
+    redis.call('HINCRBY', KEYS[1], outcome, 1)
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[12]))
+redis.call('SADD', KEYS[2], ARGV[1])
+return string.format('%.4f', limit)
+"""
+
+
+def domain_of(url: str) -> str:
+    """URL 对应的策略域名（与限流 Key 一致，使用 netloc）"""
+    return urlparse(url).netloc if "://" in url else url
+
+
+def classify_outcome(
+    status_code: Optional[int],
+    challenge: bool = False,
+    error: bool = False
+) -> str:
+    """根据响应状态码 / 挑战页检测 / 网络错误得到回报结果类型"""
+    if error:
+        return OUTCOME_ERROR
+    if status_code in THROTTLE_STATUS_CODES:
+        return OUTCOME_THROTTLED
+    if challenge:
+        return OUTCOME_CHALLENGE
+    return OUTCOME_OK
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _describe(domain: str, raw: Dict[Any, Any]) -> Dict[str, Any]:
+    """把策略 Hash 转为 API 返回格式"""
+    data = {_decode(k): _decode(v) for k, v in raw.items()}
+
+    def _num(name: str, cast=float) -> Optional[Any]:
+        value = data.get(name)
+        return cast(float(value)) if value not in (None, "") else None
+
+    limit = _num("limit")
+    return {
+        "domain": domain,
+        "limit": round(limit, 2) if limit is not None else None,
+        "min_limit": _num("min_limit"),
+        "max_limit": _num("max_limit"),
+        "latency_ms": _num("latency_ms"),
+        "baseline_ms": _num("baseline_ms"),
+        "samples": _num("samples", int) or 0,
+        "throttled": _num(OUTCOME_THROTTLED, int) or 0,
+        "challenge": _num(OUTCOME_CHALLENGE, int) or 0,
+        "error": _num(OUTCOME_ERROR, int) or 0,
+        "updated_at": _num("updated_at"),
+    }
+
+
+class RatePolicy:
+    """
+    域名限流策略的查询与配置（调度中心 API 使用）
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis = redis.from_url(redis_url)
+
+    def get(self, domain: str) -> Optional[Dict[str, Any]]:
+        """返回域名当前策略，尚无策略时返回 None"""
+        raw = self.redis.hgetall(POLICY_KEY.format(domain=domain))
+        return _describe(domain, raw) if raw else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """返回所有域名的策略（按域名排序），顺带清理已过期的域名"""
+        domains = sorted(_decode(d) for d in self.redis.smembers(DOMAINS_KEY))
+        if not domains:
+            return []
+        pipeline = self.redis.pipeline()
+        for domain in domains:
+            pipeline.hgetall(POLICY_KEY.format(domain=domain))
+        policies, expired = [], []
+        for domain, raw in zip(domains, pipeline.execute()):
+            if raw:
+                policies.append(_describe(domain, raw))
+            else:
+                expired.append(domain)
+        if expired:
+            self.redis.srem(DOMAINS_KEY, *expired)
+        return policies
+
+    def configure(
+        self,
+        domain: str,
+        min_limit: Optional[float] = None,
+        max_limit: Optional[float] = None,
+        limit: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        设置域名的限额下限 / 上限，或直接指定当前限额
+
+        未指定的上下限沿用已保存的值；当前限额（直接指定的或已保存的）写入时夹在上下限内
+
+        Raises:
+            ValueError: 下限大于上限（含与已保存的上下限比较）或数值非正
+        """
+        for value in (min_limit, max_limit, limit):
+            if value is not None and value <= 0:
+                raise ValueError("限额必须大于 0")
+        if min_limit is None and max_limit is None and limit is None:
+            return self.get(domain)
+
+        key = POLICY_KEY.format(domain=domain)
+
+        def _apply(pipe):
+            # 与已保存的上下限合并后校验，并把限额夹在上下限内写入
+            stored = [_decode(v) for v in pipe.hmget(key, "min_limit", "max_limit", "limit")]
+            floor = min_limit if min_limit is not None else (float(stored[0]) if stored[0] else None)
+            ceiling = max_limit if max_limit is not None else (float(stored[1]) if stored[1] else None)
+            if floor is not None and ceiling is not None and floor > ceiling:
+                raise ValueError("min_limit 不能大于 max_limit")
+            fields = {
+                name: value for name, value in (("min_limit", min_limit), ("max_limit", max_limit))
+                if value is not None
+            }
+            current = limit if limit is not None else (float(stored[2]) if stored[2] else None)
+            if current is not None:
+                clamped = current
+                if floor is not None:
+                    clamped = max(clamped, floor)
+                if ceiling is not None:
+                    clamped = min(clamped, ceiling)
+                if limit is not None or clamped != current:
+                    fields["limit"] = clamped
+            fields["updated_at"] = time.time()
+            pipe.multi()
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, POLICY_TTL)
+            pipe.sadd(DOMAINS_KEY, domain)
+
+        self.redis.transaction(_apply, key)
+        return self.get(domain)
+
+    def close(self):
+        self.redis.close()
+
+
+class AsyncRatePolicy:
+    """
+    Worker 侧的自适应限流策略
+
+    每次爬取后回报结果调整限额；读取限额时使用进程内缓存，避免每个请求多一次 Redis 往返
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        min_limit: float = 6,
+        max_limit: float = 600,
+        increase: float = 5,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0,
+        latency_alpha: float = 0.2,
+        decrease_interval: float = 10.0,
+        cache_ttl: float = 5.0
+    ):
+        """
+        Args:
+            redis_url: Redis 连接 URL
+            min_limit: 默认限额下限（每分钟），可按域名覆盖
+            max_limit: 默认限额上限（每分钟），可按域名覆盖
+            increase: 加性步长，满负荷运行一个窗口后增加的限额
+            decrease: 乘性系数，被限流 / 挑战 / 延迟上升时限额乘以该值
+            latency_factor: 延迟 EWMA 超过基线的倍数视为拥塞
+            latency_alpha: 延迟 EWMA 平滑系数
+            decrease_interval: 两次下调之间的最小间隔（秒）
+            cache_ttl: 本地限额缓存时间（秒）
+        """
+        if min_limit > max_limit:
+            raise ValueError("min_limit 不能大于 max_limit")
+        self.redis = aioredis.from_url(redis_url)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_alpha = latency_alpha
+        self.decrease_interval = decrease_interval
+        self.cache_ttl = cache_ttl
+        self._record = self.redis.register_script(_RECORD_SCRIPT)
+        # 域名 -> (限额, 缓存截止时间)
+        self._cache: Dict[str, Tuple[Optional[float], float]] = {}
+
+    async def limit_for(self, url: str, default: float) -> float:
+        """
+        返回域名当前生效的每分钟限额
+
+        Args:
+            url: 请求 URL 或域名
+            default: 尚无策略时使用的限额（也是新域名的初始限额）
+        """
+        domain = domain_of(url)
+        now = time.monotonic()
+        cached = self._cache.get(domain)
+        if cached is not None and cached[1] > now:
+            return cached[0] if cached[0] is not None else default
+        try:
+            values = await self.redis.hmget(POLICY_KEY.format(domain=domain), "limit", "min_limit", "max_limit")
+            limit, floor, ceiling = (float(_decode(v)) if v is not None else None for v in values)
+            if limit is None and (floor is not None or ceiling is not None):
+                # 只配置了上下限的域名，默认限额夹在上下限内（与调度中心展示一致）
+                limit = default
+                if floor is not None:
+                    limit = max(limit, floor)
+                if ceiling is not None:
+                    limit = min(limit, ceiling)
+        except Exception as e:
+            logger.warning(f"读取域名限流策略失败: {domain}, {e}")
+            limit = cached[0] if cached is not None else None
+        self._cache[domain] = (limit, now + self.cache_ttl)
+        return limit if limit is not None else default
+
+    async def record(
+        self,
+        url: str,
+        outcome: str,
+        latency_ms: Optional[float] = None,
+        initial: float = 60
+    ) -> Optional[float]:
+        """
+        回报一次爬取结果并返回调整后的限额
+
+        Args:
+            url: 请求 URL 或域名
+            outcome: 结果类型，见 OUTCOMES
+            latency_ms: 页面 / HTTP 请求耗时（毫秒）
+            initial: 新域名的初始限额
+        """
+        if outcome not in OUTCOMES:
+            raise ValueError(f"未知的结果类型: {outcome}")
+        domain = domain_of(url)
+        try:
+            value = await self._record(
+                keys=[POLICY_KEY.format(domain=domain), DOMAINS_KEY],
+                args=[
+                    domain, outcome, "" if latency_ms is None else latency_ms, initial,
+                    self.min_limit, self.max_limit, self.increase, self.decrease,
+                    self.latency_factor, self.latency_alpha, self.decrease_interval, POLICY_TTL,
+                ],
+            )
+        except Exception as e:
+            logger.warning(f"回报域名限流策略失败: {domain}, {e}")
+            return None
+        limit = float(_decode(value))
+        cached = self._cache.get(domain)
+        if cached is not None and cached[0] is not None and limit < cached[0]:
+            logger.info(f"域名限额下调: {domain} {cached[0]:.1f} -> {limit:.1f}/min ({outcome})")
+        self._cache[domain] = (limit, time.monotonic() + self.cache_ttl)
+        return limit
+
+    async def close(self):
+        """关闭 Redis 连接"""
+        await self.redis.aclose()
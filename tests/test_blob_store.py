@@ -0,0 +1,76 @@
+"""
+大字段存储测试
+"""
+import pytest
+
+from astra_dataflow.storage.blob_store import (
+    BLOB_REFS_KEY,
+    BlobStore,
+    LocalBlobStore,
+    create_blob_store,
+    get_blob,
+    offload_fields,
+    put_blob,
+    resolve_fields,
+)
+
+
+def test_put_get_roundtrip(tmp_path):
+    """写入后读取内容一致，且相同内容只存一份"""
+    store = LocalBlobStore(str(tmp_path))
+    html = "<html>" + "测试" * 1000 + "</html>"
+    ref = put_blob(store, html)
+    assert ref["size"] == len(html.encode("utf-8"))
+    assert ref["stored_size"] < ref["size"]
+    assert get_blob(store, ref) == html
+    assert put_blob(store, html)["key"] == ref["key"]
+
+    data = {"items": [1, 2, 3]}
+    assert get_blob(store, put_blob(store, data)) == data
+
+
+def test_get_blob_verifies_hash(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    ref = put_blob(store, "hello")
+    ref = dict(ref, sha256="0" * 64)
+    with pytest.raises(ValueError):
+        get_blob(store, ref)
+
+
+def test_offload_and_resolve(tmp_path):
+    """超过阈值的字段被替换为引用，按需还原"""
+    store = LocalBlobStore(str(tmp_path))
+    html = "x" * 2000
+    result = {"url": "https://example.com", "html": html, "title": "t"}
+
+    offload_fields(result, store, fields=("html", "title"), threshold=1000)
+    assert result["html"] is None
+    assert result["title"] == "t"
+    assert set(result[BLOB_REFS_KEY]) == {"html"}
+
+    resolved = resolve_fields(result, store, ["html"])
+    assert resolved["html"] == html
+    assert BLOB_REFS_KEY not in resolved
+    # 原结果不被修改
+    assert result["html"] is None
+
+
+def test_offload_without_store_is_noop():
+    result = {"html": "x" * 10}
+    assert offload_fields(result, None, threshold=1) == {"html": "x" * 10}
+
+
+def test_create_blob_store(tmp_path):
+    assert create_blob_store(None) is None
+    assert isinstance(create_blob_store(f"file://{tmp_path}"), LocalBlobStore)
+    with pytest.raises(ValueError):
+        create_blob_store("ftp://example.com/blobs")
+
+
+def test_incomplete_backend_fails_at_construction():
+    class PutOnlyStore(BlobStore):
+        def put(self, key, data):
+            pass
+
+    with pytest.raises(TypeError):
+        PutOnlyStore()
@@ -0,0 +1,194 @@
+"""
+浏览器监管器测试
+"""
+import asyncio
+import pytest
+from astra_farm.workers.browser_supervisor import BrowserPool, BrowserSupervisor
+
+
+class FakeBrowser:
+    """最小化的 Browser 替身"""
+
+    def __init__(self):
+        self.connected = True
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def is_connected(self):
+        return self.connected
+
+    async def close(self):
+        self.connected = False
+
+    def crash(self):
+        self.connected = False
+        self.handlers["disconnected"](self)
+
+
+async def _launcher():
+    return FakeBrowser()
+
+
+async def _switched(supervisor, old):
+    """等待后台回收切换到新实例"""
+    for _ in range(20):
+        if supervisor.current is not old:
+            return
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_recycle_after_max_pages():
+    """测试达到页面数上限后切换新实例，旧实例排空后关闭"""
+    supervisor = BrowserSupervisor(_launcher, max_pages=2)
+    await supervisor.start()
+
+    first = await supervisor.acquire()
+    second = await supervisor.acquire()
+    supervisor.release(first)
+    supervisor.release(second)
+    await supervisor._recycle_task
+
+    assert supervisor.current is not first
+    assert supervisor.current.generation == 2
+    assert not first.browser.is_connected()
+    assert supervisor.recycle_reasons == {"pages": 1}
+    await supervisor.close()
+
+
+@pytest.mark.asyncio
+async def test_old_browser_drains_before_close():
+    """测试回收时旧实例上的进行中页面不受影响"""
+    supervisor = BrowserSupervisor(_launcher, drain_timeout=5)
+    await supervisor.start()
+
+    busy = await supervisor.acquire()
+    supervisor.request_recycle("manual")
+    await _switched(supervisor, busy)
+
+    assert supervisor.current is not busy
+    assert busy.browser.is_connected()
+
+    supervisor.release(busy)
+    await supervisor._recycle_task
+    assert not busy.browser.is_connected()
+    await supervisor.close()
+
+
+@pytest.mark.asyncio
+async def test_crash_relaunch():
+    """测试浏览器崩溃后自动重启，新任务获取到新实例"""
+    supervisor = BrowserSupervisor(_launcher)
+    await supervisor.start()
+    first = supervisor.current
+
+    first.browser.crash()
+    slot = await supervisor.acquire()
+
+    assert slot is not first
+    assert slot.browser.is_connected()
+    assert supervisor.stats()["recycle_reasons"] == {"crash": 1}
+    supervisor.release(slot)
+    await supervisor.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_release_counts_pages():
+    """测试批量任务一次占用处理多个页面时按页面数计数"""
+    supervisor = BrowserSupervisor(_launcher, max_pages=5)
+    await supervisor.start()
+
+    slot = await supervisor.acquire()
+    supervisor.release(slot, pages=5)
+    await supervisor._recycle_task
+
+    assert slot.pages_served == 5
+    assert supervisor.recycle_reasons == {"pages": 1}
+    await supervisor.close()
+
+
+@pytest.mark.asyncio
+async def test_close_during_drain_closes_old_browser():
+    """测试旧实例排空期间关闭监管器，旧实例与新实例都被关闭"""
+    supervisor = BrowserSupervisor(_launcher, drain_timeout=60)
+    await supervisor.start()
+
+    busy = await supervisor.acquire()
+    supervisor.request_recycle("manual")
+    await _switched(supervisor, busy)
+    new = supervisor.current
+    assert new is not busy
+
+    await supervisor.close()
+    assert not busy.browser.is_connected()
+    assert not new.browser.is_connected()
+
+
+@pytest.mark.asyncio
+async def test_close_during_launch_closes_new_browser():
+    """测试新实例启动期间关闭监管器，启动完成的实例随后被关闭"""
+    launched = []
+    gate = asyncio.Event()
+
+    async def slow_launcher():
+        if launched:
+            await gate.wait()
+        browser = FakeBrowser()
+        launched.append(browser)
+        return browser
+
+    supervisor = BrowserSupervisor(slow_launcher)
+    await supervisor.start()
+    supervisor.request_recycle("manual")
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    closing = asyncio.create_task(supervisor.close())
+    await asyncio.sleep(0)
+    gate.set()
+    await closing
+    assert len(launched) == 2
+    assert not any(browser.is_connected() for browser in launched)
+
+
+@pytest.mark.asyncio
+async def test_pool_places_on_least_loaded_browser():
+    """测试新任务分配到打开页面最少的浏览器"""
+    pool = BrowserPool(2, launcher=_launcher)
+    await pool.start()
+
+    first = await pool.acquire()
+    first.open_pages = 3
+    second = await pool.acquire()
+    assert second.owner is not first.owner
+
+    second.open_pages = 5
+    third = await pool.acquire()
+    assert third is first
+
+    for slot in (first, second, third):
+        pool.release(slot)
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_isolates_crashed_browser():
+    """测试单个浏览器崩溃不影响其他浏览器上的任务"""
+    pool = BrowserPool(2, launcher=_launcher)
+    await pool.start()
+
+    crashed, healthy = pool.supervisors
+    busy = await healthy.acquire()
+    crashed.current.browser.crash()
+
+    slot = await pool.acquire()
+    assert slot.owner is healthy
+    assert healthy.current is busy
+    assert crashed.recycle_reasons == {"crash": 1}
+    assert healthy.recycle_count == 0
+
+    pool.release(slot)
+    pool.release(busy)
+    await pool.close()
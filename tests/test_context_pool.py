@@ -0,0 +1,96 @@
+"""
+上下文池测试
+"""
+import pytest
+from astra_farm.workers.context_pool import ContextPool, make_context_key
+
+
+class FakeContext:
+    """最小化的 BrowserContext 替身"""
+
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+        self.cookies_cleared = 0
+
+    async def new_page(self):
+        raise AssertionError("重置时不应创建页面")
+
+    async def clear_cookies(self):
+        self.cookies_cleared += 1
+
+    async def clear_permissions(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+def test_make_context_key():
+    """测试上下文 Key 生成"""
+    proxy = {"server": "http://1.2.3.4:8080", "username": "u", "password": "p"}
+    assert make_context_key(proxy, "win-high", "UA") == ("u@http://1.2.3.4:8080", "win-high", "UA", "")
+    assert make_context_key(None, None, None, "abc") == ("", "", "", "abc")
+
+
+@pytest.mark.asyncio
+async def test_context_reused_and_reset():
+    """测试上下文归还后被复用，并清空 Cookie"""
+    pool = ContextPool(max_idle_per_key=1, max_uses=10)
+    key = make_context_key(None, "win-high", "UA")
+    created = []
+
+    async def factory():
+        ctx = FakeContext()
+        created.append(ctx)
+        return ctx
+
+    lease = await pool.acquire(key, factory)
+    await pool.release(lease)
+    lease2 = await pool.acquire(key, factory)
+
+    assert lease2.context is lease.context
+    assert len(created) == 1
+    assert lease.context.cookies_cleared == 1
+    assert pool.stats["reused"] == 1
+
+
+@pytest.mark.asyncio
+async def test_context_retired_on_error_and_max_uses():
+    """测试出错或达到使用上限时淘汰上下文"""
+    pool = ContextPool(max_idle_per_key=2, max_uses=2)
+    key = make_context_key(None, "mac-m1", "UA")
+
+    async def factory():
+        return FakeContext()
+
+    lease = await pool.acquire(key, factory)
+    await pool.release(lease, discard=True)
+    assert lease.context.closed
+    assert pool.idle_count() == 0
+
+    lease = await pool.acquire(key, factory)
+    await pool.release(lease)
+    lease = await pool.acquire(key, factory)
+    await pool.release(lease)
+    assert lease.uses == 2
+    assert lease.context.closed
+    assert pool.idle_count() == 0
+
+
+def test_track_page_records_redirect_and_iframe_origins():
+    """页面关闭前记录跳转目标与 iframe 的源，归还时据此清空站点存储"""
+    from astra_farm.workers.context_pool import PooledContext
+
+    class FakeFrame:
+        def __init__(self, url):
+            self.url = url
+
+    class FakePage:
+        url = "https://final.example.com/landing"
+        frames = [FakeFrame("https://final.example.com/landing"), FakeFrame("https://ads.example.net/x"),
+                  FakeFrame("about:blank")]
+
+    lease = PooledContext(make_context_key(None, "win-high", "UA"), FakeContext())
+    lease.track_page(FakePage())
+    assert lease.origins == {"https://final.example.com", "https://ads.example.net"}
@@ -27,3 +27,69 @@ def test_get_task_status():
     assert "task_id" in status
     assert "status" in status
 
+
+def test_schedule_batch_rejects_mixed_hosts():
+    """批量任务只接受同一主机的 URL，校验在发送消息前完成"""
+    from astra_scheduler.dispatcher import schedule_batch
+    
+    with pytest.raises(ValueError):
+        schedule_batch([])
+    with pytest.raises(ValueError):
+        schedule_batch(["https://a.example.com/1", "https://b.example.com/2"])
+
+
+def test_read_batch_results_from_offset():
+    """按偏移量增量读取结果流"""
+    import json
+    from astra_dataflow.storage.batch_results import batch_results_key, read_batch_results
+    
+    class FakeRedis:
+        def __init__(self):
+            self.lists = {}
+        
+        def lrange(self, key, start, end):
+            return self.lists.get(key, [])[start:]
+    
+    client = FakeRedis()
+    client.lists[batch_results_key("b1")] = [
+        json.dumps({"index": i, "success": True}) for i in range(3)
+    ]
+    assert [r["index"] for r in read_batch_results(client, "b1")] == [0, 1, 2]
+    assert [r["index"] for r in read_batch_results(client, "b1", 2)] == [2]
+    assert read_batch_results(client, "missing") == []
+
+
+def test_schedule_task_delays_throttled_task(monkeypatch):
+    """调度时限流：预留到未来许可的任务以 countdown 投递，并标记 Worker 跳过限流等待"""
+    from astra_scheduler import dispatcher
+    
+    sent = []
+    monkeypatch.setattr(dispatcher.config, "SCHEDULE_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(dispatcher, "_reserve_rate_limit", lambda url, options: 12.5)
+    monkeypatch.setattr(
+        dispatcher.celery_app, "send_task", lambda name, **kw: sent.append(kw) or type("R", (), {"id": "t1"})()
+    )
+    
+    dispatcher.schedule_task("https://example.com/a", options={"rate_limit": 10})
+    assert sent[0]["countdown"] == 12.5
+    assert sent[0]["kwargs"]["options"] == {"rate_limit": 10, "rate_limit_reserved": True}
+    
+    # 未能预留时立即投递，由 Worker 侧限流
+    monkeypatch.setattr(dispatcher, "_reserve_rate_limit", lambda url, options: None)
+    dispatcher.schedule_task("https://example.com/b")
+    assert sent[1]["countdown"] is None
+    assert "rate_limit_reserved" not in sent[1]["kwargs"]["options"]
+
+
+def test_iter_batch_results_gives_up_on_pending(monkeypatch):
+    """未知或已过期的批量 ID 始终为 PENDING，超过 pending_timeout 后结束而不是无限轮询"""
+    from astra_scheduler import dispatcher
+    
+    page = {"status": "PENDING", "results": [], "next_offset": 0, "done": False}
+    monkeypatch.setattr(dispatcher, "get_batch_results", lambda batch_id, offset, resolve: page)
+    with pytest.raises(KeyError):
+        list(dispatcher.iter_batch_results("missing", poll_interval=0.01, pending_timeout=0.05))
+    
+    page = dict(page, status="STARTED")
+    with pytest.raises(TimeoutError):
+        list(dispatcher.iter_batch_results("slow", poll_interval=0.01, timeout=0.05, pending_timeout=0.01))
@@ -0,0 +1,51 @@
+"""
+Hook 事件实时推送测试
+"""
+import json
+from unittest import mock
+
+from astra_farm.config import WorkerConfig
+from astra_farm.workers.hook_stream import HOOK_SINK_BINDING, HookEventBuffer, get_hook_stream_script
+
+
+def _payload(events):
+    return json.dumps(events)
+
+
+def test_stream_script_uses_binding():
+    script = get_hook_stream_script()
+    assert HOOK_SINK_BINDING in script
+    assert "__astraEmit" in script
+
+
+def test_buffer_collects_batches():
+    buffer = HookEventBuffer()
+    buffer.sink(None, _payload([{"type": "xhr_request"}, {"type": "xhr_response"}]))
+    buffer.sink(None, _payload([{"type": "signature"}]))
+    assert [e["type"] for e in buffer.events] == ["xhr_request", "xhr_response", "signature"]
+
+    events = buffer.drain()
+    assert len(events) == 3
+    assert buffer.events == [] and buffer.bytes == 0
+
+
+def test_buffer_is_bounded():
+    """超出上限后丢弃新事件并计数，保留最早的事件"""
+    buffer = HookEventBuffer(max_events=3)
+    buffer.sink(None, _payload([{"i": 0}, {"i": 1}]))
+    buffer.sink(None, _payload([{"i": 2}, {"i": 3}]))
+    buffer.sink(None, _payload([{"i": 4}]))
+    assert [e["i"] for e in buffer.events] == [0, 1, 2]
+    assert buffer.dropped == 2
+
+    small = HookEventBuffer(max_bytes=50)
+    small.sink(None, _payload([{"data": "x" * 100}]))
+    assert small.events == [] and small.dropped == 1
+
+
+def test_stream_is_opt_in():
+    """默认不开启推送，内置 Hook 照常在页面内保存数据，hook_data 等既有结果不受影响"""
+    with mock.patch.dict("os.environ", {}, clear=True):
+        assert WorkerConfig().HOOK_STREAM_ENABLED is False
+    with mock.patch.dict("os.environ", {"HOOK_STREAM_ENABLED": "true"}):
+        assert WorkerConfig().HOOK_STREAM_ENABLED is True
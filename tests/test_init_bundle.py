@@ -0,0 +1,44 @@
+"""
+初始化脚本打包测试
+"""
+from astra_farm.workers.fingerprints import get_fingerprint
+from astra_farm.workers.init_bundle import InitScriptBundler, hook_set_hash
+
+
+def test_hook_set_hash():
+    """测试 Hook 集合哈希对内容和顺序敏感"""
+    assert hook_set_hash(None) == ""
+    assert hook_set_hash(["a", "b"]) == hook_set_hash(["a", "b"])
+    assert hook_set_hash(["a", "b"]) != hook_set_hash(["b", "a"])
+
+
+def test_bundle_cached_by_fingerprint_and_hooks():
+    """测试脚本包按 (指纹 ID, Hook 集合) 缓存"""
+    bundler = InitScriptBundler()
+    fp = get_fingerprint("win-high")
+    hook = "window.__hooked = true;"
+
+    hooks_hash, scripts = bundler.build(fp, [hook])
+    assert hooks_hash == hook_set_hash([hook])
+    assert "hardwareConcurrency" in scripts[0]
+    assert "webdriver" in scripts[0]
+    assert scripts[1:] == [hook]
+
+    _, again = bundler.build(fp, [hook])
+    assert again is scripts
+    assert bundler.stats == {"hits": 1, "misses": 1}
+
+    bundler.build(get_fingerprint("mac-m1"), [hook])
+    assert bundler.stats["misses"] == 2
+
+
+def test_hook_scripts_injected_verbatim_and_isolated():
+    """Hook 脚本原样注入（不改写注释与模板字面量），且与反检测脚本包分开"""
+    leading_comment = "/* a */ foo();\nbar();\n/* x\n*/\nbaz();"
+    template = "var s = `line1\n    // not a comment\n  end`;"
+    broken = "function ( {"
+    _, scripts = InitScriptBundler().build(get_fingerprint("win-high"), [leading_comment, template, broken])
+    assert scripts[1:] == [leading_comment, template, broken]
+    # 反检测脚本每段包在 try/catch 中，Hook 不在其中
+    assert scripts[0].startswith("try {")
+    assert "foo();" not in scripts[0]
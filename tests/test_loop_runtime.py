@@ -0,0 +1,68 @@
+"""
+常驻事件循环运行时测试
+"""
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+import pytest
+
+from astra_farm.workers.loop_runtime import LoopRuntime
+
+
+def test_tasks_overlap_on_shared_loop():
+    """多个任务线程提交的协程在同一个循环上并发执行"""
+    runtime = LoopRuntime()
+    loops = []
+
+    async def work():
+        loops.append(asyncio.get_running_loop())
+        await asyncio.sleep(0.2)
+        return threading.current_thread().name
+
+    try:
+        started = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            names = list(executor.map(lambda _: runtime.run(work()), range(4)))
+        assert names == [runtime.name] * 4
+        assert len(set(map(id, loops))) == 1
+        assert time.monotonic() - started < 0.6
+    finally:
+        runtime.stop()
+    assert not runtime.running
+
+
+def test_interrupted_wait_cancels_and_cleans_up():
+    """等待被打断（软超时 / 超时）时取消协程，并等待其 finally 执行完毕后再抛出"""
+    runtime = LoopRuntime()
+    cleaned = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            await asyncio.sleep(0.05)
+            cleaned.set()
+
+    try:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            runtime.run(slow(), timeout=0.05)
+        assert cleaned.is_set()
+        # 循环仍可继续使用
+        assert runtime.run(asyncio.sleep(0, result="ok")) == "ok"
+    finally:
+        runtime.stop()
+
+
+def test_run_from_loop_thread_is_rejected():
+    runtime = LoopRuntime()
+
+    async def nested():
+        runtime.run(asyncio.sleep(0))
+
+    try:
+        with pytest.raises(RuntimeError):
+            runtime.run(nested())
+    finally:
+        runtime.stop()
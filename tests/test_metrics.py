@@ -0,0 +1,22 @@
+"""
+Worker 指标测试
+"""
+import time
+from astra_farm.workers.metrics import PhaseTimer
+
+
+def test_phase_timer():
+    """测试分阶段计时与同名阶段累加"""
+    timer = PhaseTimer()
+    with timer.phase("goto"):
+        time.sleep(0.01)
+    with timer.phase("goto"):
+        time.sleep(0.01)
+    with timer.phase("content"):
+        pass
+
+    timings = timer.as_dict()
+    assert set(timings) == {"goto", "content", "total"}
+    assert timings["goto"] >= 20
+    assert timings["total"] >= timings["goto"] + timings["content"]
+    timer.observe("example.com")
@@ -0,0 +1,56 @@
+"""
+结构化提取测试
+"""
+import pytest
+
+from astra_farm.workers.page_extract import extract_from_html, normalize_schema, resolve_schema
+
+HTML = """
+<html><body>
+  <h1>  商品
+      列表 </h1>
+  <div class="item"><a class="name" href="/p/1">  第一件 </a><span class="price">10</span></div>
+  <div class="item"><a class="name" href="/p/2">第二件</a></div>
+</body></html>
+"""
+
+
+def test_normalize_schema():
+    schema = normalize_schema({
+        "title": "h1",
+        "items": {"selector": ".item", "all": True, "fields": {"link": {"selector": "a", "attr": "href"}}},
+    })
+    assert schema["title"] == {"selector": "h1", "attr": "text", "all": False}
+    assert schema["items"]["fields"]["link"]["attr"] == "href"
+    assert resolve_schema({}) is None
+
+    with pytest.raises(ValueError):
+        normalize_schema({"title": 1})
+    with pytest.raises(ValueError):
+        normalize_schema({"title": {"attr": "href"}})
+    with pytest.raises(ValueError):
+        normalize_schema({"items": {"selector": ".item", "fields": {}}})
+
+
+def test_extract_from_html():
+    schema = normalize_schema({
+        "title": "h1",
+        "missing": ".nope",
+        "items": {
+            "selector": ".item",
+            "all": True,
+            "fields": {
+                "name": ".name",
+                "link": {"selector": "a", "attr": "href"},
+                "price": ".price",
+                "cls": {"attr": "class"},
+            },
+        },
+    })
+    data = extract_from_html(HTML, schema)
+    assert data["title"] == "商品 列表"
+    assert data["missing"] is None
+    assert data["items"] == [
+        {"name": "第一件", "link": "/p/1", "price": "10", "cls": "item"},
+        {"name": "第二件", "link": "/p/2", "price": None, "cls": "item"},
+    ]
@@ -0,0 +1,41 @@
+"""
+数据处理管道测试
+"""
+import json
+
+from astra_dataflow.pipeline import DataPipeline
+
+
+def test_process_extracted_cleans_nested_fields(tmp_path):
+    """页面内提取的结构化字段逐层清洗后保存，不再解析 HTML"""
+    pipeline = DataPipeline(storage_dir=str(tmp_path))
+    extracted = {
+        "title": "  商品   标题  \n",
+        "price": 12.5,
+        "tags": ["  新品 ", "热卖\t\t促销"],
+        "seller": {"name": "  店铺   A  "},
+    }
+
+    data = pipeline.process_extracted(
+        extracted, url="https://example.com/item/1", hook_data={"sign": "abc"}
+    )
+
+    assert data["title"] == "商品 标题"
+    assert data["price"] == 12.5
+    assert data["tags"] == ["新品", "热卖 促销"]
+    assert data["seller"] == {"name": "店铺 A"}
+    assert data["hook_data"] == {"sign": "abc"}
+    assert data["url"] == "https://example.com/item/1"
+    assert "processed_at" in data
+    # 原始提取结果不被修改
+    assert extracted["title"] == "  商品   标题  \n"
+
+    saved = [json.loads(line) for f in tmp_path.iterdir() for line in f.read_text(encoding="utf-8").splitlines()]
+    assert saved == [data]
+
+
+def test_process_extracted_without_cleaning(tmp_path):
+    pipeline = DataPipeline(enable_cleaning=False, storage_dir=str(tmp_path))
+    data = pipeline.process_extracted({"title": "  原样  "})
+    assert data["title"] == "  原样  "
+    assert "url" not in data and "hook_data" not in data
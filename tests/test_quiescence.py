@@ -0,0 +1,66 @@
+"""
+DOM 静默等待测试
+"""
+import time
+import pytest
+
+from astra_farm.workers.quiescence import NetworkTracker, wait_for_quiescence
+
+
+class FakeRequest:
+    def __init__(self, url="https://example.com/api", resource_type="xhr"):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class FakePage:
+    """DOM 最近一次变更时间可控的 Page 替身"""
+
+    def __init__(self, mutating=False):
+        self.mutating = mutating
+        self.last_mutation = time.monotonic()
+
+    async def evaluate(self, script):
+        if self.mutating:
+            self.last_mutation = time.monotonic()
+        return (time.monotonic() - self.last_mutation) * 1000
+
+
+def test_tracker_ignores_beacons_and_long_polls():
+    tracker = NetworkTracker(long_request_ms=50)
+    tracker.on_request(FakeRequest(resource_type="websocket"))
+    tracker.on_request(FakeRequest("https://www.google-analytics.com/collect"))
+    assert not tracker._inflight
+
+    poll = FakeRequest()
+    tracker.on_request(poll)
+    assert tracker.idle_ms() == 0
+    # 超过 long_request_ms 仍未完成的请求不再阻塞静默判断
+    assert tracker.idle_ms(now=time.monotonic() + 0.1) > 0
+    tracker.on_done(poll)
+    assert not tracker._inflight
+
+
+@pytest.mark.asyncio
+async def test_returns_after_quiet_window():
+    tracker = NetworkTracker()
+    info = await wait_for_quiescence(FakePage(), tracker, quiet_ms=50, max_wait_ms=2000)
+    assert info["quiet"]
+    assert info["waited_ms"] < 1000
+
+
+@pytest.mark.asyncio
+async def test_hard_cap_when_dom_keeps_changing():
+    tracker = NetworkTracker()
+    info = await wait_for_quiescence(FakePage(mutating=True), tracker, quiet_ms=50, max_wait_ms=200)
+    assert not info["quiet"]
+    assert 150 <= info["waited_ms"] < 1000
+
+
+@pytest.mark.asyncio
+async def test_waits_for_inflight_request():
+    tracker = NetworkTracker()
+    request = FakeRequest()
+    tracker.on_request(request)
+    info = await wait_for_quiescence(FakePage(), tracker, quiet_ms=50, max_wait_ms=150)
+    assert not info["quiet"]
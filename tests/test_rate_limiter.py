@@ -0,0 +1,144 @@
+"""
+分布式限流器测试（需要 Redis，未运行时跳过）
+"""
+import os
+import time
+
+import pytest
+import pytest_asyncio
+
+from astra_scheduler.rate_limiter import GCRA, AsyncRateLimiter, RateLimiter, _rate_limit_key
+
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+URL = "https://ratelimit.example.com/page"
+
+
+@pytest.fixture
+def limiter():
+    limiter = RateLimiter(REDIS_URL)
+    try:
+        limiter.redis.ping()
+    except Exception as e:
+        pytest.skip(f"Redis 未运行: {e}")
+    keys = [_rate_limit_key(URL), _rate_limit_key(URL, GCRA)]
+    limiter.redis.delete(*keys)
+    yield limiter
+    limiter.redis.delete(*keys)
+
+
+@pytest_asyncio.fixture
+async def async_limiter():
+    limiter = AsyncRateLimiter(REDIS_URL)
+    try:
+        await limiter.redis.ping()
+    except Exception as e:
+        await limiter.close()
+        pytest.skip(f"Redis 未运行: {e}")
+    await limiter.redis.delete(_rate_limit_key(URL))
+    yield limiter
+    await limiter.redis.delete(_rate_limit_key(URL))
+    await limiter.close()
+
+
+def test_sliding_window_admits_up_to_limit(limiter):
+    assert all(limiter.is_allowed(URL, limit=3, window=10) for _ in range(3))
+    retry_after = limiter.try_acquire(URL, limit=3, window=10)
+    assert 9 < retry_after <= 10
+    # 被拒绝的请求不占用窗口
+    assert limiter.redis.zcard(_rate_limit_key(URL)) == 3
+
+
+def test_wait_if_needed_sleeps_until_permit(limiter):
+    assert limiter.is_allowed(URL, limit=1, window=0.3)
+    started = time.monotonic()
+    limiter.wait_if_needed(URL, limit=1, window=0.3)
+    assert 0.2 < time.monotonic() - started < 1.0
+
+
+@pytest.mark.asyncio
+async def test_async_limiter_shares_window(limiter, async_limiter):
+    assert await async_limiter.is_allowed(URL, limit=2, window=10)
+    assert limiter.is_allowed(URL, limit=2, window=10)
+    assert await async_limiter.try_acquire(URL, limit=2, window=10) > 0
+    with pytest.raises(TimeoutError):
+        await async_limiter.wait_if_needed(URL, limit=2, window=10, max_wait=1)
+
+
+def test_unknown_algorithm_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter(REDIS_URL, algorithm="leaky")
+
+
+def test_gcra_allows_burst_then_spaces_requests(limiter):
+    gcra = RateLimiter(REDIS_URL, algorithm=GCRA, burst=2)
+    assert gcra.is_allowed(URL, limit=10, window=10)
+    assert gcra.is_allowed(URL, limit=10, window=10)
+    # 突发用完后按 1s 间隔放行
+    retry_after = gcra.try_acquire(URL, limit=10, window=10)
+    assert 0.9 < retry_after <= 1.0
+    # 每个域名只保存一个时间戳
+    assert gcra.redis.type(_rate_limit_key(URL, GCRA)) in (b"string", "string")
+
+
+def test_gcra_wait_if_needed(limiter):
+    gcra = RateLimiter(REDIS_URL, algorithm=GCRA, burst=1)
+    assert gcra.is_allowed(URL, limit=10, window=3)
+    started = time.monotonic()
+    gcra.wait_if_needed(URL, limit=10, window=3)
+    assert 0.2 < time.monotonic() - started < 1.0
+
+
+def test_lease_block_grows_and_refunds_on_close(limiter):
+    leased = RateLimiter(REDIS_URL, lease_block=4, lease_ttl=10)
+    key = _rate_limit_key(URL)
+    # 首次逐个申请，用完后块大小翻倍
+    assert leased.is_allowed(URL, limit=10, window=60)
+    assert leased.is_allowed(URL, limit=10, window=60)
+    assert leased.redis.zcard(key) == 3
+    # 第三个许可在本地消耗，不访问 Redis
+    assert leased.is_allowed(URL, limit=10, window=60)
+    assert leased.redis.zcard(key) == 3
+    assert leased.is_allowed(URL, limit=10, window=60)
+    assert leased.redis.zcard(key) == 7
+    # 未用完的 3 个许可归还
+    leased.close()
+    assert limiter.redis.zcard(key) == 4
+
+
+def test_lease_never_exceeds_global_limit(limiter):
+    workers = [RateLimiter(REDIS_URL, lease_block=8, lease_ttl=10) for _ in range(3)]
+    admitted = sum(w.is_allowed(URL, limit=10, window=60) for _ in range(10) for w in workers)
+    assert admitted == 10
+
+
+def test_gcra_lease_refund(limiter):
+    leased = RateLimiter(REDIS_URL, algorithm=GCRA, burst=5, lease_block=4, lease_ttl=10)
+    for _ in range(4):
+        assert leased.is_allowed(URL, limit=10, window=10)
+    gcra = RateLimiter(REDIS_URL, algorithm=GCRA, burst=5)
+    # 第 4 次申请时预取了剩余全部额度
+    assert not gcra.is_allowed(URL, limit=10, window=10)
+    leased.close()
+    # 归还未用的 1 个许可
+    assert gcra.is_allowed(URL, limit=10, window=10)
+    assert not gcra.is_allowed(URL, limit=10, window=10)
+
+
+def test_reserve_spaces_future_permits(limiter):
+    delays = [limiter.reserve(URL, limit=2, window=10, max_delay=30) for _ in range(5)]
+    assert delays[0] == 0 and delays[1] == 0
+    assert 9 < delays[2] <= 10 and 9 < delays[3] <= 10
+    assert 19 < delays[4] <= 20
+    # 预留的许可对立即执行的请求同样生效
+    assert not limiter.is_allowed(URL, limit=2, window=10)
+    # 超出最长延迟时不预留
+    assert limiter.reserve(URL, limit=2, window=10, max_delay=5) is None
+    assert limiter.redis.zcard(_rate_limit_key(URL)) == 5
+
+
+def test_gcra_reserve(limiter):
+    gcra = RateLimiter(REDIS_URL, algorithm=GCRA, burst=1)
+    assert gcra.reserve(URL, limit=10, window=10) == 0
+    assert 0.9 < gcra.reserve(URL, limit=10, window=10) <= 1.0
+    assert 1.9 < gcra.reserve(URL, limit=10, window=10) <= 2.0
+    assert not gcra.is_allowed(URL, limit=10, window=10)
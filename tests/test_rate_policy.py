@@ -0,0 +1,148 @@
+"""
+域名自适应限流策略测试（Redis 部分未运行时跳过）
+"""
+import os
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+
+from astra_scheduler.rate_policy import (
+    DOMAINS_KEY, OUTCOME_CHALLENGE, OUTCOME_ERROR, OUTCOME_OK, OUTCOME_THROTTLED, POLICY_KEY,
+    AsyncRatePolicy, RatePolicy, classify_outcome,
+)
+
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+DOMAIN = "policy.example.com"
+URL = f"https://{DOMAIN}/page"
+
+
+def test_classify_outcome():
+    assert classify_outcome(200) == OUTCOME_OK
+    assert classify_outcome(429) == OUTCOME_THROTTLED
+    assert classify_outcome(503, challenge=True) == OUTCOME_THROTTLED
+    assert classify_outcome(200, challenge=True) == OUTCOME_CHALLENGE
+    assert classify_outcome(None, error=True) == OUTCOME_ERROR
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stored, expected", [
+    ((None, b"100", None), 100),     # 只配置下限，默认限额低于下限
+    ((None, None, b"30"), 30),       # 只配置上限，默认限额高于上限
+    ((None, b"10", b"100"), 60),     # 默认限额在上下限之内
+    ((b"42.5", b"10", b"100"), 42.5),
+    ((None, None, None), 60),        # 尚无策略
+])
+async def test_limit_for_clamps_default(stored, expected):
+    policy = AsyncRatePolicy(REDIS_URL, cache_ttl=0)
+    try:
+        with mock.patch.object(policy.redis, "hmget", mock.AsyncMock(return_value=list(stored))):
+            assert await policy.limit_for(URL, 60) == expected
+    finally:
+        await policy.close()
+
+
+@pytest.mark.asyncio
+async def test_limit_for_keeps_cached_limit_on_failure():
+    """读取策略失败时沿用上次的限额，从未读到时使用默认限额"""
+    policy = AsyncRatePolicy(REDIS_URL, cache_ttl=0)
+    try:
+        with mock.patch.object(policy.redis, "hmget", mock.AsyncMock(side_effect=ConnectionError("down"))):
+            assert await policy.limit_for(URL, 60) == 60
+        with mock.patch.object(policy.redis, "hmget", mock.AsyncMock(return_value=[None, b"100", None])):
+            assert await policy.limit_for(URL, 60) == 100
+        with mock.patch.object(policy.redis, "hmget", mock.AsyncMock(side_effect=ConnectionError("down"))):
+            assert await policy.limit_for(URL, 60) == 100
+    finally:
+        await policy.close()
+
+
+@pytest_asyncio.fixture
+async def policy():
+    policy = AsyncRatePolicy(
+        REDIS_URL, min_limit=10, max_limit=100, increase=20, decrease=0.5,
+        decrease_interval=0, cache_ttl=60,
+    )
+    try:
+        await policy.redis.ping()
+    except Exception as e:
+        await policy.close()
+        pytest.skip(f"Redis 未运行: {e}")
+    await policy.redis.delete(POLICY_KEY.format(domain=DOMAIN), DOMAINS_KEY)
+    yield policy
+    await policy.redis.delete(POLICY_KEY.format(domain=DOMAIN), DOMAINS_KEY)
+    await policy.close()
+
+
+@pytest.mark.asyncio
+async def test_aimd_within_bounds(policy):
+    assert await policy.limit_for(URL, 60) == 60
+    # 成功时加性增长：每次增加 increase / limit
+    limit = await policy.record(URL, OUTCOME_OK, latency_ms=100, initial=60)
+    assert limit == pytest.approx(60 + 20 / 60, abs=1e-3)
+    assert await policy.limit_for(URL, 60) == limit
+
+    # 限流时乘性下降，不低于下限
+    assert await policy.record(URL, OUTCOME_THROTTLED) == pytest.approx(limit / 2, abs=1e-3)
+    for _ in range(5):
+        limit = await policy.record(URL, OUTCOME_CHALLENGE)
+    assert limit == 10
+
+    # 网络错误不调整限额
+    assert await policy.record(URL, OUTCOME_ERROR) == 10
+    for _ in range(400):
+        limit = await policy.record(URL, OUTCOME_OK)
+    assert limit == 100
+
+
+@pytest.mark.asyncio
+async def test_latency_growth_decreases_limit(policy):
+    for _ in range(10):
+        limit = await policy.record(URL, OUTCOME_OK, latency_ms=100, initial=60)
+    assert limit > 60
+    for _ in range(5):
+        limit = await policy.record(URL, OUTCOME_OK, latency_ms=2000)
+    assert limit < 60
+
+
+@pytest.mark.asyncio
+async def test_configured_bounds_and_listing(policy):
+    store = RatePolicy(REDIS_URL)
+    try:
+        assert store.get(DOMAIN) is None
+        with pytest.raises(ValueError):
+            store.configure(DOMAIN, min_limit=50, max_limit=20)
+        described = store.configure(DOMAIN, min_limit=30, max_limit=40)
+        assert described["min_limit"] == 30 and described["limit"] is None
+
+        # 按域名配置的上下限优先于默认值
+        assert await policy.record(URL, OUTCOME_OK, initial=60) == 40
+        assert await policy.record(URL, OUTCOME_THROTTLED) == 30
+
+        listed = store.list()
+        assert [p["domain"] for p in listed] == [DOMAIN]
+        assert listed[0]["limit"] == 30 and listed[0]["throttled"] == 1
+    finally:
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_configure_checks_stored_bounds_and_clamps_limit(policy):
+    store = RatePolicy(REDIS_URL)
+    try:
+        store.configure(DOMAIN, max_limit=40)
+        # 单独设置的下限与已保存的上限比较
+        with pytest.raises(ValueError):
+            store.configure(DOMAIN, min_limit=50)
+        with pytest.raises(ValueError):
+            store.configure(DOMAIN, max_limit=5, min_limit=10)
+
+        # 直接指定的限额写入时夹在上下限内
+        assert store.configure(DOMAIN, limit=500)["limit"] == 40
+        assert store.configure(DOMAIN, min_limit=10, limit=1)["limit"] == 10
+        # 收紧上限时已保存的限额随之夹住
+        assert store.configure(DOMAIN, max_limit=20)["limit"] == 10
+        assert store.configure(DOMAIN, min_limit=15)["limit"] == 15
+        assert await policy.limit_for(URL, 60) == 15
+    finally:
+        store.close()
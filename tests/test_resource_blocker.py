@@ -0,0 +1,35 @@
+"""
+资源拦截器测试
+"""
+from astra_farm.workers.resource_blocker import ResourceBlocker
+
+
+def test_block_by_resource_type():
+    """测试按资源类型拦截"""
+    blocker = ResourceBlocker()
+    assert blocker.should_block("image", "https://example.com/a.png")
+    assert blocker.should_block("font", "https://example.com/a.woff2")
+    assert not blocker.should_block("document", "https://example.com/")
+    assert not blocker.should_block("script", "https://example.com/app.js")
+
+
+def test_block_by_host():
+    """测试按域名黑名单拦截，包含子域名"""
+    blocker = ResourceBlocker(resource_types=[], blocked_hosts=["tracker.com"])
+    assert blocker.should_block("script", "https://tracker.com/t.js")
+    assert blocker.should_block("xhr", "https://a.b.tracker.com:8443/collect")
+    assert not blocker.should_block("script", "https://nottracker.com/t.js")
+    assert not blocker.should_block("script", "https://tracker.com.example.org/t.js")
+
+
+def test_from_option():
+    """测试从任务选项构造拦截器"""
+    assert ResourceBlocker.from_option(None) is None
+    assert ResourceBlocker.from_option(False) is None
+
+    blocker = ResourceBlocker.from_option(["media"])
+    assert blocker.should_block("media", "https://example.com/v.mp4")
+    assert not blocker.should_block("image", "https://example.com/a.png")
+
+    blocker = ResourceBlocker.from_option({"types": ["image"], "hosts": []})
+    assert not blocker.should_block("script", "https://google-analytics.com/ga.js")
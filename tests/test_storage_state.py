@@ -0,0 +1,65 @@
+"""
+会话状态缓存测试
+"""
+import pytest
+
+from astra_farm.workers.storage_state import StorageStateCache, storage_state_key
+
+
+class FakeAsyncRedis:
+    """最小化的 redis.asyncio 替身"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def aclose(self):
+        pass
+
+
+def _cache(**kwargs):
+    cache = StorageStateCache("redis://localhost:6379/0", **kwargs)
+    cache.redis = FakeAsyncRedis()
+    return cache
+
+
+def test_key_hides_proxy_credentials():
+    key = storage_state_key("Example.com", "user:secret@proxy:8000")
+    assert key.startswith("astra:storage_state:example.com:")
+    assert "secret" not in key
+    assert storage_state_key("example.com", "").endswith(":direct")
+
+
+@pytest.mark.asyncio
+async def test_save_load_invalidate():
+    """写入后命中，失效后未命中"""
+    cache = _cache(ttl=60)
+    state = {"cookies": [{"name": "cf_clearance", "value": "x"}], "origins": []}
+
+    assert await cache.load("example.com", "") is None
+    assert await cache.save("example.com", "", state)
+    assert cache.redis.ttls[storage_state_key("example.com", "")] == 60
+    assert await cache.load("example.com", "") == state
+    # 不同代理出口的状态互不共享
+    assert await cache.load("example.com", "proxy:8000") is None
+
+    await cache.invalidate("example.com", "")
+    assert await cache.load("example.com", "") is None
+
+
+@pytest.mark.asyncio
+async def test_skip_empty_and_oversized_state():
+    cache = _cache(max_bytes=100)
+    assert not await cache.save("example.com", "", {"cookies": [], "origins": []})
+    big = {"cookies": [{"name": "a", "value": "x" * 200}], "origins": []}
+    assert not await cache.save("example.com", "", big)
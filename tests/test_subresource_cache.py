@@ -0,0 +1,167 @@
+"""
+子资源磁盘缓存测试
+"""
+import os
+import time
+import pytest
+
+from astra_farm.workers.subresource_cache import (
+    CachedRouteHandler,
+    SubresourceCache,
+    freshness_lifetime,
+    is_cacheable,
+)
+
+JS_URL = "https://cdn.example.com/app.js"
+
+
+def test_freshness_lifetime():
+    """测试 Cache-Control / Expires / Last-Modified 有效期计算"""
+    assert freshness_lifetime({"cache-control": "public, max-age=600"}) == 600
+    assert freshness_lifetime({"cache-control": "no-store"}) is None
+    assert freshness_lifetime({"cache-control": "no-cache"}) == 0
+    assert freshness_lifetime({
+        "date": "Mon, 01 Jan 2024 00:00:00 GMT",
+        "expires": "Mon, 01 Jan 2024 01:00:00 GMT",
+    }) == 3600
+    assert freshness_lifetime({}) == 0
+
+
+def test_is_cacheable():
+    assert is_cacheable(200, {"cache-control": "max-age=60"})
+    assert is_cacheable(200, {"etag": '"v1"'})
+    assert not is_cacheable(200, {})
+    assert not is_cacheable(200, {"cache-control": "no-store"})
+    assert not is_cacheable(404, {"cache-control": "max-age=60"})
+    assert not is_cacheable(200, {"cache-control": "max-age=60", "set-cookie": "a=b"})
+    assert not is_cacheable(200, {"cache-control": "max-age=60", "vary": "Cookie"})
+
+
+def test_private_response_not_cacheable(tmp_path):
+    """Cache-Control: private 的响应不写入共享缓存"""
+    headers = {"cache-control": "private, max-age=600", "etag": '"v1"'}
+    assert not is_cacheable(200, headers)
+    cache = SubresourceCache(str(tmp_path))
+    assert not cache.put(JS_URL, 200, headers, b"user data")
+    assert cache.get(JS_URL) is None
+
+
+def test_credentialed_request_not_cacheable(tmp_path):
+    """携带 Authorization 或 Cookie 的请求不写入共享缓存"""
+    headers = {"cache-control": "max-age=60"}
+    assert is_cacheable(200, headers, {"accept": "*/*"})
+    assert not is_cacheable(200, headers, {"Authorization": "Bearer t"})
+    assert not is_cacheable(200, headers, {"cookie": "sid=1"})
+    cache = SubresourceCache(str(tmp_path))
+    assert not cache.put(JS_URL, 200, headers, b"secret", request_headers={"cookie": "sid=1"})
+    assert cache.get(JS_URL) is None
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = SubresourceCache(str(tmp_path))
+    headers = {"cache-control": "max-age=60", "content-type": "text/javascript", "content-encoding": "br"}
+    assert cache.put(JS_URL, 200, headers, b"console.log(1)")
+
+    meta, body = cache.get(JS_URL)
+    assert body == b"console.log(1)"
+    # 正文已解码，不能回放 content-encoding
+    assert "content-encoding" not in meta["headers"]
+    assert meta["expires_at"] > time.time()
+    assert cache.get("https://cdn.example.com/other.js") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    """测试超过总大小上限时淘汰最久未使用的条目"""
+    cache = SubresourceCache(str(tmp_path), max_bytes=3000, evict_every=1000)
+    headers = {"cache-control": "max-age=60"}
+    for i in range(3):
+        cache.put(f"https://cdn.example.com/{i}.js", 200, headers, b"x" * 1000)
+        meta_path, _ = cache._paths(f"https://cdn.example.com/{i}.js")
+        os.utime(meta_path, (i, i))
+    # 访问 0 号条目使其成为最近使用
+    cache.get("https://cdn.example.com/0.js")
+
+    assert cache.evict() >= 1
+    assert cache.get("https://cdn.example.com/0.js") is not None
+    assert cache.get("https://cdn.example.com/1.js") is None
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type="script", method="GET"):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = method
+        self.headers = {}
+        # 浏览器网络层附加的请求头（如 Cookie）只出现在 all_headers() 中
+        self.network_headers = {}
+
+    async def all_headers(self):
+        return {**self.headers, **self.network_headers}
+
+
+class FakeRoute:
+    def __init__(self, request):
+        self.request = request
+        self.fulfilled = None
+        self.fell_back = False
+
+    async def fulfill(self, **kwargs):
+        self.fulfilled = kwargs
+
+    async def fallback(self):
+        self.fell_back = True
+
+
+@pytest.mark.asyncio
+async def test_route_handler_hit_and_miss(tmp_path):
+    cache = SubresourceCache(str(tmp_path))
+    cache.put(JS_URL, 200, {"cache-control": "max-age=60"}, b"cached")
+    handler = CachedRouteHandler(cache)
+
+    hit = FakeRoute(FakeRequest(JS_URL))
+    await handler.handle(hit)
+    assert hit.fulfilled["body"] == b"cached"
+
+    miss = FakeRoute(FakeRequest("https://cdn.example.com/new.js"))
+    await handler.handle(miss)
+    assert miss.fell_back
+
+    document = FakeRoute(FakeRequest("https://example.com/", resource_type="document"))
+    await handler.handle(document)
+    assert document.fell_back
+
+    stats = handler.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["saved_bytes"] == len(b"cached")
+
+
+@pytest.mark.asyncio
+async def test_route_handler_skips_credentialed_request(tmp_path):
+    """带 Authorization 的请求不使用共享缓存"""
+    cache = SubresourceCache(str(tmp_path))
+    cache.put(JS_URL, 200, {"cache-control": "max-age=60"}, b"public")
+    handler = CachedRouteHandler(cache)
+
+    request = FakeRequest(JS_URL)
+    request.headers = {"authorization": "Bearer t"}
+    route = FakeRoute(request)
+    await handler.handle(route)
+    assert route.fell_back
+    assert route.fulfilled is None
+
+
+@pytest.mark.asyncio
+async def test_route_handler_skips_request_with_network_cookie(tmp_path):
+    """网络层附加的 Cookie 不在 request.headers 中，也不使用共享缓存"""
+    cache = SubresourceCache(str(tmp_path))
+    cache.put(JS_URL, 200, {"cache-control": "max-age=60"}, b"public")
+    handler = CachedRouteHandler(cache)
+
+    request = FakeRequest(JS_URL)
+    request.network_headers = {"cookie": "sid=1"}
+    route = FakeRoute(request)
+    await handler.handle(route)
+    assert route.fell_back
+    assert route.fulfilled is None